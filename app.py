@@ -1,16 +1,36 @@
-from fastapi import FastAPI, Depends, HTTPException, Header
+from fastapi import FastAPI, Depends, HTTPException, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse, FileResponse
+from pydantic import TypeAdapter
+from contextlib import asynccontextmanager
 from typing import Optional, List
-from io import StringIO
-import csv
+import os
+import json
+import time
 
-from auth import ensure_admin, verify_user, issue_token, validate_token, revoke_token, change_password
-from models import LoginIn, TokenOut, ChangePasswordIn, AlunoIn, AlunoOut, DisciplinaIn, DisciplinaOut, NotaIn, StatusIn, LogOut
+import auth
+from auth import ensure_admin, verify_user_async, AuthBusyError, issue_token, session_for, revoke_token, change_password
+from models import LoginIn, TokenOut, ChangePasswordIn, UserIn, UserUpdateIn, UserOut, AlunoIn, AlunoOut, DisciplinaIn, DisciplinaOut, NotaIn, StatusIn, LogOut, CatalogoOut, TurmaOut, ExportJobOut, ChangesOut
+from users import ROLE_ADMIN, ROLE_TEACHER, normalize_username
 import storage as db
+import metrics
+import profiling
+import reports
+import exports
+from singleflight import SingleFlight
 from util import nonempty
+from auditlog import PositionExpired
 
-app = FastAPI(title="Controle Acadêmico API", version="2.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # aplica a retenção do log de auditoria na subida
+    db.archive_logs()
+    yield
+    # drena os logs de auditoria e os tokens pendentes antes de encerrar
+    db.shutdown()
+    auth.shutdown()
+
+app = FastAPI(title="Controle Acadêmico API", version="2.0.0", lifespan=lifespan)
 ensure_admin()
 
 app.add_middleware(
@@ -21,40 +41,144 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware('http')
+async def observe_requests(request: Request, call_next):
+    """Latência por rota, status e contadores de I/O/criptografia da requisição."""
+    metrics.IN_FLIGHT.inc()
+    stats, ctx = metrics.begin_request()
+    # X-Profile: 1 pede um cProfile/tracemalloc do endpoint (só vale para admin)
+    profile_ctx = profiling.request_profile() if request.headers.get(profiling.PROFILE_HEADER) == '1' else None
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        req = profiling.requested()
+        if req is not None and req.profile_id:
+            response.headers['X-Profile-Id'] = req.profile_id
+        return response
+    finally:
+        if profile_ctx is not None:
+            profiling.reset(profile_ctx)
+        route = request.scope.get('route')
+        metrics.end_request(stats, ctx, request.method, getattr(route, 'path', 'unmatched'),
+                            status, time.perf_counter() - start)
+        metrics.IN_FLIGHT.dec()
+
 @app.get('/')
 def root():
     return {'ok': True, 'service': 'Controle Acadêmico API', 'docs': '/docs'}
 
-def require_token(authorization: Optional[str] = Header(None)):
+# Se METRICS_TOKEN estiver definido, o scraper precisa enviar "Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+@app.get('/metrics', response_class=PlainTextResponse)
+def get_metrics(authorization: Optional[str] = Header(None)):
+    if METRICS_TOKEN and authorization != f'Bearer {METRICS_TOKEN}':
+        raise HTTPException(401, 'Token de métricas inválido')
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+def require_token(authorization: Optional[str] = Header(None)) -> auth.Session:
     if not authorization or not authorization.startswith('Bearer '):
         raise HTTPException(401, 'Token ausente')
     token = authorization.split(' ', 1)[1]
-    if not validate_token(token):
+    with metrics.span('token_validation'):
+        session = session_for(token)
+    if not session:
         raise HTTPException(401, 'Token inválido ou expirado')
-    return token
+    return session
+
+def require_writer(session: auth.Session = Depends(require_token)) -> auth.Session:
+    """Alterações de alunos, disciplinas e notas: admin ou teacher."""
+    if session.role not in (ROLE_ADMIN, ROLE_TEACHER):
+        raise HTTPException(403, 'Usuário sem permissão de escrita')
+    return session
+
+def require_admin(session: auth.Session = Depends(require_token)) -> auth.Session:
+    if session.role != ROLE_ADMIN:
+        raise HTTPException(403, 'Apenas administradores')
+    return session
 
 # ---------- AUTH ----------
 @app.post('/auth/login', response_model=TokenOut)
-def login(payload: LoginIn):
-    if not verify_user(payload.username, payload.password):
+async def login(payload: LoginIn):
+    # PBKDF2 roda no pool dedicado do auth, não no threadpool compartilhado
+    try:
+        ok = await verify_user_async(payload.username, payload.password)
+    except AuthBusyError as e:
+        raise HTTPException(503, str(e), headers={'Retry-After': '1'})
+    if not ok:
         raise HTTPException(401, 'Credenciais inválidas')
-    return TokenOut(token=issue_token())
+    return TokenOut(token=issue_token(normalize_username(payload.username)))
 
 @app.post('/auth/logout')
-def logout(token: str = Depends(require_token)):
-    revoke_token(token)
+def logout(session: auth.Session = Depends(require_token)):
+    revoke_token(session.token)
     return {'ok': True}
 
 @app.post('/auth/change-password')
-def change_pwd(body: ChangePasswordIn, token: str = Depends(require_token)):
+def change_pwd(body: ChangePasswordIn, session: auth.Session = Depends(require_token)):
     try:
-        change_password(body.old_password, body.new_password)
-        revoke_token(token)
+        change_password(body.old_password, body.new_password, session.username)
+        revoke_token(session.token)
         return {'ok': True, 'message': 'Senha alterada. Faça login novamente.'}
     except ValueError as e:
         raise HTTPException(400, str(e))
 
+# ---------- USERS ----------
+@app.get('/users', response_model=List[UserOut])
+def get_users(session: auth.Session = Depends(require_admin)):
+    return auth.list_users()
+
+@app.post('/users', response_model=UserOut)
+def create_user(body: UserIn, session: auth.Session = Depends(require_admin)):
+    try:
+        return auth.create_user(body.username, body.password, body.role)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+@app.patch('/users/{username}', response_model=UserOut)
+def update_user(username: str, body: UserUpdateIn, session: auth.Session = Depends(require_admin)):
+    try:
+        return auth.update_user(username, role=body.role, password=body.password)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+@app.delete('/users/{username}')
+def delete_user(username: str, session: auth.Session = Depends(require_admin)):
+    if username.strip().lower() == session.username:
+        raise HTTPException(400, 'Não é possível remover o próprio usuário')
+    try:
+        auth.delete_user(username)
+        return {'ok': True}
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+
 # ---------- STUDENTS ----------
+def _disciplina_out(d) -> DisciplinaOut:
+    return DisciplinaOut(id=d.id, nome=d.nome, data_cadastro=d.data_cadastro, notas=d.notas,
+                         media=d.media(), status=d.status(), catalogo_id=d.catalogo_id)
+
+def _aluno_out(a) -> AlunoOut:
+    return AlunoOut(
+        id=a.id,
+        nome=a.nome,
+        tipo_id=a.tipo_id,
+        identificador=a.identificador,
+        data_cadastro=a.data_cadastro,
+        ativo=a.ativo,
+        disciplinas=[_disciplina_out(d) for d in a.disciplinas],
+    )
+
+# Leituras caras idênticas e simultâneas (fim de período: vários coordenadores
+# pedindo o mesmo relatório) são computadas uma vez só. A chave inclui a
+# versão dos dados, então nenhuma resposta é anterior a uma alteração já feita.
+_STUDENTS_FLIGHT = SingleFlight('students')
+_CLASS_REPORT_FLIGHT = SingleFlight('class_report')
+_TURMA_FLIGHT = SingleFlight('course_students')
+_COURSE_CSV_FLIGHT = SingleFlight('course_report')
+_ALUNOS_JSON = TypeAdapter(List[AlunoOut])
+
 @app.get('/students', response_model=List[AlunoOut])
 def list_students(
     name: Optional[str] = None,
@@ -62,38 +186,31 @@ def list_students(
     ident: Optional[str] = None,
     date_min: Optional[str] = None,
     date_max: Optional[str] = None,
-    token: str = Depends(require_token)
+    session: auth.Session = Depends(require_token)
 ):
-    items = db.filter_alunos(nonempty(name), nonempty(tipo), nonempty(ident), nonempty(date_min), nonempty(date_max))
-    return [
-        AlunoOut(
-            id=a.id,
-            nome=a.nome,
-            tipo_id=a.tipo_id,
-            identificador=a.identificador,
-            data_cadastro=a.data_cadastro,
-            ativo=a.ativo,
-            disciplinas=[
-                DisciplinaOut(
-                    id=d.id,
-                    nome=d.nome,
-                    data_cadastro=d.data_cadastro,
-                    notas=d.notas,
-                    media=d.media(),
-                    status=d.status()
-                )
-                for d in a.disciplinas
-            ],
-        )
-        for a in items
-    ]
+    filters = (nonempty(name), nonempty(tipo), nonempty(ident), nonempty(date_min), nonempty(date_max))
+    # o JSON pronto também é compartilhado: serializar a lista é boa parte do custo
+    body = _STUDENTS_FLIGHT.do(
+        (filters, db.snapshot().version),
+        lambda: _ALUNOS_JSON.dump_json([_aluno_out(a) for a in db.filter_alunos(*filters)]),
+    )
+    return Response(content=body, media_type='application/json')
+
+@app.get('/students/{aid}', response_model=AlunoOut)
+def get_student(aid: str, session: auth.Session = Depends(require_token)):
+    try:
+        a = db.find_aluno(aid)
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+    return _aluno_out(a)
 
 @app.post('/students', response_model=AlunoOut)
-def create_student(body: AlunoIn, token: str = Depends(require_token)):
+def create_student(body: AlunoIn, session: auth.Session = Depends(require_writer)):
     try:
         a = db.create_aluno(
             body.nome, body.tipo_id, body.identificador, body.data_cadastro,
-            ativo=(True if body.ativo is None else body.ativo)
+            ativo=(True if body.ativo is None else body.ativo),
+            actor=session.username,
         )
         return AlunoOut(
             id=a.id,
@@ -108,7 +225,7 @@ def create_student(body: AlunoIn, token: str = Depends(require_token)):
         raise HTTPException(400, str(e))
 
 @app.put('/students/{aid}', response_model=AlunoOut)
-def update_student(aid: str, body: AlunoIn, token: str = Depends(require_token)):
+def update_student(aid: str, body: AlunoIn, session: auth.Session = Depends(require_writer)):
     try:
         a = db.update_aluno(
             aid,
@@ -116,7 +233,8 @@ def update_student(aid: str, body: AlunoIn, token: str = Depends(require_token))
             tipo_id=body.tipo_id,
             identificador=body.identificador,
             data_cadastro=body.data_cadastro,
-            ativo=body.ativo
+            ativo=body.ativo,
+            actor=session.username,
         )
         return AlunoOut(
             id=a.id,
@@ -125,33 +243,23 @@ def update_student(aid: str, body: AlunoIn, token: str = Depends(require_token))
             identificador=a.identificador,
             data_cadastro=a.data_cadastro,
             ativo=a.ativo,
-            disciplinas=[
-                DisciplinaOut(
-                    id=d.id,
-                    nome=d.nome,
-                    data_cadastro=d.data_cadastro,
-                    notas=d.notas,
-                    media=d.media(),
-                    status=d.status()
-                )
-                for d in a.disciplinas
-            ],
+            disciplinas=[_disciplina_out(d) for d in a.disciplinas],
         )
     except ValueError as e:
         raise HTTPException(404, str(e))
 
 @app.delete('/students/{aid}')
-def delete_student(aid: str, token: str = Depends(require_token)):
+def delete_student(aid: str, session: auth.Session = Depends(require_writer)):
     try:
-        db.delete_aluno(aid)
+        db.delete_aluno(aid, actor=session.username)
         return {'ok': True}
     except ValueError as e:
         raise HTTPException(404, str(e))
 
 @app.patch('/students/{aid}/status', response_model=AlunoOut)
-def set_status(aid: str, body: StatusIn, token: str = Depends(require_token)):
+def set_status(aid: str, body: StatusIn, session: auth.Session = Depends(require_writer)):
     try:
-        a = db.set_aluno_status(aid, body.ativo)
+        a = db.set_aluno_status(aid, body.ativo, actor=session.username)
         return AlunoOut(
             id=a.id,
             nome=a.nome,
@@ -159,24 +267,14 @@ def set_status(aid: str, body: StatusIn, token: str = Depends(require_token)):
             identificador=a.identificador,
             data_cadastro=a.data_cadastro,
             ativo=a.ativo,
-            disciplinas=[
-                DisciplinaOut(
-                    id=d.id,
-                    nome=d.nome,
-                    data_cadastro=d.data_cadastro,
-                    notas=d.notas,
-                    media=d.media(),
-                    status=d.status()
-                )
-                for d in a.disciplinas
-            ],
+            disciplinas=[_disciplina_out(d) for d in a.disciplinas],
         )
     except ValueError as e:
         raise HTTPException(404, str(e))
 
 # ---------- COURSES ----------
 @app.get('/students/{aid}/courses', response_model=List[DisciplinaOut])
-def list_courses(aid: str, name: Optional[str] = None, stage_with_grade: Optional[str] = None, date_min: Optional[str] = None, date_max: Optional[str] = None, token: str = Depends(require_token)):
+def list_courses(aid: str, name: Optional[str] = None, stage_with_grade: Optional[str] = None, date_min: Optional[str] = None, date_max: Optional[str] = None, session: auth.Session = Depends(require_token)):
     a = db.find_aluno(aid)
     ds = a.disciplinas
     if nonempty(name):
@@ -193,85 +291,241 @@ def list_courses(aid: str, name: Optional[str] = None, stage_with_grade: Optiona
     if nonempty(date_max):
         ensure_date(date_max)
         ds = [d for d in ds if to_date(d.data_cadastro) <= to_date(date_max)]
-    return [
-        DisciplinaOut(
-            id=d.id,
-            nome=d.nome,
-            data_cadastro=d.data_cadastro,
-            notas=d.notas,
-            media=d.media(),
-            status=d.status()
-        )
-        for d in ds
-    ]
+    return [_disciplina_out(d) for d in ds]
+
+@app.get('/students/{aid}/courses/{did}', response_model=DisciplinaOut)
+def get_course(aid: str, did: str, session: auth.Session = Depends(require_token)):
+    try:
+        return _disciplina_out(db.find_disciplina(aid, did))
+    except ValueError as e:
+        raise HTTPException(404, str(e))
 
 @app.post('/students/{aid}/courses', response_model=DisciplinaOut)
-def create_course(aid: str, body: DisciplinaIn, token: str = Depends(require_token)):
+def create_course(aid: str, body: DisciplinaIn, session: auth.Session = Depends(require_writer)):
     try:
-        d = db.add_disciplina(aid, body.nome, body.data_cadastro)
-        return DisciplinaOut(id=d.id, nome=d.nome, data_cadastro=d.data_cadastro, notas=d.notas, media=d.media(), status=d.status())
+        d = db.add_disciplina(aid, body.nome, body.data_cadastro, actor=session.username)
+        return _disciplina_out(d)
     except ValueError as e:
         raise HTTPException(404, str(e))
 
 @app.put('/students/{aid}/courses/{did}', response_model=DisciplinaOut)
-def update_course(aid: str, did: str, body: DisciplinaIn, token: str = Depends(require_token)):
+def update_course(aid: str, did: str, body: DisciplinaIn, session: auth.Session = Depends(require_writer)):
     try:
-        d = db.update_disciplina(aid, did, nome=body.nome, data_cadastro=body.data_cadastro)
-        return DisciplinaOut(id=d.id, nome=d.nome, data_cadastro=d.data_cadastro, notas=d.notas, media=d.media(), status=d.status())
+        d = db.update_disciplina(aid, did, nome=body.nome, data_cadastro=body.data_cadastro, actor=session.username)
+        return _disciplina_out(d)
     except ValueError as e:
         raise HTTPException(404, str(e))
 
 @app.delete('/students/{aid}/courses/{did}')
-def delete_course(aid: str, did: str, token: str = Depends(require_token)):
+def delete_course(aid: str, did: str, session: auth.Session = Depends(require_writer)):
     try:
-        db.del_disciplina(aid, did)
+        db.del_disciplina(aid, did, actor=session.username)
         return {'ok': True}
     except ValueError as e:
         raise HTTPException(404, str(e))
 
 @app.patch('/students/{aid}/courses/{did}/grade', response_model=DisciplinaOut)
-def set_grade(aid: str, did: str, body: NotaIn, token: str = Depends(require_token)):
+def set_grade(aid: str, did: str, body: NotaIn, session: auth.Session = Depends(require_writer)):
     try:
-        d = db.set_nota(aid, did, body.estagio, body.nota)
-        return DisciplinaOut(id=d.id, nome=d.nome, data_cadastro=d.data_cadastro, notas=d.notas, media=d.media(), status=d.status())
+        d = db.set_nota(aid, did, body.estagio, body.nota, actor=session.username)
+        return _disciplina_out(d)
     except ValueError as e:
         raise HTTPException(400, str(e))
 
 # ---------- CSV ----------
 @app.get('/students/{aid}/report.csv')
-def aluno_csv(aid: str, token: str = Depends(require_token)):
+def aluno_csv(aid: str, session: auth.Session = Depends(require_token)):
     a = db.find_aluno(aid)
-    sio = StringIO()
-    w = csv.writer(sio)
-    w.writerow(['Aluno', a.nome])
-    w.writerow(['Identificador', f'{a.tipo_id}: {a.identificador}'])
-    w.writerow(['Cadastro', a.data_cadastro])
-    w.writerow(['Ativo', 'SIM' if a.ativo else 'NÃO'])
-    w.writerow([])
-    w.writerow(['ID Disciplina','Nome','E1','E2','E3','Média','Status','Cadastro'])
-    for d in a.disciplinas:
-        w.writerow([d.id, d.nome, d.notas.get('E1'), d.notas.get('E2'), d.notas.get('E3'), d.media(), d.status(), d.data_cadastro])
-    sio.seek(0)
-    return StreamingResponse(iter([sio.getvalue()]), media_type='text/csv',
+    return StreamingResponse(iter([reports.boletim_csv(a)]), media_type='text/csv',
         headers={'Content-Disposition': f'attachment; filename="boletim_{a.identificador}.csv"'})
 
 @app.get('/reports/class.csv')
-def turma_csv(token: str = Depends(require_token)):
-    alunos = db.list_alunos()
-    sio = StringIO()
-    w = csv.writer(sio)
-    w.writerow(['Aluno','Tipo','Identificador','Ativo','Disciplina','E1','E2','E3','Média','Status','Cadastro'])
-    for a in alunos:
-        if not a.disciplinas:
-            w.writerow([a.nome,a.tipo_id,a.identificador,'SIM' if a.ativo else 'NÃO','(sem disciplinas)','','','','','EM CURSO',a.data_cadastro])
-        for d in a.disciplinas:
-            w.writerow([a.nome,a.tipo_id,a.identificador,'SIM' if a.ativo else 'NÃO',d.nome,d.notas.get('E1'),d.notas.get('E2'),d.notas.get('E3'),d.media(),d.status(),d.data_cadastro])
-    sio.seek(0)
-    return StreamingResponse(iter([sio.getvalue()]), media_type='text/csv',
-        headers={'Content-Disposition': 'attachment; filename="relatorio_turma.csv"'})
+def turma_csv(request: Request, session: auth.Session = Depends(require_token)):
+    # arquivo materializado: só os alunos alterados são renderizados de novo e o
+    # FileResponse lê o arquivo em blocos numa thread, sem montar o CSV em memória
+    path, digest = _CLASS_REPORT_FLIGHT.do(db.snapshot().version, reports.CLASS_REPORT.current)
+    # hash do conteúdo: o mesmo em todos os workers e depois de reiniciar
+    etag = f'"{digest}"'
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers={'ETag': etag})
+    resp = FileResponse(path, media_type='text/csv', filename='relatorio_turma.csv', stat_result=os.stat(path))
+    resp.headers['etag'] = etag
+    return resp
+
+# ---------- CATÁLOGO DE DISCIPLINAS ----------
+@app.get('/courses', response_model=List[CatalogoOut])
+def list_catalog(session: auth.Session = Depends(require_token)):
+    return [CatalogoOut(id=c.id, nome=c.nome, alunos=n) for c, n in db.list_catalogo()]
+
+@app.get('/courses/{ref}', response_model=CatalogoOut)
+def get_catalog_entry(ref: str, session: auth.Session = Depends(require_token)):
+    """Disciplina do catálogo pelo id ou pelo nome (sem diferenciar maiúsculas)."""
+    try:
+        c = db.find_catalogo(ref)
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+    return CatalogoOut(id=c.id, nome=c.nome, alunos=db.count_matriculas(c.id))
+
+@app.get('/courses/{ref}/students', response_model=TurmaOut)
+def course_students(ref: str, session: auth.Session = Depends(require_token)):
+    """Turma da disciplina pelo índice de matrículas: custa o tamanho da turma."""
+    try:
+        c = db.find_catalogo(ref)
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+    def build():
+        rows, stats = reports.turma(db.matriculas(c.id))
+        return TurmaOut(disciplina=CatalogoOut(id=c.id, nome=c.nome, alunos=len(rows)),
+                        alunos=rows, estatisticas=stats)
+    return _TURMA_FLIGHT.do((c.id, db.snapshot().version), build)
+
+@app.get('/courses/{ref}/report.csv')
+def course_csv(ref: str, session: auth.Session = Depends(require_token)):
+    try:
+        c = db.find_catalogo(ref)
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+    # o single-flight divide a lista de linhas já prontas; cada resposta
+    # percorre a sua, sem juntar o CSV inteiro numa string
+    lines = _COURSE_CSV_FLIGHT.do(
+        (c.id, db.snapshot().version),
+        lambda: list(reports.course_report_csv(c.nome, db.matriculas(c.id))),
+    )
+    return StreamingResponse(iter(lines), media_type='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="turma_{reports.filename_slug(c.nome)}.csv"'})
+
+# ---------- EXPORTAÇÕES ----------
+@app.post('/exports/boletins', response_model=ExportJobOut, status_code=202)
+def export_boletins(session: auth.Session = Depends(require_writer)):
+    """Gera o boletim de todos os alunos num ZIP, em segundo plano."""
+    return exports.start_boletins_export(actor=session.username)
+
+@app.get('/exports/{job_id}', response_model=ExportJobOut)
+def export_status(job_id: str, session: auth.Session = Depends(require_writer)):
+    try:
+        return exports.get_job(job_id)
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+
+@app.get('/exports/{job_id}/download')
+def export_download(job_id: str, session: auth.Session = Depends(require_writer)):
+    try:
+        job = exports.get_job(job_id)
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+    if job['status'] != exports.STATUS_DONE:
+        raise HTTPException(409, 'Exportação ainda não concluída')
+    return FileResponse(exports.zip_path(job_id), media_type='application/zip',
+                        filename=f'boletins_{job["created"][:10]}.zip')
+
+# ---------- ALTERAÇÕES ----------
+# heartbeat do SSE: mantém a conexão viva em proxies enquanto nada muda
+SSE_HEARTBEAT = float(os.environ.get('CHANGES_SSE_HEARTBEAT', '15'))
+
+@app.get('/changes', response_model=ChangesOut)
+async def get_changes(since: Optional[str] = None, limit: int = 100, wait: float = 0, session: auth.Session = Depends(require_token)):
+    try:
+        changes, version = await db.changes_async(nonempty(since), max(1, min(limit, 1000)), wait)
+    except PositionExpired as e:
+        raise HTTPException(410, f'{e}: refaça a carga completa de /students')
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {'changes': changes, 'version': version}
+
+async def _sse_changes(request: Request, version: str):
+    """Eventos SSE: um 'change' por alteração (id = versão) e comentários de heartbeat."""
+    while not await request.is_disconnected():
+        changes, version = await db.changes_async(version, 100, SSE_HEARTBEAT)
+        if not changes:
+            yield ': heartbeat\n\n'
+        for c in changes:
+            yield f"id: {c['version']}\nevent: change\ndata: {json.dumps(c, ensure_ascii=False)}\n\n"
+
+@app.get('/changes/stream')
+async def stream_changes(request: Request, since: Optional[str] = None, last_event_id: Optional[str] = Header(None), session: auth.Session = Depends(require_token)):
+    # reconexão do EventSource: Last-Event-ID tem a versão do último evento recebido
+    since = nonempty(last_event_id) or nonempty(since)
+    try:
+        if since:
+            await db.changes_async(since, 1)     # valida a versão antes de abrir o stream
+        else:
+            _, since = await db.changes_async(None)
+    except PositionExpired as e:
+        raise HTTPException(410, f'{e}: refaça a carga completa de /students')
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return StreamingResponse(_sse_changes(request, since), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # ---------- LOGS ----------
 @app.get('/logs', response_model=List[LogOut])
-def get_logs(aid: Optional[str] = None, limit: int = 100, token: str = Depends(require_token)):
-    rows = db.list_logs(aid, limit)
+def get_logs(
+    response: Response,
+    aid: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    action: Optional[str] = None,
+    actor: Optional[str] = None,
+    disciplina_id: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    session: auth.Session = Depends(require_token)
+):
+    try:
+        rows, next_cursor = db.query_logs(
+            nonempty(aid), limit, nonempty(cursor),
+            action=nonempty(action), actor=nonempty(actor), disciplina_id=nonempty(disciplina_id),
+            start=nonempty(start), end=nonempty(end),
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    # página seguinte (logs mais antigos): mesmos filtros + cursor=<X-Next-Cursor>
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
     return rows
+
+@app.get('/logs/archive', response_model=List[LogOut])
+def get_archived_logs(start: Optional[str] = None, end: Optional[str] = None, aid: Optional[str] = None, limit: int = 100, session: auth.Session = Depends(require_token)):
+    try:
+        return db.query_archived_logs(nonempty(start), nonempty(end), nonempty(aid), limit)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+@app.post('/logs/archive')
+def run_log_archival(max_age_days: Optional[int] = None, max_entries: Optional[int] = None, session: auth.Session = Depends(require_admin)):
+    return db.archive_logs(max_age_days, max_entries)
+
+# ---------- PROFILING ----------
+@app.get('/admin/profiles')
+def get_profiles(session: auth.Session = Depends(require_admin)):
+    return profiling.list_profiles()
+
+@app.get('/admin/profiles/{pid}')
+def download_profile(pid: str, format: str = 'txt', session: auth.Session = Depends(require_admin)):
+    try:
+        path = profiling.profile_path(pid, format)
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+    if format == 'txt':
+        return FileResponse(path, media_type='text/plain; charset=utf-8')
+    return FileResponse(path, media_type='application/octet-stream', filename=f'{pid}.prof')
+
+@app.post('/admin/profile-window')
+def start_profile_window(seconds: float = 10, session: auth.Session = Depends(require_admin)):
+    if not 0 < seconds <= 300:
+        raise HTTPException(400, 'Janela deve ter entre 0 e 300 segundos')
+    try:
+        return profiling.start_window(seconds)
+    except ValueError as e:
+        raise HTTPException(409, str(e))
+
+@app.get('/admin/slow-requests')
+def get_slow_requests(limit: int = 50, session: auth.Session = Depends(require_admin)):
+    return profiling.slow_requests(limit)
+
+def _profile_allowed(values) -> bool:
+    session = values.get('session')
+    return isinstance(session, auth.Session) and session.role == ROLE_ADMIN
+
+# precisa vir depois de todas as rotas
+profiling.instrument_routes(app, _profile_allowed)
@@ -0,0 +1,844 @@
+import os
+import json
+import gzip
+import heapq
+import logging
+import queue
+import shutil
+import threading
+import time
+import datetime
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+
+import metrics
+
+# --------------------------------------------------------------------------------------
+# Modos de durabilidade
+# --------------------------------------------------------------------------------------
+
+DURABILITY_BATCH = "batch"   # fsync uma vez por lote gravado
+DURABILITY_ENTRY = "entry"   # fsync após cada entrada
+DURABILITY_OS = "os"         # sem fsync: o buffer do sistema operacional decide
+
+DURABILITY_MODES = (DURABILITY_BATCH, DURABILITY_ENTRY, DURABILITY_OS)
+
+SEGMENT_MAX_ENTRIES = 5000
+
+# LogWriter: espera entre novas tentativas de gravar um lote que falhou
+# (dobra a cada falha até o máximo) e quanto tempo insistir ao encerrar
+WRITE_RETRY_INITIAL = 0.1
+WRITE_RETRY_MAX = 5.0
+WRITE_RETRY_ON_CLOSE = 5.0
+
+logger = logging.getLogger(__name__)
+
+# campos com lista de postagens (posting list) por segmento;
+# disciplina_id é lido de entry["details"]
+INDEXED_FIELDS = ("aluno_id", "action", "actor", "disciplina_id")
+
+
+def field_value(entry: Dict[str, Any], field_name: str) -> Optional[str]:
+    if field_name == "disciplina_id":
+        value = (entry.get("details") or {}).get("disciplina_id")
+    else:
+        value = entry.get(field_name)
+    return None if value is None else str(value)
+
+
+class PartialAppend(Exception):
+    """append_batch falhou depois de gravar as `written` primeiras entradas."""
+
+    def __init__(self, written: int):
+        super().__init__(f"gravação interrompida depois de {written} entradas")
+        self.written = written
+
+
+def _contains(plist: List[int], pos: int) -> bool:
+    i = bisect_left(plist, pos)
+    return i < len(plist) and plist[i] == pos
+
+
+# --------------------------------------------------------------------------------------
+# Índice por segmento
+# --------------------------------------------------------------------------------------
+
+class SegmentIndex:
+    """
+    Índice de um segmento: offset em bytes e timestamp de cada entrada
+    (na ordem de gravação, que append_batch garante ser também a ordem
+    temporal) e, para cada campo
+    indexado, valor -> lista crescente de posições dentro do segmento.
+    """
+
+    def __init__(self):
+        self.offsets: List[int] = []
+        self.timestamps: List[str] = []
+        self.size = 0
+        self.postings: Dict[str, Dict[str, List[int]]] = {f: {} for f in INDEXED_FIELDS}
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def add(self, offset: int, length: int, entry: Dict[str, Any]):
+        pos = len(self.offsets)
+        self.offsets.append(offset)
+        self.timestamps.append(entry.get("timestamp", ""))
+        self.size = offset + length
+        for field_name in INDEXED_FIELDS:
+            value = field_value(entry, field_name)
+            if value is not None:
+                self.postings[field_name].setdefault(value, []).append(pos)
+
+    def positions(self, field_name: str, value: str) -> List[int]:
+        return self.postings.get(field_name, {}).get(value, [])
+
+    def match(self, filters: Dict[str, str], lo: int, hi: int) -> Iterator[int]:
+        """
+        Posições em [lo, hi) que satisfazem todos os filtros, da maior para a
+        menor. Percorre a menor posting list e confere as demais por busca
+        binária (interseção), sem tocar nas entradas.
+        """
+        if not filters:
+            yield from range(hi - 1, lo - 1, -1)
+            return
+        lists = sorted((self.positions(f, v) for f, v in filters.items()), key=len)
+        first, rest = lists[0], lists[1:]
+        for n in range(bisect_left(first, hi) - 1, bisect_left(first, lo) - 1, -1):
+            pos = first[n]
+            if all(_contains(plist, pos) for plist in rest):
+                yield pos
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "fields": list(INDEXED_FIELDS),
+            "size": self.size,
+            "offsets": self.offsets,
+            "timestamps": self.timestamps,
+            "postings": self.postings,
+        }
+
+    @classmethod
+    def from_dict(cls, obj: Dict[str, Any]) -> "SegmentIndex":
+        if obj.get("fields") != list(INDEXED_FIELDS):
+            raise ValueError("Índice salvo com outros campos")
+        idx = cls()
+        idx.size = obj["size"]
+        idx.offsets = obj["offsets"]
+        idx.timestamps = obj["timestamps"]
+        for field_name in INDEXED_FIELDS:
+            idx.postings[field_name] = obj.get("postings", {}).get(field_name, {})
+        return idx
+
+
+def parse_cursor(cursor: str) -> Tuple[int, int]:
+    """Cursor keyset no formato 'segmento:posição'. Lança ValueError se inválido."""
+    seg, _, pos = cursor.partition(":")
+    return int(seg), int(pos)
+
+
+def format_cursor(seg: int, pos: int) -> str:
+    return f"{seg}:{pos}"
+
+
+class PositionExpired(ValueError):
+    """Posição de leitura num segmento que já saiu do log quente (arquivado)."""
+
+
+# --------------------------------------------------------------------------------------
+# Log segmentado (append-only)
+# --------------------------------------------------------------------------------------
+
+class SegmentLog:
+    """
+    Log de auditoria append-only dividido em segmentos JSON Lines numerados
+    (00000001.jsonl, 00000002.jsonl, ...). Apenas o último segmento recebe
+    novas entradas; quando ele atinge `segment_max_entries`, um novo é aberto
+    e o índice do segmento fechado é salvo ao lado dele (NNNNNNNN.idx.json).
+
+    Os índices ficam em memória, então uma consulta só lê do disco as
+    entradas que realmente vai devolver.
+
+    Com `write_lock` (um interprocess.FileLock) vários processos podem
+    gravar no mesmo log: a escrita é serializada pelo lock e cada processo
+    incorpora ao seu índice o que os outros gravaram, rotacionaram ou
+    arquivaram (_catch_up) antes de gravar e de consultar. Com `generations`
+    (um interprocess.Generations), cada gravação, rotação ou arquivamento
+    incrementa o contador "logs" e _catch_up só vai ao disco quando ele mudou.
+    """
+
+    def __init__(self, directory: str, segment_max_entries: int = SEGMENT_MAX_ENTRIES,
+                 write_lock=None, generations=None):
+        self.directory = directory
+        self.segment_max_entries = segment_max_entries
+        self.generations = generations
+        self._seen_gen: Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+
+        # chamado (fora dos locks) sempre que um segmento é fechado
+        self.on_seal: Optional[Callable[[], None]] = None
+
+        self._lock = threading.RLock()        # protege os índices
+        self._appended = threading.Condition(self._lock)   # avisada a cada lote publicado
+        # serializa append/rotação/arquivamento (entre processos, se for um FileLock)
+        self._write_lock = write_lock or threading.RLock()
+        self._indexes: Dict[int, SegmentIndex] = {}
+        segs = self.segments()
+        for seg in segs:
+            self._indexes[seg] = self._load_index(seg, sealed=(seg != segs[-1]))
+        self._active = segs[-1] if segs else 1
+        self._indexes.setdefault(self._active, SegmentIndex())
+
+    # ---------- segmentos ----------
+    def segments(self) -> List[int]:
+        out = []
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            if ext == ".jsonl" and stem.isdigit():
+                out.append(int(stem))
+        return sorted(out)
+
+    def segment_path(self, seg: int) -> str:
+        return os.path.join(self.directory, f"{seg:08d}.jsonl")
+
+    def index_path(self, seg: int) -> str:
+        return os.path.join(self.directory, f"{seg:08d}.idx.json")
+
+    def _load_index(self, seg: int, sealed: bool) -> SegmentIndex:
+        """
+        Usa o índice salvo de um segmento fechado quando ele confere com o
+        tamanho do arquivo; caso contrário reconstrói lendo o segmento.
+        """
+        path = self.segment_path(seg)
+        if sealed and os.path.exists(self.index_path(seg)):
+            try:
+                with open(self.index_path(seg), "r", encoding="utf-8") as f:
+                    idx = SegmentIndex.from_dict(json.load(f))
+                if idx.size == os.path.getsize(path):
+                    return idx
+            except (OSError, ValueError, KeyError):
+                pass
+
+        idx = SegmentIndex()
+        with open(path, "rb") as f:
+            offset = 0
+            for line in f:
+                if line.strip():
+                    idx.add(offset, len(line), json.loads(line))
+                offset += len(line)
+        if sealed:
+            self._save_index(seg, idx)
+        return idx
+
+    def _save_index(self, seg: int, idx: SegmentIndex):
+        tmp = self.index_path(seg) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(idx.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp, self.index_path(seg))
+
+    def _index_tail(self, seg: int, idx: SegmentIndex):
+        """Indexa as linhas completas gravadas depois de idx.size (por outro processo)."""
+        try:
+            with open(self.segment_path(seg), "rb") as f:
+                f.seek(idx.size)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        offset = idx.size
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break  # linha ainda sendo gravada
+            if line.strip():
+                idx.add(offset, len(line), json.loads(line))
+            offset += len(line)
+
+    def _catch_up(self):
+        """
+        Sincroniza os índices com o disco: entradas novas no segmento ativo,
+        segmentos abertos e segmentos arquivados por outro processo. Custa
+        alguns stat() quando nada mudou, ou nenhum com `generations`.
+        """
+        gen = self.generations.current("logs") if self.generations else None
+        if gen is not None and gen == self._seen_gen:
+            return
+        with self._lock:
+            self._seen_gen = gen
+            idx = self._indexes[self._active]
+            try:
+                if os.path.getsize(self.segment_path(self._active)) > idx.size:
+                    self._index_tail(self._active, idx)
+            except OSError:
+                pass
+            while os.path.exists(self.segment_path(self._active + 1)):
+                self._index_tail(self._active, self._indexes[self._active])
+                self._active += 1
+                self._indexes[self._active] = SegmentIndex()
+                self._index_tail(self._active, self._indexes[self._active])
+            for seg in sorted(self._indexes):
+                if seg == self._active or os.path.exists(self.segment_path(seg)):
+                    break
+                del self._indexes[seg]
+
+    def count(self) -> int:
+        with self._lock:
+            return sum(len(idx) for idx in self._indexes.values())
+
+    # ---------- escrita ----------
+    def append_batch(self, entries: List[Dict[str, Any]], durability: str = DURABILITY_BATCH):
+        """
+        Acrescenta as entradas ao segmento ativo, abrindo um novo segmento
+        quando o limite é atingido. O fsync segue o modo de durabilidade.
+
+        Se falhar no meio, lança PartialAppend com quantas entradas ficaram
+        gravadas (e indexadas), para quem tentar de novo não as repetir.
+
+        Sob o write lock, uma entrada com timestamp anterior ao último já
+        gravado (gerada antes, mas gravada depois da de outro processo ou
+        thread) recebe o timestamp do último: o log fica em ordem de tempo e
+        _select pode buscar o período por busca binária.
+        """
+        with self._write_lock:
+            self._catch_up()
+            try:
+                sealed = self._append_locked(entries, durability)
+            finally:
+                self._bump()
+        if sealed and self.on_seal:
+            self.on_seal()
+
+    def _seal_active(self):
+        self._save_index(self._active, self._indexes[self._active])
+        with self._lock:
+            self._active += 1
+            self._indexes[self._active] = SegmentIndex()
+        # cria o novo segmento já: é assim que outros processos percebem a rotação
+        open(self.segment_path(self._active), "ab").close()
+
+    def _last_timestamp(self) -> str:
+        with self._lock:
+            for seg in sorted(self._indexes, reverse=True):
+                if self._indexes[seg].timestamps:
+                    return self._indexes[seg].timestamps[-1]
+        return ""
+
+    def _append_locked(self, entries: List[Dict[str, Any]], durability: str) -> bool:
+        sealed = False
+        last = self._last_timestamp()
+        i = 0
+        try:
+            while i < len(entries):
+                active_idx = self._indexes[self._active]
+                if len(active_idx) >= self.segment_max_entries:
+                    self._seal_active()
+                    sealed = True
+                    continue
+
+                room = self.segment_max_entries - len(active_idx)
+                chunk = entries[i:i + room]
+                written: List[Tuple[int, int, Dict[str, Any]]] = []
+                with open(self.segment_path(self._active), "ab") as f:
+                    offset = start = f.tell()
+                    try:
+                        for e in chunk:
+                            ts = e.get("timestamp")
+                            if ts and ts < last:
+                                e = dict(e, timestamp=last)
+                            elif ts:
+                                last = ts
+                            line = (json.dumps(e, ensure_ascii=False) + "\n").encode("utf-8")
+                            f.write(line)
+                            metrics.record_write("logs", len(line))
+                            written.append((offset, len(line), e))
+                            offset += len(line)
+                            if durability == DURABILITY_ENTRY:
+                                f.flush()
+                                os.fsync(f.fileno())
+                        if durability == DURABILITY_BATCH:
+                            f.flush()
+                            os.fsync(f.fileno())
+                    except Exception:
+                        # desfaz o trecho gravado pela metade: a nova tentativa grava de novo
+                        f.truncate(start)
+                        raise
+
+                # só publica no índice depois que os bytes estão no arquivo; uma
+                # consulta concorrente (_catch_up) pode já ter indexado parte deles
+                with self._lock:
+                    for offset, length, e in written:
+                        if offset >= active_idx.size:
+                            active_idx.add(offset, length, e)
+                    self._appended.notify_all()
+                i += len(chunk)
+        except Exception as e:
+            raise PartialAppend(i) from e
+        return sealed
+
+    # ---------- retenção ----------
+    def archive_old_segments(
+        self,
+        archive: "LogArchive",
+        max_age_days: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        now: Optional[datetime.datetime] = None,
+    ) -> List[int]:
+        """
+        Move para o arquivo (gzip) os segmentos fechados mais antigos enquanto
+        o log quente tiver mais que `max_entries` entradas ou enquanto o
+        segmento inteiro for mais velho que `max_age_days`.
+
+        O controle é por segmento: o log quente pode ficar até um segmento
+        acima de `max_entries`. Retorna os números dos segmentos arquivados.
+        """
+        cutoff = None
+        if max_age_days:
+            now = now or datetime.datetime.now()
+            cutoff = (now - datetime.timedelta(days=max_age_days)).isoformat(timespec="seconds")
+
+        archived: List[int] = []
+        with self._write_lock:
+            self._catch_up()
+            # segmento ativo inteiro velho demais (pouco tráfego): fecha para poder arquivar
+            active_idx = self._indexes[self._active]
+            if cutoff and len(active_idx) and active_idx.timestamps[-1] < cutoff:
+                self._seal_active()
+
+            total = self.count()
+            for seg in sorted(self._indexes):
+                if seg == self._active:
+                    break
+                idx = self._indexes[seg]
+                too_many = max_entries is not None and total > max_entries
+                too_old = cutoff is not None and (not idx.timestamps or idx.timestamps[-1] < cutoff)
+                if not (too_many or too_old):
+                    break
+
+                archive.add(seg, self.segment_path(seg), idx)
+                with self._lock:
+                    del self._indexes[seg]
+                for path in (self.segment_path(seg), self.index_path(seg)):
+                    if os.path.exists(path):
+                        os.remove(path)
+                total -= len(idx)
+                archived.append(seg)
+            self._bump()
+        return archived
+
+    def _bump(self):
+        if self.generations:
+            self.generations.bump("logs")
+
+    # ---------- leitura ----------
+    def iter_entries(self) -> Iterator[Dict[str, Any]]:
+        """Percorre todas as entradas, da mais antiga para a mais nova."""
+        for seg in self.segments():
+            with open(self.segment_path(seg), "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        yield json.loads(line)
+
+    def query(
+        self,
+        filters: Optional[Dict[str, str]] = None,
+        limit: int = 100,
+        before: Optional[Tuple[int, int]] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[int, int]]]:
+        """
+        Devolve as `limit` entradas mais novas que satisfazem os filtros
+        (igualdade sobre campos indexados, combinados com E) e o intervalo
+        de timestamps [start, end], da mais nova para a mais antiga.
+
+        `before` é um cursor keyset (segmento, posição): só entradas
+        estritamente anteriores a ele são consideradas. O segundo valor
+        retornado é o cursor da próxima página, ou None se acabou.
+        """
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        for field_name in filters:
+            if field_name not in INDEXED_FIELDS:
+                raise ValueError(f"Campo não indexado: {field_name}")
+
+        while True:
+            self._catch_up()
+            hits = self._select(filters, limit + 1, before, start, end)
+            more = len(hits) > limit
+            hits = hits[:limit]
+            try:
+                entries = self._read(hits)
+                break
+            except FileNotFoundError:
+                # segmento arquivado entre a seleção e a leitura: seleciona de novo
+                continue
+        next_cursor = hits[-1] if (more and hits) else None
+        return entries, next_cursor
+
+    def head(self) -> Tuple[int, int]:
+        """Posição (segmento, posição) onde a próxima entrada será gravada."""
+        self._catch_up()
+        with self._lock:
+            return self._active, len(self._indexes[self._active])
+
+    def read_after(
+        self,
+        since: Tuple[int, int],
+        limit: int = 100,
+        actions: Optional[List[str]] = None,
+    ) -> Tuple[List[Tuple[Tuple[int, int], Dict[str, Any]]], Tuple[int, int]]:
+        """
+        Entradas a partir da posição `since` (inclusive), da mais antiga para
+        a mais nova, opcionalmente só das `actions` (pelas posting lists).
+        Devolve [(posição, entrada)] e a posição de onde continuar.
+
+        Lança PositionExpired se `since` está num segmento já arquivado e
+        ValueError se está além do fim do log.
+        """
+        while True:
+            self._catch_up()
+            hits: List[Tuple[int, int]] = []
+            with self._lock:
+                head = (self._active, len(self._indexes[self._active]))
+                if since > head:
+                    raise ValueError("Posição além do fim do log")
+                if since[0] < min(self._indexes):
+                    raise PositionExpired("Posição já arquivada")
+                nxt = head
+                for seg in sorted(self._indexes):
+                    if seg < since[0]:
+                        continue
+                    idx = self._indexes[seg]
+                    lo = since[1] if seg == since[0] else 0
+                    if actions:
+                        lists = (idx.positions("action", a) for a in actions)
+                        positions = heapq.merge(*(p[bisect_left(p, lo):] for p in lists))
+                    else:
+                        positions = iter(range(lo, len(idx)))
+                    for pos in positions:
+                        if len(hits) >= limit:
+                            nxt = hits[-1][0], hits[-1][1] + 1
+                            break
+                        hits.append((seg, pos))
+                    if nxt != head:
+                        break
+            try:
+                entries = self._read(hits)
+                break
+            except FileNotFoundError:
+                continue
+        return list(zip(hits, entries)), nxt
+
+    def wait_after(self, pos: Tuple[int, int], timeout: float, poll: float = 1.0) -> bool:
+        """
+        Espera até haver alguma entrada em `pos` ou depois. Entradas deste
+        processo acordam na hora; as de outro processo são vistas a cada
+        `poll` segundos. Retorna False se o timeout expirar.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.head() > pos:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            with self._appended:
+                if (self._active, len(self._indexes[self._active])) > pos:
+                    return True
+                self._appended.wait(min(remaining, poll))
+
+    def _select(self, filters: Dict[str, str], k: int,
+                before: Optional[Tuple[int, int]],
+                start: Optional[str] = None,
+                end: Optional[str] = None) -> List[Tuple[int, int]]:
+        out: List[Tuple[int, int]] = []
+        with self._lock:
+            for seg in sorted(self._indexes, reverse=True):
+                if len(out) >= k:
+                    break
+                if before and seg > before[0]:
+                    continue
+                idx = self._indexes[seg]
+                if not len(idx):
+                    continue
+                if start and idx.timestamps[-1] < start:
+                    break  # este e os segmentos anteriores são mais velhos que start
+                if end and idx.timestamps[0] > end:
+                    continue
+
+                # janela de posições pelo tempo (timestamps em ordem crescente)
+                lo = bisect_left(idx.timestamps, start) if start else 0
+                hi = bisect_right(idx.timestamps, end) if end else len(idx)
+                if before and seg == before[0]:
+                    hi = min(hi, before[1])
+
+                for pos in idx.match(filters, lo, hi):
+                    out.append((seg, pos))
+                    if len(out) >= k:
+                        break
+        return out
+
+    def _read(self, hits: List[Tuple[int, int]]) -> List[Dict[str, Any]]:
+        """Lê do disco só as entradas selecionadas, um open por segmento."""
+        out: List[Dict[str, Any]] = []
+        current_seg = None
+        f = None
+        try:
+            for seg, pos in hits:
+                if seg != current_seg:
+                    if f:
+                        f.close()
+                    current_seg = seg
+                    f = open(self.segment_path(seg), "rb")
+                with self._lock:
+                    idx = self._indexes.get(seg)
+                if idx is None:
+                    raise FileNotFoundError(self.segment_path(seg))
+                f.seek(idx.offsets[pos])
+                line = f.readline()
+                metrics.record_read("logs", len(line))
+                out.append(json.loads(line))
+        finally:
+            if f:
+                f.close()
+        return out
+
+
+# --------------------------------------------------------------------------------------
+# Arquivo morto (segmentos comprimidos)
+# --------------------------------------------------------------------------------------
+
+class LogArchive:
+    """
+    Segmentos antigos comprimidos com gzip (NNNNNNNN.jsonl.gz) e um índice
+    (index.json) com o intervalo de tempo e a quantidade de cada segmento,
+    para que uma consulta por período só descomprima os segmentos que
+    cruzam o intervalo pedido.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._ranges: List[Dict[str, Any]] = self._load_ranges()
+
+    def index_path(self) -> str:
+        return os.path.join(self.directory, "index.json")
+
+    def archive_path(self, seg: int) -> str:
+        return os.path.join(self.directory, f"{seg:08d}.jsonl.gz")
+
+    def _load_ranges(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.index_path()):
+            return []
+        with open(self.index_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def ranges(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._ranges = self._load_ranges()  # inclui o que outros processos arquivaram
+            return [dict(r) for r in self._ranges]
+
+    def add(self, seg: int, src_path: str, idx: SegmentIndex):
+        tmp = self.archive_path(seg) + ".tmp"
+        with open(src_path, "rb") as src, gzip.open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp, self.archive_path(seg))
+
+        with self._lock:
+            # relê do disco: outro processo pode ter arquivado segmentos também
+            self._ranges = [r for r in self._load_ranges() if r["segment"] != seg]
+            self._ranges.append({
+                "segment": seg,
+                "ts_min": idx.timestamps[0] if idx.timestamps else "",
+                "ts_max": idx.timestamps[-1] if idx.timestamps else "",
+                "count": len(idx),
+            })
+            self._ranges.sort(key=lambda r: r["segment"])
+            tmp = self.index_path() + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._ranges, f, indent=2)
+            os.replace(tmp, self.index_path())
+
+    def query(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        filters: Optional[Dict[str, str]] = None,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        """
+        Entradas arquivadas com timestamp em [start, end] (ISO, inclusivo),
+        da mais nova para a mais antiga. Só descomprime os segmentos cujo
+        intervalo cruza o período.
+        """
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        out: List[Dict[str, Any]] = []
+        for r in reversed(self.ranges()):
+            if len(out) >= limit:
+                break
+            if (start and r["ts_max"] < start) or (end and r["ts_min"] > end):
+                continue
+            matches = []
+            with gzip.open(self.archive_path(r["segment"]), "rt", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    e = json.loads(line)
+                    ts = e.get("timestamp", "")
+                    if (start and ts < start) or (end and ts > end):
+                        continue
+                    if any(field_value(e, k) != v for k, v in filters.items()):
+                        continue
+                    matches.append(e)
+            out.extend(reversed(matches))
+        return out[:limit]
+
+
+# --------------------------------------------------------------------------------------
+# Escritor em segundo plano
+# --------------------------------------------------------------------------------------
+
+_FLUSH = object()
+_STOP = object()
+
+
+class LogWriter:
+    """
+    Fila + thread que agrupa entradas de log em lotes e as grava no
+    SegmentLog quando o lote enche (`batch_size`) ou quando o intervalo
+    (`flush_interval`, em segundos) expira.
+
+    `submit` nunca faz I/O: a requisição só enfileira a entrada.
+    """
+
+    def __init__(
+        self,
+        log: SegmentLog,
+        durability: str = DURABILITY_BATCH,
+        batch_size: int = 256,
+        flush_interval: float = 0.2,
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Modo de durabilidade inválido: {durability}")
+        self.log = log
+        self.durability = durability
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._cond = threading.Condition()
+        self._submitted = 0
+        self._written = 0
+        self._thread: Optional[threading.Thread] = None
+        self._closing = False
+
+    # ---------- API ----------
+    def submit(self, entry: Dict[str, Any]):
+        with self._cond:
+            self._ensure_started()
+            self._submitted += 1
+            self._queue.put(entry)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Bloqueia até que tudo o que foi enfileirado até agora esteja gravado.
+        Retorna False se o timeout expirar antes disso.
+        """
+        with self._cond:
+            target = self._submitted
+            if self._written >= target:
+                return True
+            self._ensure_started()
+            self._queue.put(_FLUSH)
+            return self._cond.wait_for(lambda: self._written >= target, timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        """Drena as entradas pendentes e encerra a thread."""
+        with self._cond:
+            thread = self._thread
+            if thread is None:
+                return
+            self._thread = None
+            self._closing = True
+            self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def pending(self) -> int:
+        with self._cond:
+            return self._submitted - self._written
+
+    # ---------- thread ----------
+    def _ensure_started(self):
+        if self._thread is None:
+            self._closing = False
+            self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            batch: List[Dict[str, Any]] = []
+            if item is _STOP:
+                stop = True
+            elif item is not _FLUSH:
+                batch.append(item)
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is _FLUSH:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+
+            if stop:
+                # drena o que ainda estiver na fila antes de sair
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _FLUSH and item is not _STOP:
+                        batch.append(item)
+
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        """
+        Grava o lote, tentando de novo (com espera crescente) até conseguir:
+        as entradas só contam como gravadas depois de estarem no log, então
+        flush() não dá falso sucesso. Encerrando (close), insiste por
+        WRITE_RETRY_ON_CLOSE segundos e registra o que não conseguiu gravar.
+        """
+        delay = WRITE_RETRY_INITIAL
+        give_up: Optional[float] = None
+        while batch:
+            try:
+                self.log.append_batch(batch, self.durability)
+                done = len(batch)
+            except Exception as e:
+                done = e.written if isinstance(e, PartialAppend) else 0
+                logger.error("Falha ao gravar %d entradas de log; nova tentativa em %.1fs",
+                             len(batch) - done, delay, exc_info=e.__cause__ or e)
+            if done:
+                batch = batch[done:]
+                with self._cond:
+                    self._written += done
+                    self._cond.notify_all()
+            if not batch:
+                return
+            if self._closing:
+                give_up = give_up or time.monotonic() + WRITE_RETRY_ON_CLOSE
+                if time.monotonic() >= give_up:
+                    logger.error("%d entradas de log não gravadas ao encerrar", len(batch))
+                    return
+            time.sleep(delay)
+            delay = min(delay * 2, WRITE_RETRY_MAX)
@@ -1,14 +1,31 @@
 import json
 import secrets
+import tempfile
 import time
 import os
+import sys
+import atexit
+import heapq
+import math
 import hashlib
-from typing import Optional
-
-BASE_DIR = os.path.dirname(__file__)
-DATA_DIR = os.path.join(BASE_DIR, "data")
-ADMIN_FILE = os.path.join(DATA_DIR, "admin.json")
+import hmac
+import base64
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+import metrics
+from util import DATA_DIR
+from interprocess import GENERATIONS, Generations, FileLock
+from users import UserStore, ROLES, ROLE_ADMIN, ROLE_TEACHER, normalize_username
+
+ADMIN_FILE = os.path.join(DATA_DIR, "admin.json")   # formato antigo (admin único)
+USERS_DIR = os.path.join(DATA_DIR, "users")
 TOKENS_FILE = os.path.join(DATA_DIR, "tokens.json")
+TOKEN_KEY_FILE = os.path.join(DATA_DIR, "token.key")
+REVOKED_FILE = os.path.join(DATA_DIR, "revoked.json")
 
 os.makedirs(DATA_DIR, exist_ok=True)
 
@@ -20,15 +37,26 @@ def _load_json(path: str):
         return {}
     try:
         with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+            text = f.read()
+        metrics.record_read(os.path.basename(path), len(text))
+        return json.loads(text)
     except Exception:
         return {}
 
 
-def _save_json(path: str, data):
+def _replace_json(path: str, data):
+    """Grava por troca atômica com um tmp exclusivo do processo (mkstemp na mesma pasta)."""
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                               dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
 
 
 # -----------------------------
@@ -49,7 +77,8 @@ def _hash_password(password: str, salt: str) -> str:
 
 
 def _verify_password(password: str, salt: str, password_hash: str) -> bool:
-    return _hash_password(password, salt) == password_hash
+    # comparação em tempo constante
+    return hmac.compare_digest(_hash_password(password, salt), password_hash)
 
 
 def _migrate_plain_password(data: dict) -> dict:
@@ -71,42 +100,70 @@ def _migrate_plain_password(data: dict) -> dict:
 
 
 # -----------------------------
-# Admin
+# Usuários
 # -----------------------------
-def ensure_admin():
+# Cada conta fica em data/users/<username>.json (ver users.py). O antigo
+# admin.json vira a conta "admin" na primeira execução.
+USERS = UserStore(USERS_DIR, GENERATIONS)
+
+
+@dataclass
+class Session:
+    token: str
+    username: str
+    role: str
+
+
+def _user_record(username: str) -> Optional[dict]:
     """
-    Garante que existe um admin.
-    Se não houver, cria admin/admin com senha 1234 (já hasheada).
+    Registro do usuário (cache do UserStore), migrando senha em texto puro
+    se preciso. O arquivo só é gravado quando a migração de fato acontece.
     """
-    data = _load_json(ADMIN_FILE)
+    data = USERS.get(username)
     if not data:
-        salt = secrets.token_hex(16)
-        default_pwd = "1234"
-        data = {
-            "username": "admin",
-            "salt": salt,
-            "password_hash": _hash_password(default_pwd, salt),
-        }
-        _save_json(ADMIN_FILE, data)
-        print("✅ Admin padrão criado: usuário=admin senha=1234 (armazenada com hash)")
+        return None
+    if "password" in data and not ("password_hash" in data and "salt" in data):
+        data = _migrate_plain_password(dict(data))
+        USERS.put(data)
+    return data
+
+
+def ensure_admin():
+    """
+    Garante que existe um admin numa instalação nova (sem nenhum usuário).
+    Migra o antigo admin.json (renomeado depois para admin.json.migrated)
+    ou, se não houver, cria admin/admin com senha 1234 (já hasheada).
+    Com usuários cadastrados não faz nada: um admin removido de propósito
+    não volta no próximo start.
+    """
+    if USERS.usernames():
         return
 
-    # migra formato antigo, se existir
-    data = _migrate_plain_password(data)
-    _save_json(ADMIN_FILE, data)
+    legacy = _load_json(ADMIN_FILE)
+    if legacy.get("username"):
+        data = _migrate_plain_password(dict(legacy))
+        data["role"] = ROLE_ADMIN
+        USERS.put(data)
+        os.replace(ADMIN_FILE, ADMIN_FILE + ".migrated")
+        return
+
+    salt = secrets.token_hex(16)
+    default_pwd = "1234"
+    USERS.put({
+        "username": "admin",
+        "role": ROLE_ADMIN,
+        "salt": salt,
+        "password_hash": _hash_password(default_pwd, salt),
+        "token_epoch": _now_ms(),
+    })
+    print("✅ Admin padrão criado: usuário=admin senha=1234 (armazenada com hash)")
 
 
 def verify_user(username: str, password: str) -> bool:
-    data = _load_json(ADMIN_FILE)
+    data = _user_record(username)
     if not data:
         return False
 
-    data = _migrate_plain_password(data)
-    _save_json(ADMIN_FILE, data)
-
-    if data.get("username") != username:
-        return False
-
     salt = data.get("salt")
     password_hash = data.get("password_hash")
     if not salt or not password_hash:
@@ -115,12 +172,93 @@ def verify_user(username: str, password: str) -> bool:
     return _verify_password(password, salt, password_hash)
 
 
-def change_password(old_pwd: str, new_pwd: str):
-    data = _load_json(ADMIN_FILE)
+def get_user(username: str) -> Optional[dict]:
+    """Usuário sem os campos de senha, ou None."""
+    data = USERS.get(username)
+    if not data:
+        return None
+    return {"username": data["username"], "role": data.get("role", ROLE_ADMIN)}
+
+
+def list_users() -> List[dict]:
+    return [u for u in (get_user(name) for name in USERS.usernames()) if u]
+
+
+def create_user(username: str, password: str, role: str = ROLE_TEACHER) -> dict:
+    username = normalize_username(username)
+    if role not in ROLES:
+        raise ValueError(f"Papel inválido: {role}")
+    if USERS.get(username):
+        raise ValueError("Usuário já existe.")
+    salt = secrets.token_hex(16)
+    # tokens assinados de uma conta antiga com o mesmo nome não valem nesta
+    USERS.put({
+        "username": username,
+        "role": role,
+        "salt": salt,
+        "password_hash": _hash_password(password, salt),
+        "token_epoch": _now_ms(),
+    })
+    return get_user(username)
+
+
+def update_user(username: str, role: Optional[str] = None, password: Optional[str] = None) -> dict:
+    data = _user_record(username)
     if not data:
-        raise ValueError("Admin não configurado.")
+        raise ValueError("Usuário não encontrado.")
+    data = dict(data)
+    if role is not None:
+        if role not in ROLES:
+            raise ValueError(f"Papel inválido: {role}")
+        data["role"] = role
+    if password is not None:
+        data["salt"] = secrets.token_hex(16)
+        data["password_hash"] = _hash_password(password, data["salt"])
+        data["token_epoch"] = _now_ms()
+    USERS.put(data)
+    if password is not None:
+        revoke_user_tokens(username)
+    return get_user(username)
+
+
+def delete_user(username: str):
+    if not USERS.delete(username):
+        raise ValueError("Usuário não encontrado.")
+    revoke_user_tokens(username)
 
-    data = _migrate_plain_password(data)
+
+# -----------------------------
+# Pool dedicado para o PBKDF2
+# -----------------------------
+# O PBKDF2 (100k iterações) roda num pool próprio, fora do threadpool
+# compartilhado do FastAPI. Acima de HASH_WORKERS + HASH_QUEUE_DEPTH
+# verificações simultâneas, o login é recusado em vez de enfileirar sem fim.
+HASH_WORKERS = int(os.environ.get("AUTH_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE_DEPTH = int(os.environ.get("AUTH_HASH_QUEUE_DEPTH", "32"))
+
+_HASH_POOL = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="pbkdf2")
+_HASH_SLOTS = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE_DEPTH)
+
+
+class AuthBusyError(RuntimeError):
+    """Fila de verificação de senha cheia."""
+
+
+async def verify_user_async(username: str, password: str) -> bool:
+    """verify_user no pool dedicado. Lança AuthBusyError se a fila estiver cheia."""
+    if not _HASH_SLOTS.acquire(blocking=False):
+        raise AuthBusyError("Muitos logins simultâneos. Tente novamente em instantes.")
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_HASH_POOL, verify_user, username, password)
+    finally:
+        _HASH_SLOTS.release()
+
+
+def change_password(old_pwd: str, new_pwd: str, username: str = "admin"):
+    data = _user_record(username)
+    if not data:
+        raise ValueError("Usuário não encontrado.")
 
     salt = data.get("salt")
     password_hash = data.get("password_hash")
@@ -128,39 +266,480 @@ def change_password(old_pwd: str, new_pwd: str):
         raise ValueError("Senha antiga incorreta.")
 
     new_salt = secrets.token_hex(16)
-    data["salt"] = new_salt
-    data["password_hash"] = _hash_password(new_pwd, new_salt)
-    _save_json(ADMIN_FILE, data)
+    data = dict(data, salt=new_salt, password_hash=_hash_password(new_pwd, new_salt),
+                token_epoch=_now_ms())
+    USERS.put(data)
+    revoke_user_tokens(username)
 
 
 # -----------------------------
 # Tokens
 # -----------------------------
 TOKEN_EXPIRATION = 8 * 60 * 60  # 8 horas
+TOKEN_FLUSH_INTERVAL = 1.0      # segundos entre gravações (write-behind)
+TOKEN_SWEEP_INTERVAL = 60.0     # segundos entre varreduras de expirados
 
 
-def issue_token() -> str:
+class TokenStore:
+    """
+    Tabela de tokens em memória (token -> (expiração em epoch, usuário)).
+
+    - validação: consulta ao dict, sem I/O
+    - expiração: min-heap por data de expiração; uma thread em segundo
+      plano remove os vencidos periodicamente
+    - persistência: write-behind em tokens.json. A gravação relê o arquivo
+      e aplica só as inclusões/remoções locais, para não apagar tokens
+      emitidos por outro processo (outro worker do uvicorn); o
+      read-merge-write é serializado entre processos (flock).
+    - revogação (logout) grava na hora e, com `generations`, incrementa o
+      contador "tokens": os outros workers relêem o arquivo na próxima
+      validação e descartam os tokens que sumiram dele.
+    """
+
+    def __init__(self, path: str,
+                 flush_interval: float = TOKEN_FLUSH_INTERVAL,
+                 sweep_interval: float = TOKEN_SWEEP_INTERVAL,
+                 generations: Optional[Generations] = None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+        self.generations = generations
+        self._gen = self._generation()
+        self._file_lock = FileLock(path + ".lock")
+
+        self._lock = threading.RLock()
+        self._tokens: Dict[str, Tuple[int, str]] = {}
+        self._heap: List[Tuple[int, str]] = []
+        self._added: Dict[str, Tuple[int, str]] = {}
+        self._removed: Set[str] = set()
+        self._file_mtime: Optional[int] = None
+        self._loaded = False
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ---------- carga ----------
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._merge_from_file()
+            self._loaded = True
+            self._thread = threading.Thread(target=self._run, name="token-store", daemon=True)
+            self._thread.start()
+
+    def _mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _generation(self) -> int:
+        return self.generations.current("tokens") if self.generations else 0
+
+    def _evict_missing(self):
+        """
+        Outro processo revogou tokens: relê o arquivo e descarta da memória
+        os tokens que não estão mais nele (exceto os emitidos aqui e ainda
+        não gravados).
+        """
+        with self._lock:
+            self._gen = self._generation()
+            data = _load_json(self.path)
+            for token in [t for t in self._tokens if t not in data and t not in self._added]:
+                del self._tokens[token]
+            self._merge_from_file(data)
+
+    def _merge_from_file(self, data: Optional[dict] = None):
+        """Incorpora tokens do arquivo que ainda não estão em memória."""
+        self._file_mtime = self._mtime()
+        now = int(time.time())
+        for token, value in (_load_json(self.path) if data is None else data).items():
+            if token in self._tokens or token in self._removed:
+                continue
+            entry = self._decode(value)
+            if entry and entry[0] >= now:
+                self._tokens[token] = entry
+                heapq.heappush(self._heap, (entry[0], token))
+
+    @staticmethod
+    def _decode(value) -> Optional[Tuple[int, str]]:
+        # formato antigo: só a expiração (tokens do admin único)
+        if isinstance(value, int):
+            return value, "admin"
+        if isinstance(value, dict) and isinstance(value.get("exp"), int):
+            return value["exp"], str(value.get("sub") or "admin")
+        return None
+
+    # ---------- operações ----------
+    def issue(self, token: str, expiry: int, subject: str = "admin"):
+        self._ensure_loaded()
+        with self._lock:
+            self._tokens[token] = (expiry, subject)
+            heapq.heappush(self._heap, (expiry, token))
+            self._added[token] = (expiry, subject)
+            self._removed.discard(token)
+
+    def subject(self, token: str) -> Optional[str]:
+        """Usuário dono do token, ou None se o token for inválido/expirado."""
+        self._ensure_loaded()
+        if self._generation() != self._gen:
+            self._evict_missing()
+        entry = self._tokens.get(token)
+        if entry is None:
+            # token pode ter sido emitido por outro processo: só relê o
+            # arquivo se ele mudou desde a última leitura/gravação
+            with self._lock:
+                if self._mtime() != self._file_mtime:
+                    self._merge_from_file()
+                entry = self._tokens.get(token)
+            if entry is None:
+                return None
+        if entry[0] < int(time.time()):
+            self._drop(token)
+            return None
+        return entry[1]
+
+    def validate(self, token: str) -> bool:
+        return self.subject(token) is not None
+
+    def revoke(self, token: str):
+        """Revoga e grava na hora, para valer em todos os workers (logout)."""
+        self._drop(token)
+        self.flush()
+
+    def revoke_subject(self, subject: str) -> int:
+        """
+        Revoga todos os tokens do usuário (troca de senha, remoção), inclusive
+        os emitidos por outros workers que já estão no arquivo. Retorna quantos.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            with self._file_lock:
+                self._merge_from_file()
+            tokens = [t for t, (_, sub) in self._tokens.items() if sub == subject]
+            for token in tokens:
+                self._drop(token)
+        self.flush()
+        return len(tokens)
+
+    def _drop(self, token: str):
+        self._ensure_loaded()
+        with self._lock:
+            if self._tokens.pop(token, None) is not None:
+                self._added.pop(token, None)
+                self._removed.add(token)
+
+    def sweep(self, now: Optional[int] = None) -> int:
+        """Remove os tokens vencidos (topo do heap). Retorna quantos saíram."""
+        now = int(time.time()) if now is None else now
+        removed = 0
+        with self._lock:
+            while self._heap and self._heap[0][0] < now:
+                expiry, token = heapq.heappop(self._heap)
+                # entradas do heap podem estar obsoletas (token revogado/reemitido)
+                entry = self._tokens.get(token)
+                if entry and entry[0] == expiry:
+                    del self._tokens[token]
+                    self._added.pop(token, None)
+                    self._removed.add(token)
+                    removed += 1
+        return removed
+
+    def __len__(self):
+        return len(self._tokens)
+
+    # ---------- persistência ----------
+    def flush(self):
+        """Grava as alterações pendentes em tokens.json (read-merge-write)."""
+        with self._lock:
+            if not self._added and not self._removed:
+                return
+            added, removed = self._added, self._removed
+            self._added, self._removed = {}, set()
+
+            now = int(time.time())
+            with self._file_lock:
+                data = _load_json(self.path)
+                data.update({t: {"exp": exp, "sub": sub} for t, (exp, sub) in added.items()})
+                for token in removed:
+                    data.pop(token, None)
+                data = {t: v for t, v in data.items() if (self._decode(v) or (0, ""))[0] >= now}
+                _replace_json(self.path, data)
+                self._file_mtime = self._mtime()
+            if removed and self.generations:
+                self.generations.bump("tokens")
+
+    def close(self):
+        """Para a thread de manutenção e grava o que estiver pendente."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._loaded:
+            self.sweep()
+            self.flush()
+
+    def _run(self):
+        next_sweep = time.monotonic() + self.sweep_interval
+        while not self._stop.wait(self.flush_interval):
+            if time.monotonic() >= next_sweep:
+                self.sweep()
+                next_sweep = time.monotonic() + self.sweep_interval
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"❌ Falha ao gravar tokens: {e}", file=sys.stderr)
+
+
+# -----------------------------
+# Tokens assinados (HMAC, sem estado)
+# -----------------------------
+# "opaque": token aleatório guardado no TokenStore (padrão)
+# "signed": token autocontido v1.<payload>.<assinatura>, validado só com CPU
+TOKEN_FORMAT = os.environ.get("AUTH_TOKEN_FORMAT", "opaque")
+SIGNED_PREFIX = "v1."
+REVOCATION_REFRESH = 1.0  # segundos entre conferências do revoked.json
+
+
+def _get_token_key() -> bytes:
+    """
+    Chave HMAC compartilhada pelos workers (data/token.key).
+    Classe: algoritmos de HASH/MAC.
+    """
+    try:
+        fd = os.open(TOKEN_KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return _read_token_key()
+    key = secrets.token_hex(32)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(key)
+    return bytes.fromhex(key)
+
+
+def _read_token_key() -> bytes:
+    """Outro worker criou a chave: espera o conteúdo completo aparecer."""
+    for _ in range(100):
+        with open(TOKEN_KEY_FILE, "r", encoding="utf-8") as f:
+            text = f.read().strip()
+        if len(text) == 64:
+            return bytes.fromhex(text)
+        time.sleep(0.01)
+    raise RuntimeError(f"{TOKEN_KEY_FILE} incompleto ou corrompido")
+
+
+def _now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def _b64e(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64d(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def sign_token(subject: str, expiry: int, key: bytes) -> str:
+    payload = _b64e(json.dumps(
+        {"sub": subject, "exp": expiry, "jti": secrets.token_hex(8), "iat": _now_ms()},
+        separators=(",", ":"),
+    ).encode("utf-8"))
+    sig = hmac.new(key, (SIGNED_PREFIX + payload).encode("ascii"), hashlib.sha256).digest()
+    return f"{SIGNED_PREFIX}{payload}.{_b64e(sig)}"
+
+
+def decode_signed_token(token: str, key: bytes) -> Optional[dict]:
+    """Confere a assinatura e devolve o payload, ou None se inválido."""
+    try:
+        payload, sig = token[len(SIGNED_PREFIX):].split(".")
+        expected = hmac.new(key, (SIGNED_PREFIX + payload).encode("ascii"), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64d(sig)):
+            return None
+        return json.loads(_b64d(payload))
+    except (ValueError, TypeError):
+        return None
+
+
+class BloomFilter:
+    """Filtro de Bloom simples: sem falsos negativos, poucos falsos positivos."""
+
+    def __init__(self, capacity: int = 1024, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.size = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.sha256(item.encode("utf-8")).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str):
+        for p in self._positions(item):
+            self._bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+
+class RevocationList:
+    """
+    Lista de revogação compartilhada (revoked.json: jti -> expiração) com um
+    filtro de Bloom na frente. A maioria dos tokens não está revogada e é
+    descartada pelo filtro sem consultar o conjunto exato.
+
+    Cada processo confere o arquivo no máximo a cada `refresh_interval`
+    segundos (um stat) para enxergar revogações feitas por outros workers.
+    Com `generations`, uma revogação incrementa o contador "revoked" e os
+    outros workers relêem a lista já na próxima consulta. A revogação relê,
+    junta e grava o arquivo sob um flock, então logouts simultâneos em
+    workers diferentes não se perdem.
+    """
+
+    def __init__(self, path: str, refresh_interval: float = REVOCATION_REFRESH,
+                 generations: Optional[Generations] = None):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.generations = generations
+        self._gen = generations.current("revoked") if generations else 0
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(path + ".lock")
+        self._revoked: Dict[str, int] = {}
+        self._bloom = BloomFilter()
+        self._mtime: Optional[int] = None
+        self._next_check = 0.0
+
+    def _mtime_now(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _reload(self, data: Dict[str, int]):
+        now = int(time.time())
+        self._revoked = {j: e for j, e in data.items() if isinstance(e, int) and e >= now}
+        bloom = BloomFilter(capacity=max(1024, 2 * len(self._revoked)))
+        for jti in self._revoked:
+            bloom.add(jti)
+        self._bloom = bloom
+
+    def _refresh(self):
+        now = time.monotonic()
+        gen = self.generations.current("revoked") if self.generations else 0
+        if now < self._next_check and gen == self._gen:
+            return
+        with self._lock:
+            self._next_check = now + self.refresh_interval
+            mtime = self._mtime_now()
+            if mtime != self._mtime or gen != self._gen:
+                self._reload(_load_json(self.path))
+                self._mtime = mtime
+            self._gen = gen
+
+    def is_revoked(self, jti: str) -> bool:
+        self._refresh()
+        if jti not in self._bloom:
+            return False
+        return jti in self._revoked
+
+    def revoke(self, jti: str, expiry: int):
+        with self._lock, self._file_lock:
+            data = _load_json(self.path)
+            data[jti] = expiry
+            self._reload(data)
+            _replace_json(self.path, self._revoked)
+            self._mtime = self._mtime_now()
+            if self.generations:
+                self.generations.bump("revoked")
+
+
+TOKENS = TokenStore(TOKENS_FILE, generations=GENERATIONS)
+REVOKED = RevocationList(REVOKED_FILE, generations=GENERATIONS)
+atexit.register(TOKENS.close)
+
+_token_key: Optional[bytes] = None
+
+
+def _signing_key() -> bytes:
+    global _token_key
+    if _token_key is None:
+        _token_key = _get_token_key()
+    return _token_key
+
+
+def shutdown():
+    """Persiste os tokens pendentes (chamado no encerramento da API)."""
+    TOKENS.close()
+
+
+def issue_token(subject: str = "admin") -> str:
+    expiry = int(time.time()) + TOKEN_EXPIRATION
+    if TOKEN_FORMAT == "signed":
+        return sign_token(subject, expiry, _signing_key())
     token = secrets.token_hex(16)
-    tokens = _load_json(TOKENS_FILE)
-    tokens[token] = int(time.time()) + TOKEN_EXPIRATION
-    _save_json(TOKENS_FILE, tokens)
+    TOKENS.issue(token, expiry, subject)
     return token
 
 
+def _token_identity(token: str) -> Optional[Tuple[str, Optional[int]]]:
+    """(usuário, emissão em ms) do token; emissão só nos assinados. None se inválido."""
+    if token.startswith(SIGNED_PREFIX):
+        # caminho sem estado: assinatura + expiração + filtro de revogação
+        claims = decode_signed_token(token, _signing_key())
+        if not claims or claims.get("exp", 0) < int(time.time()):
+            return None
+        if REVOKED.is_revoked(claims.get("jti", "")):
+            return None
+        return claims.get("sub"), claims.get("iat", 0)
+    subject = TOKENS.subject(token)
+    return (subject, None) if subject else None
+
+
+def token_subject(token: str) -> Optional[str]:
+    """Usuário dono do token, ou None se inválido, expirado ou revogado."""
+    identity = _token_identity(token)
+    return identity[0] if identity else None
+
+
 def validate_token(token: str) -> bool:
-    tokens = _load_json(TOKENS_FILE)
-    expiry = tokens.get(token)
-    if not expiry:
-        return False
-    if expiry < int(time.time()):
-        del tokens[token]
-        _save_json(TOKENS_FILE, tokens)
-        return False
-    return True
+    return token_subject(token) is not None
+
+
+def session_for(token: str) -> Optional[Session]:
+    """
+    Sessão (usuário + papel) do token. O usuário vem do cache do UserStore,
+    sem I/O; um usuário removido invalida seus tokens. Um token assinado
+    emitido antes do token_epoch do usuário (troca de senha, conta recriada)
+    não vale mais; os opacos já foram apagados do TokenStore nesses casos.
+    """
+    identity = _token_identity(token)
+    if not identity or not identity[0]:
+        return None
+    username, issued = identity
+    data = USERS.get(username, revalidate=False)
+    if not data:
+        return None
+    if issued is not None and issued < data.get("token_epoch", 0):
+        return None
+    return Session(token=token, username=data["username"], role=data.get("role", ROLE_ADMIN))
+
+
+def revoke_user_tokens(username: str):
+    """
+    Derruba as sessões do usuário: apaga os tokens opacos dele. Os assinados
+    caem pelo token_epoch que quem chama já gravou na conta.
+    """
+    TOKENS.revoke_subject(normalize_username(username))
 
 
 def revoke_token(token: str):
-    tokens = _load_json(TOKENS_FILE)
-    if token in tokens:
-        del tokens[token]
-        _save_json(TOKENS_FILE, tokens)
+    if token.startswith(SIGNED_PREFIX):
+        claims = decode_signed_token(token, _signing_key())
+        if claims and claims.get("exp", 0) >= int(time.time()):
+            REVOKED.revoke(claims.get("jti", ""), claims["exp"])
+        return
+    TOKENS.revoke(token)
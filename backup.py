@@ -0,0 +1,349 @@
+"""
+Backups consistentes e incrementais da pasta de dados.
+
+    python backup.py full                          # cópia completa
+    python backup.py delta                         # só o que mudou desde o último backup
+    python backup.py delta --since 000003          # ... desde um backup específico
+    python backup.py list
+    python backup.py restore --to /srv/restaurado  # completo + deltas até o último (ou --upto)
+
+Roda com a API no ar e sem travar quem grava: alunos.json e disciplinas.json
+são sempre trocados por inteiro (os.replace), então a leitura pega uma versão
+completa, e os segmentos do log de auditoria só crescem, então basta copiar
+até a última linha completa. Um delta leva apenas os alunos cujo registro
+mudou (comparando hashes com o backup base), os removidos e os bytes novos
+de cada segmento do log.
+
+As chaves (fernet.key, token.key) não entram no backup: guarde-as à parte.
+"""
+import os
+import sys
+import gzip
+import json
+import hashlib
+import zipfile
+import argparse
+import datetime
+from typing import Any, Dict, List, Optional
+
+from util import DATA_DIR
+
+# layout da pasta de dados (o mesmo de storage/auth)
+ALUNOS = "alunos.json"
+CATALOGO = "disciplinas.json"
+LOGS = "logs"
+LOG_ARCHIVE = os.path.join("logs", "archive")
+USERS = "users"
+
+DEFAULT_BACKUP_DIR = os.environ.get(
+    "CONTROLE_BACKUP_DIR", os.path.join(os.path.dirname(os.path.abspath(DATA_DIR)), "backups"))
+
+KIND_FULL = "full"
+KIND_DELTA = "delta"
+
+
+# --------------------------------------------------------------------------------------
+# Leitura consistente da pasta de dados
+# --------------------------------------------------------------------------------------
+
+def _read_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "rb") as f:
+        return json.loads(f.read())
+
+
+def _read_alunos(data_dir: str) -> List[Dict[str, Any]]:
+    return _read_json(os.path.join(data_dir, ALUNOS), [])
+
+
+def _record_hash(record: Dict[str, Any]) -> str:
+    text = json.dumps(record, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _log_segments(data_dir: str) -> Dict[int, bool]:
+    """Segmentos do log -> arquivado? (quente em logs/, arquivado em logs/archive/)."""
+    out: Dict[int, bool] = {}
+    archive_dir = os.path.join(data_dir, LOG_ARCHIVE)
+    if os.path.isdir(archive_dir):
+        for name in os.listdir(archive_dir):
+            if name.endswith(".jsonl.gz") and name[:-9].isdigit():
+                out[int(name[:-9])] = True
+    logs_dir = os.path.join(data_dir, LOGS)
+    if os.path.isdir(logs_dir):
+        for name in os.listdir(logs_dir):
+            stem, ext = os.path.splitext(name)
+            if ext == ".jsonl" and stem.isdigit():
+                out.setdefault(int(stem), False)
+    return out
+
+
+def _segment_tail(data_dir: str, seg: int, start: int) -> bytes:
+    """Bytes do segmento a partir de `start`, até a última linha completa."""
+    hot = os.path.join(data_dir, LOGS, f"{seg:08d}.jsonl")
+    try:
+        with open(hot, "rb") as f:
+            f.seek(start)
+            data = f.read()
+    except FileNotFoundError:
+        # arquivado enquanto líamos (ou já estava): lê o gzip
+        with gzip.open(os.path.join(data_dir, LOG_ARCHIVE, f"{seg:08d}.jsonl.gz"), "rb") as f:
+            data = f.read()[start:]
+    return data[:data.rfind(b"\n") + 1]
+
+
+def _users(data_dir: str) -> Dict[str, bytes]:
+    users_dir = os.path.join(data_dir, USERS)
+    if not os.path.isdir(users_dir):
+        return {}
+    out = {}
+    for name in sorted(os.listdir(users_dir)):
+        if name.endswith(".json"):
+            with open(os.path.join(users_dir, name), "rb") as f:
+                out[name] = f.read()
+    return out
+
+
+# --------------------------------------------------------------------------------------
+# Criação
+# --------------------------------------------------------------------------------------
+
+def list_backups(backup_dir: str) -> List[Dict[str, Any]]:
+    """Manifestos dos backups, do mais antigo para o mais novo."""
+    out = []
+    if not os.path.isdir(backup_dir):
+        return out
+    for name in sorted(os.listdir(backup_dir)):
+        if name.endswith(".zip"):
+            with zipfile.ZipFile(os.path.join(backup_dir, name)) as zf:
+                out.append(json.loads(zf.read("manifest.json")))
+    return out
+
+
+def _backup_path(backup_dir: str, backup_id: str, kind: str) -> str:
+    return os.path.join(backup_dir, f"{backup_id}-{kind}.zip")
+
+
+def _state_path(backup_dir: str, backup_id: str) -> str:
+    return os.path.join(backup_dir, f"{backup_id}.state.json.gz")
+
+
+def _load_state(backup_dir: str, backup_id: str) -> Dict[str, Any]:
+    path = _state_path(backup_dir, backup_id)
+    if not os.path.exists(path):
+        raise ValueError(f"Estado do backup {backup_id} não encontrado: faça um backup completo")
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def create_backup(data_dir: str = DATA_DIR, backup_dir: str = DEFAULT_BACKUP_DIR,
+                  kind: str = KIND_FULL, since: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Grava um backup completo ou um delta (desde `since`, ou desde o último
+    backup) e devolve o manifesto. Lança ValueError se não houver base para
+    o delta.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    existing = list_backups(backup_dir)
+    base: Optional[Dict[str, Any]] = None
+    base_state = {"hashes": [], "log": {}}
+    if kind == KIND_DELTA:
+        if since is None and not existing:
+            raise ValueError("Nenhum backup anterior: faça um backup completo")
+        base_id = since or existing[-1]["id"]
+        base = next((m for m in existing if m["id"] == base_id), None)
+        if base is None:
+            raise ValueError(f"Backup {base_id} não encontrado")
+        base_state = _load_state(backup_dir, base_id)
+
+    backup_id = f"{int(existing[-1]['id']) + 1 if existing else 1:06d}"
+    records = _read_alunos(data_dir)
+    hashes = [(r["id"], _record_hash(r)) for r in records]
+    base_hashes = dict(base_state["hashes"])
+    base_order = [aid for aid, _ in base_state["hashes"]]
+
+    changed = [r for r, (aid, h) in zip(records, hashes) if base_hashes.get(aid) != h]
+    current_ids = {aid for aid, _ in hashes}
+    deleted = [aid for aid in base_order if aid not in current_ids]
+
+    manifest: Dict[str, Any] = {
+        "id": backup_id,
+        "kind": kind,
+        "base": base["id"] if base else None,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "alunos": len(records),
+        "changed": len(changed),
+        "deleted": deleted,
+        "log": {},
+    }
+    # ordem de alunos.json: novos entram na frente; se foi além disso, grava a ordem toda
+    order = [aid for aid, _ in hashes]
+    new_front = [aid for aid in order if aid not in base_hashes]
+    if kind == KIND_DELTA and order == new_front + [aid for aid in base_order if aid in current_ids]:
+        manifest["new_front"] = new_front
+    else:
+        manifest["order"] = order
+
+    log_state: Dict[str, Any] = {}
+    tmp = _backup_path(backup_dir, backup_id, kind) + ".tmp"
+    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("alunos.jsonl", "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in changed))
+        zf.writestr(CATALOGO, json.dumps(_read_json(os.path.join(data_dir, CATALOGO), []), ensure_ascii=False))
+        for name, content in _users(data_dir).items():
+            zf.writestr(f"{USERS}/{name}", content)
+
+        segments = _log_segments(data_dir)
+        last_hot = max((s for s, archived in segments.items() if not archived), default=None)
+        for seg, archived in sorted(segments.items()):
+            prev = base_state["log"].get(str(seg), {"size": 0, "sealed": False})
+            sealed = archived or seg != last_hot
+            if prev["sealed"]:
+                log_state[str(seg)] = prev    # segmento fechado não muda mais
+                continue
+            tail = _segment_tail(data_dir, seg, prev["size"])
+            if tail:
+                zf.writestr(f"{LOGS}/{seg:08d}.jsonl", tail)
+                manifest["log"][str(seg)] = [prev["size"], prev["size"] + len(tail)]
+            log_state[str(seg)] = {"size": prev["size"] + len(tail), "sealed": sealed}
+
+        zf.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+
+    with gzip.open(_state_path(backup_dir, backup_id), "wt", encoding="utf-8") as f:
+        json.dump({"hashes": hashes, "log": log_state}, f)
+    os.replace(tmp, _backup_path(backup_dir, backup_id, kind))
+    return manifest
+
+
+# --------------------------------------------------------------------------------------
+# Restauração
+# --------------------------------------------------------------------------------------
+
+def _chain(backups: List[Dict[str, Any]], upto: Optional[str]) -> List[Dict[str, Any]]:
+    """Backups a aplicar: o completo de base e os deltas até `upto`, nessa ordem."""
+    by_id = {m["id"]: m for m in backups}
+    if not backups:
+        raise ValueError("Nenhum backup encontrado")
+    current = by_id.get(upto or backups[-1]["id"])
+    if current is None:
+        raise ValueError(f"Backup {upto} não encontrado")
+    chain = [current]
+    while chain[-1]["kind"] != KIND_FULL:
+        base = by_id.get(chain[-1]["base"])
+        if base is None:
+            raise ValueError(f"Backup base {chain[-1]['base']} não encontrado")
+        chain.append(base)
+    return list(reversed(chain))
+
+
+def restore(target_dir: str, backup_dir: str = DEFAULT_BACKUP_DIR,
+            upto: Optional[str] = None, force: bool = False) -> Dict[str, Any]:
+    """
+    Reconstrói a pasta de dados em `target_dir` aplicando o backup completo e
+    os deltas seguintes. Não sobrescreve uma pasta com alunos.json sem `force`
+    (a API não deve estar rodando sobre ela).
+    """
+    if os.path.exists(os.path.join(target_dir, ALUNOS)) and not force:
+        raise ValueError(f"{target_dir} já tem dados (use --force)")
+    chain = _chain(list_backups(backup_dir), upto)
+
+    records: Dict[str, Dict[str, Any]] = {}
+    order: List[str] = []
+    logs: Dict[int, bytearray] = {}
+    catalog: Any = []
+    users: Dict[str, bytes] = {}
+    for m in chain:
+        with zipfile.ZipFile(_backup_path(backup_dir, m["id"], m["kind"])) as zf:
+            for line in zf.read("alunos.jsonl").decode("utf-8").splitlines():
+                r = json.loads(line)
+                records[r["id"]] = r
+            for aid in m["deleted"]:
+                records.pop(aid, None)
+            if "order" in m:
+                order = m["order"]
+            else:
+                deleted = set(m["deleted"])
+                order = m["new_front"] + [aid for aid in order if aid not in deleted]
+
+            for seg, (start, end) in m["log"].items():
+                buf = logs.setdefault(int(seg), bytearray())
+                if len(buf) != start:
+                    raise ValueError(f"Backup {m['id']}: segmento {seg} não continua o anterior")
+                buf += zf.read(f"{LOGS}/{int(seg):08d}.jsonl")
+
+            catalog = json.loads(zf.read(CATALOGO))
+            users = {n[len(USERS) + 1:]: zf.read(n) for n in zf.namelist() if n.startswith(USERS + "/")}
+
+    os.makedirs(os.path.join(target_dir, USERS), exist_ok=True)
+    logs_dir = os.path.join(target_dir, LOGS)
+    if os.path.isdir(logs_dir):
+        # o log restaurado substitui o atual inteiro (inclusive o arquivado)
+        for root, _, files in os.walk(logs_dir):
+            for name in files:
+                os.remove(os.path.join(root, name))
+    os.makedirs(logs_dir, exist_ok=True)
+
+    _write(os.path.join(target_dir, ALUNOS),
+           json.dumps([records[aid] for aid in order], indent=2, ensure_ascii=False).encode("utf-8"))
+    _write(os.path.join(target_dir, CATALOGO), json.dumps(catalog, indent=2, ensure_ascii=False).encode("utf-8"))
+    for name, content in users.items():
+        _write(os.path.join(target_dir, USERS, name), content)
+    for seg, content in logs.items():
+        _write(os.path.join(logs_dir, f"{seg:08d}.jsonl"), bytes(content))
+    return {"backups": [m["id"] for m in chain], "alunos": len(order), "log_segments": len(logs)}
+
+
+def _write(path: str, content: bytes):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+# --------------------------------------------------------------------------------------
+# Linha de comando
+# --------------------------------------------------------------------------------------
+
+def _size(path: str) -> str:
+    return f"{os.path.getsize(path) / 1024:.1f} KiB"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Backup e restauração da pasta de dados")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="pasta de dados (padrão: CONTROLE_DATA_DIR)")
+    parser.add_argument("--dir", default=DEFAULT_BACKUP_DIR, help="pasta dos backups (ou CONTROLE_BACKUP_DIR)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("full", help="backup completo")
+    p = sub.add_parser("delta", help="só o que mudou desde o último backup")
+    p.add_argument("--since", help="id do backup base")
+    sub.add_parser("list", help="lista os backups")
+    p = sub.add_parser("restore", help="restaura completo + deltas numa pasta")
+    p.add_argument("--to", required=True, help="pasta de dados de destino")
+    p.add_argument("--upto", help="último backup a aplicar (padrão: o mais novo)")
+    p.add_argument("--force", action="store_true", help="sobrescreve uma pasta que já tem dados")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command in (KIND_FULL, KIND_DELTA):
+            m = create_backup(args.data_dir, args.dir, args.command, getattr(args, "since", None))
+            path = _backup_path(args.dir, m["id"], m["kind"])
+            print(f"✅ Backup {m['id']} ({m['kind']}): {m['changed']} aluno(s) gravado(s), "
+                  f"{len(m['deleted'])} removido(s), {len(m['log'])} segmento(s) de log — {path} ({_size(path)})")
+        elif args.command == "list":
+            for m in list_backups(args.dir):
+                base = f" sobre {m['base']}" if m["base"] else ""
+                print(f"{m['id']}  {m['kind']:<5}  {m['created']}  {m['alunos']} alunos, "
+                      f"{m['changed']} gravados{base}")
+        else:
+            r = restore(args.to, args.dir, args.upto, args.force)
+            print(f"✅ Restaurado em {args.to}: backups {', '.join(r['backups'])}; "
+                  f"{r['alunos']} alunos, {r['log_segments']} segmento(s) de log")
+            print("ℹ️  Copie fernet.key (e token.key, se usar tokens assinados) para a pasta restaurada.")
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+Benchmarks da camada de armazenamento e criptografia.
+
+Gera bases sintéticas determinísticas (alunos com disciplinas, notas e
+logs) numa pasta temporária, mede as operações principais e grava os
+resultados em JSON, que podem ser comparados com uma baseline:
+
+    python bench.py                                  # 1k, 10k e 100k alunos
+    python bench.py --sizes 1000 --out bench.json
+    python bench.py --baseline bench_baseline.json   # falha se regredir
+    python run_tests.py --bench ...                  # mesmo que python bench.py ...
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import subprocess
+import platform
+import datetime
+import tempfile
+import statistics
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.25   # 25% mais lento que a baseline conta como regressão
+SEED = 2025
+LOGS_PER_ALUNO = 2
+BATCH_CALLS = 1000         # operações baratas são medidas em lotes
+
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabriela", "Hugo", "Isabel", "João"]
+SOBRENOMES = ["Silva", "Souza", "Oliveira", "Santos", "Pereira", "Lima", "Costa", "Almeida"]
+DISCIPLINAS = ["Segurança da Informação", "Banco de Dados", "Redes", "Algoritmos",
+               "Engenharia de Software", "Cálculo", "Sistemas Operacionais"]
+
+
+# --------------------------------------------------------------------------------------
+# Base sintética
+# --------------------------------------------------------------------------------------
+
+def _prepare_env(data_dir: str):
+    """Aponta os módulos para a pasta temporária; precisa rodar antes de importar storage."""
+    os.environ["CONTROLE_DATA_DIR"] = data_dir
+    # a base sintética inteira fica no log quente
+    os.environ.setdefault("AUDIT_LOG_MAX_AGE_DAYS", "0")
+    os.environ.setdefault("AUDIT_LOG_MAX_ENTRIES", "0")
+
+
+def generate_dataset(storage, n: int, seed: int = SEED) -> List[Any]:
+    """Cria `n` alunos (1 a 4 disciplinas cada) e LOGS_PER_ALUNO logs por aluno."""
+    rnd = random.Random(seed)
+    base = datetime.date(2024, 1, 1)
+    alunos = []
+    logs = []
+    for i in range(n):
+        aid = f"{i:032x}"
+        cadastro = (base + datetime.timedelta(days=rnd.randrange(365))).isoformat()
+        disciplinas = []
+        for j, nome in enumerate(rnd.sample(DISCIPLINAS, rnd.randint(1, 4))):
+            notas = {e: (round(rnd.uniform(0, 10), 1) if rnd.random() < 0.8 else None)
+                     for e in ("E1", "E2", "E3")}
+            disciplinas.append(storage.Disciplina(id=f"{i:024x}{j:08x}", nome=nome,
+                                                  data_cadastro=cadastro, notas=notas))
+        alunos.append(storage.Aluno(
+            id=aid,
+            nome=f"{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)} {i}",
+            tipo_id="MATRICULA",
+            identificador=f"2024A{i:06d}",
+            data_cadastro=cadastro,
+            disciplinas=disciplinas,
+        ))
+        for k in range(LOGS_PER_ALUNO):
+            ts = datetime.datetime(2024, 1, 1) + datetime.timedelta(seconds=i * LOGS_PER_ALUNO + k)
+            action = "NOTA_ATUALIZADA" if k else "ALUNO_CRIADO"
+            logs.append({
+                "id": f"{i:024x}{k:08x}",
+                "timestamp": ts.isoformat(),
+                "actor": "admin",
+                "action": action,
+                "aluno_id": aid,
+                "details": {"disciplina_id": disciplinas[0].id} if k else {},
+                "mensagem_cifrada": storage.caesar_encrypt(f"{action} - aluno={aid}", shift=3),
+            })
+
+    storage._save_alunos(alunos)
+    for start in range(0, len(logs), 10000):
+        storage.AUDIT_LOG.append_batch(logs[start:start + 10000])
+    return alunos
+
+
+# --------------------------------------------------------------------------------------
+# Medição
+# --------------------------------------------------------------------------------------
+
+def measure(fn: Callable[[], Any], repeat: int, calls: int = 1) -> Dict[str, Any]:
+    """Tempo (mediana/mínimo por amostra) e pico de memória de uma execução extra."""
+    fn()  # aquecimento (caches do SO, imports preguiçosos)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "calls": calls,
+        "median_s": round(statistics.median(times), 6),
+        "min_s": round(min(times), 6),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def bench_size(storage, reports, util, n: int, repeat: int) -> Dict[str, Any]:
+    alunos = generate_dataset(storage, n)
+    alvo = alunos[n // 2]
+    did = alvo.disciplinas[0].id
+    rnd = random.Random(SEED)
+    tokens = [util.encrypt_sensitive(f"2024A{i:06d}") for i in range(BATCH_CALLS)]
+
+    def append_logs():
+        for i in range(BATCH_CALLS):
+            storage._append_log("NOTA_ATUALIZADA", aluno_id=alvo.id, disciplina_id=did, nota=i)
+        storage.LOG_WRITER.flush()
+
+    cases = {
+        "load_alunos": (lambda: storage._load_alunos(), 1),
+        "save_alunos": (lambda: storage._save_alunos(alunos), 1),
+        "filter_alunos": (lambda: storage.filter_alunos("silva", None, None, "2024-03-01", "2024-09-30"), 1),
+        "set_nota": (lambda: storage.set_nota(alvo.id, did, "E1", round(rnd.uniform(0, 10), 1)), 1),
+        "append_log": (append_logs, BATCH_CALLS),
+        "list_logs": (lambda: storage.list_logs(None, 100), 1),
+        "list_logs_aluno": (lambda: storage.list_logs(alvo.id, 100), 1),
+        "encrypt_sensitive": (lambda: [util.encrypt_sensitive("2024A000001") for _ in range(BATCH_CALLS)], BATCH_CALLS),
+        "decrypt_sensitive": (lambda: [util.decrypt_sensitive(t) for t in tokens], BATCH_CALLS),
+        "boletim_csv": (lambda: reports.boletim_csv(alvo), 1),
+        "class_report_csv": (lambda: reports.class_report_csv(alunos), 1),
+    }
+
+    results = {}
+    for name, (fn, calls) in cases.items():
+        results[name] = measure(fn, repeat, calls)
+        r = results[name]
+        print(f"  {name:<20} mediana {r['median_s'] * 1000:10.2f} ms   "
+              f"mín {r['min_s'] * 1000:10.2f} ms   pico {r['peak_kib']:10.1f} KiB")
+    return results
+
+
+# --------------------------------------------------------------------------------------
+# Baseline
+# --------------------------------------------------------------------------------------
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Lista as operações cuja mediana piorou mais que `tolerance` em relação à baseline."""
+    regressions = []
+    for size, ops in results["results"].items():
+        base_ops = baseline.get("results", {}).get(size, {})
+        for name, r in ops.items():
+            base = base_ops.get(name)
+            if not base or not base.get("median_s"):
+                continue
+            ratio = r["median_s"] / base["median_s"]
+            if ratio > 1 + tolerance:
+                regressions.append(
+                    f"{size} alunos / {name}: {base['median_s'] * 1000:.2f} ms → "
+                    f"{r['median_s'] * 1000:.2f} ms ({ratio:.2f}x)"
+                )
+    return regressions
+
+
+def run_size(n: int, repeat: int) -> Dict[str, Any]:
+    """Mede um tamanho de base numa pasta temporária (roda em processo próprio)."""
+    data_dir = tempfile.mkdtemp(prefix="controle_bench_")
+    _prepare_env(data_dir)
+    import storage
+    import reports
+    import util
+
+    if os.path.realpath(storage.DATA_DIR) != os.path.realpath(data_dir):
+        raise RuntimeError("storage já foi importado com outra pasta de dados")
+    try:
+        return bench_size(storage, reports, util, n, repeat)
+    finally:
+        storage.shutdown()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def run(sizes, repeat: int) -> Dict[str, Any]:
+    """
+    Cada tamanho roda num subprocesso: módulos, caches e pasta de dados
+    começam do zero e a memória de uma base não pesa na seguinte.
+    """
+    out = {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "seed": SEED,
+        },
+        "results": {},
+    }
+    for n in sizes:
+        print(f"▶ {n} alunos", flush=True)
+        fd, tmp = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--single", str(n),
+                            "--repeat", str(repeat), "--out", tmp], check=True)
+            with open(tmp, "r", encoding="utf-8") as f:
+                out["results"][str(n)] = json.load(f)
+        finally:
+            os.remove(tmp)
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks de armazenamento e criptografia")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="quantidades de alunos das bases sintéticas")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="amostras por operação")
+    parser.add_argument("--out", default="bench_results.json", help="arquivo JSON de resultados")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="piora relativa aceita antes de acusar regressão (0.25 = 25%%)")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.single:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(run_size(args.single, args.repeat), f)
+        return 0
+
+    results = run(args.sizes, args.repeat)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"📄 Resultados gravados em {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("❌ Regressões em relação à baseline:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print("✅ Nenhuma regressão em relação à baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
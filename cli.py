@@ -1,8 +1,33 @@
+import os
+import sys
+import json
+import time
+import shlex
+import getpass
+import argparse
+import csv
+import re
+import contextlib
+from urllib.parse import quote, unquote
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import requests
 
-BASE_URL = "http://127.0.0.1:8000"
+BASE_URL = os.environ.get("CONTROLE_API_URL", "http://127.0.0.1:8000")
 TOKEN = None
 
+# token salvo entre execuções (um por URL da API), só legível pelo dono
+TOKEN_FILE = os.environ.get(
+    "CONTROLE_TOKEN_FILE", os.path.join(os.path.expanduser("~"), ".controle_academico_token.json")
+)
+TIMEOUT = 30
+
+# uma única sessão HTTP: reaproveita a conexão (keep-alive) entre chamadas
+SESSION = requests.Session()
+
+# --embedded: os subcomandos chamam storage.py direto, sem API nem HTTP
+EMBEDDED = False
+
 
 # ------------------------------------------------------------------------------
 # Helpers
@@ -14,6 +39,29 @@ def _auth_headers():
     return {"Authorization": f"Bearer {TOKEN}"}
 
 
+def _load_cached_token():
+    try:
+        with open(TOKEN_FILE, "r", encoding="utf-8") as f:
+            return json.load(f).get(BASE_URL, {}).get("token")
+    except (OSError, ValueError):
+        return None
+
+
+def _save_cached_token(token, username=None):
+    try:
+        with open(TOKEN_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    if token:
+        data[BASE_URL] = {"token": token, "username": username}
+    else:
+        data.pop(BASE_URL, None)
+    fd = os.open(TOKEN_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
 # ------------------------------------------------------------------------------
 # AUTENTICAÇÃO
 # ------------------------------------------------------------------------------
@@ -24,7 +72,7 @@ def do_login():
     password = input("Senha [1234]: ").strip() or "1234"
 
     try:
-        resp = requests.post(
+        resp = SESSION.post(
             f"{BASE_URL}/auth/login",
             json={"username": username, "password": password},
             timeout=5,
@@ -39,6 +87,7 @@ def do_login():
 
     data = resp.json()
     TOKEN = data.get("token")
+    _save_cached_token(TOKEN, username)
     print("✅ Login realizado com sucesso.")
 
 
@@ -52,7 +101,7 @@ def listar_alunos():
 
     print("\n=== ALUNOS ===")
     try:
-        resp = requests.get(
+        resp = SESSION.get(
             f"{BASE_URL}/students",
             headers=_auth_headers(),
             timeout=5,
@@ -98,7 +147,7 @@ def criar_aluno():
     }
 
     try:
-        resp = requests.post(
+        resp = SESSION.post(
             f"{BASE_URL}/students",
             headers=_auth_headers(),
             json=payload,
@@ -133,7 +182,7 @@ def adicionar_disciplina():
     payload = {"nome": nome, "data_cadastro": data_cadastro or None}
 
     try:
-        resp = requests.post(
+        resp = SESSION.post(
             f"{BASE_URL}/students/{aid}/courses",
             headers=_auth_headers(),
             json=payload,
@@ -169,7 +218,7 @@ def atualizar_disciplina():
     }
 
     try:
-        resp = requests.put(
+        resp = SESSION.put(
             f"{BASE_URL}/students/{aid}/courses/{did}",
             headers=_auth_headers(),
             json=payload,
@@ -198,7 +247,7 @@ def remover_disciplina():
     did = input("ID da disciplina: ").strip()
 
     try:
-        resp = requests.delete(
+        resp = SESSION.delete(
             f"{BASE_URL}/students/{aid}/courses/{did}",
             headers=_auth_headers(),
             timeout=5,
@@ -222,46 +271,28 @@ def listar_disciplinas_aluno():
     print("\n=== DISCIPLINAS DO ALUNO ===")
     aid = input("ID do aluno: ").strip()
 
-    # Buscar lista de alunos para descobrir o nome do aluno
+    # Um único GET traz o aluno e as disciplinas dele
     try:
-        resp_aluno = requests.get(
-            f"{BASE_URL}/students",
+        resp = SESSION.get(
+            f"{BASE_URL}/students/{aid}",
             headers=_auth_headers(),
             timeout=5
         )
     except requests.RequestException as e:
-        print(f"❌ Erro ao conectar para buscar alunos: {e}")
-        return
-
-    if resp_aluno.status_code != 200:
-        print(f"❌ Erro ao buscar alunos: {resp_aluno.status_code} {resp_aluno.text}")
+        print(f"❌ Erro ao conectar para buscar o aluno: {e}")
         return
 
-    alunos = resp_aluno.json()
-    aluno = next((a for a in alunos if a["id"] == aid), None)
-
-    if not aluno:
+    if resp.status_code == 404:
         print("❌ Aluno não encontrado.")
         return
-
-    print(f"\nAluno: {aluno['nome']} ({aluno['tipo_id']} {aluno['identificador']})")
-
-    # Buscar disciplinas do aluno
-    try:
-        resp = requests.get(
-            f"{BASE_URL}/students/{aid}/courses",
-            headers=_auth_headers(),
-            timeout=5,
-        )
-    except requests.RequestException as e:
-        print(f"❌ Erro ao listar disciplinas: {e}")
-        return
-
     if resp.status_code != 200:
-        print(f"❌ Erro ao listar disciplinas: {resp.status_code} {resp.text}")
+        print(f"❌ Erro ao buscar o aluno: {resp.status_code} {resp.text}")
         return
 
-    disciplinas = resp.json()
+    aluno = resp.json()
+    print(f"\nAluno: {aluno['nome']} ({aluno['tipo_id']} {aluno['identificador']})")
+
+    disciplinas = aluno["disciplinas"]
 
     if not disciplinas:
         print("\nNenhuma disciplina cadastrada para este aluno.")
@@ -292,7 +323,23 @@ def listar_disciplinas_aluno():
         print("Número inválido.")
         return
 
-    d = disciplinas[escolha - 1]
+    # detalhes atualizados direto da disciplina
+    did = disciplinas[escolha - 1]["id"]
+    try:
+        resp = SESSION.get(
+            f"{BASE_URL}/students/{aid}/courses/{did}",
+            headers=_auth_headers(),
+            timeout=5,
+        )
+    except requests.RequestException as e:
+        print(f"❌ Erro ao buscar a disciplina: {e}")
+        return
+
+    if resp.status_code != 200:
+        print(f"❌ Erro ao buscar a disciplina: {resp.status_code} {resp.text}")
+        return
+
+    d = resp.json()
 
     print("\n=== DETALHES DA DISCIPLINA ===")
     print(f"Nome: {d['nome']}")
@@ -321,7 +368,7 @@ def lancar_nota():
     payload = {"estagio": estagio, "nota": nota}
 
     try:
-        resp = requests.patch(
+        resp = SESSION.patch(
             f"{BASE_URL}/students/{aid}/courses/{did}/grade",
             headers=_auth_headers(),
             json=payload,
@@ -351,13 +398,22 @@ def ver_logs():
 
     print("\n=== LOGS DE AUDITORIA ===")
     aid = input("Filtrar por ID de aluno (opcional): ").strip()
+    action = input("Filtrar por ação, ex: NOTA_ATUALIZADA (opcional): ").strip().upper()
+    start = input("Data inicial (YYYY-MM-DD) [opcional]: ").strip()
+    end = input("Data final (YYYY-MM-DD) [opcional]: ").strip()
 
     params = {}
     if aid:
         params["aid"] = aid
+    if action:
+        params["action"] = action
+    if start:
+        params["start"] = start
+    if end:
+        params["end"] = end
 
     try:
-        resp = requests.get(
+        resp = SESSION.get(
             f"{BASE_URL}/logs",
             headers=_auth_headers(),
             params=params,
@@ -385,10 +441,744 @@ def ver_logs():
         print("-" * 40)
 
 
+def ver_logs_arquivados():
+    if not TOKEN:
+        print("⚠️ Faça login primeiro.")
+        return
+
+    print("\n=== LOGS ARQUIVADOS ===")
+    start = input("Data inicial (YYYY-MM-DD) [opcional]: ").strip()
+    end = input("Data final (YYYY-MM-DD) [opcional]: ").strip()
+    aid = input("Filtrar por ID de aluno (opcional): ").strip()
+
+    params = {}
+    if start:
+        params["start"] = start
+    if end:
+        params["end"] = end
+    if aid:
+        params["aid"] = aid
+
+    try:
+        resp = SESSION.get(
+            f"{BASE_URL}/logs/archive",
+            headers=_auth_headers(),
+            params=params,
+            timeout=30,
+        )
+    except requests.RequestException as e:
+        print(f"❌ Erro ao buscar logs arquivados: {e}")
+        return
+
+    if resp.status_code != 200:
+        print(f"❌ Erro: {resp.status_code} {resp.text}")
+        return
+
+    logs = resp.json()
+    if not logs:
+        print("Nenhum log arquivado no período.")
+        return
+
+    for log in logs:
+        print(f"[{log['timestamp']}] {log['action']} (ator: {log['actor']})")
+        if log.get("aluno_id"):
+            print(f"  Aluno ID: {log['aluno_id']}")
+        if log.get("mensagem"):
+            print(f"  Mensagem: {log['mensagem']}")
+        print("-" * 40)
+
+
+# ------------------------------------------------------------------------------
+# MODO NÃO INTERATIVO (subcomandos)
+# ------------------------------------------------------------------------------
+class ApiError(Exception):
+    def __init__(self, status, detail):
+        super().__init__(f"{status}: {detail}")
+        self.status = status
+        self.detail = detail
+
+
+def _api(method, path, **kwargs):
+    """Chamada autenticada pela sessão compartilhada. Lança ApiError se status >= 400."""
+    if EMBEDDED:
+        return _embedded_api(method, path, **kwargs)
+    headers = dict(kwargs.pop("headers", {}), **_auth_headers())
+    resp = SESSION.request(method, f"{BASE_URL}{path}", headers=headers, timeout=TIMEOUT, **kwargs)
+    if resp.status_code >= 400:
+        try:
+            detail = resp.json().get("detail", resp.text)
+        except ValueError:
+            detail = resp.text
+        raise ApiError(resp.status_code, detail)
+    return resp
+
+
+# ---------- modo embutido (--embedded) ----------
+class _LocalResponse:
+    """Resposta do modo embutido com a mesma interface usada da resposta HTTP."""
+
+    def __init__(self, data=None, content=b"", headers=None):
+        self._data = data
+        self.content = content
+        self.headers = headers or {}
+
+    def json(self):
+        return self._data
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+
+def _storage():
+    # importado só no modo embutido: abre os arquivos de dados e o writer de logs
+    import storage
+    return storage
+
+
+def _embedded_actor():
+    try:
+        return f"embedded:{getpass.getuser()}"
+    except Exception:
+        return "embedded"
+
+
+def _disciplina_dict(d):
+    return {"id": d.id, "nome": d.nome, "data_cadastro": d.data_cadastro,
+            "notas": dict(d.notas), "media": d.media(), "status": d.status(),
+            "catalogo_id": d.catalogo_id}
+
+
+def _aluno_dict(a):
+    return {"id": a.id, "nome": a.nome, "tipo_id": a.tipo_id, "identificador": a.identificador,
+            "data_cadastro": a.data_cadastro, "ativo": a.ativo,
+            "disciplinas": [_disciplina_dict(d) for d in a.disciplinas]}
+
+
+def _local_students(db, params, body):
+    return [_aluno_dict(a) for a in db.filter_alunos(
+        params.get("name"), params.get("tipo"), params.get("ident"),
+        params.get("date_min"), params.get("date_max"))]
+
+
+def _local_catalog(db, params, body):
+    return [{"id": c.id, "nome": c.nome, "alunos": n} for c, n in db.list_catalogo()]
+
+
+def _local_turma(db, params, body, ref):
+    import reports
+    c = db.find_catalogo(ref)
+    rows, stats = reports.turma(db.matriculas(c.id))
+    return {"disciplina": {"id": c.id, "nome": c.nome, "alunos": len(rows)},
+            "alunos": rows, "estatisticas": stats}
+
+
+def _local_course_report(db, params, body, ref):
+    import reports
+    c = db.find_catalogo(ref)
+    return "".join(reports.course_report_csv(c.nome, db.matriculas(c.id))).encode("utf-8")
+
+
+def _local_export_start(db, params, body):
+    import exports
+    return exports.start_boletins_export(actor=_embedded_actor())
+
+
+def _local_export_status(db, params, body, job_id):
+    import exports
+    return exports.get_job(job_id)
+
+
+def _local_export_download(db, params, body, job_id):
+    import exports
+    if exports.get_job(job_id)["status"] != exports.STATUS_DONE:
+        raise ApiError(409, "Exportação ainda não concluída")
+    with open(exports.zip_path(job_id), "rb") as f:
+        return f.read()
+
+
+def _local_logs(db, params, body):
+    rows, next_cursor = db.query_logs(params.get("aid"), int(params.get("limit", 100)), params.get("cursor"),
+                                      action=params.get("action"), actor=params.get("actor"))
+    return _LocalResponse(data=rows, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+
+def _local_class_report(db, params, body):
+    import reports
+    return reports.class_report_csv(db.list_alunos()).encode("utf-8")
+
+
+def _local_boletim(db, params, body, aid):
+    import reports
+    return reports.boletim_csv(db.find_aluno(aid)).encode("utf-8")
+
+
+# (método, caminho, status do ValueError, função) — os mesmos códigos que app.py devolve
+_EMBEDDED_ROUTES = [
+    ("GET", r"/students", 400, _local_students),
+    ("POST", r"/students", 400, lambda db, p, b: _aluno_dict(db.create_aluno(
+        b["nome"], b["tipo_id"], b["identificador"], b.get("data_cadastro"),
+        ativo=(True if b.get("ativo") is None else b["ativo"]), actor=_embedded_actor()))),
+    ("GET", r"/students/([^/]+)", 404, lambda db, p, b, aid: _aluno_dict(db.find_aluno(aid))),
+    ("DELETE", r"/students/([^/]+)", 404,
+     lambda db, p, b, aid: db.delete_aluno(aid, actor=_embedded_actor()) or {"ok": True}),
+    ("GET", r"/students/([^/]+)/courses", 404,
+     lambda db, p, b, aid: [_disciplina_dict(d) for d in db.find_aluno(aid).disciplinas]),
+    ("POST", r"/students/([^/]+)/courses", 404, lambda db, p, b, aid: _disciplina_dict(
+        db.add_disciplina(aid, b["nome"], b.get("data_cadastro"), actor=_embedded_actor()))),
+    ("GET", r"/students/([^/]+)/courses/([^/]+)", 404,
+     lambda db, p, b, aid, did: _disciplina_dict(db.find_disciplina(aid, did))),
+    ("DELETE", r"/students/([^/]+)/courses/([^/]+)", 404,
+     lambda db, p, b, aid, did: db.del_disciplina(aid, did, actor=_embedded_actor()) or {"ok": True}),
+    ("PATCH", r"/students/([^/]+)/courses/([^/]+)/grade", 400, lambda db, p, b, aid, did: _disciplina_dict(
+        db.set_nota(aid, did, b["estagio"], b["nota"], actor=_embedded_actor()))),
+    ("GET", r"/courses", 400, _local_catalog),
+    ("GET", r"/courses/([^/]+)/students", 404, _local_turma),
+    ("GET", r"/courses/([^/]+)/report\.csv", 404, _local_course_report),
+    ("GET", r"/students/([^/]+)/report\.csv", 404, _local_boletim),
+    ("GET", r"/reports/class\.csv", 400, _local_class_report),
+    ("GET", r"/logs", 400, _local_logs),
+    ("POST", r"/exports/boletins", 400, _local_export_start),
+    ("GET", r"/exports/([^/]+)", 404, _local_export_status),
+    ("GET", r"/exports/([^/]+)/download", 404, _local_export_download),
+]
+
+
+def _embedded_api(method, path, params=None, json=None, **_):
+    """
+    Executa a chamada direto no storage (mesmo lock e mesmos logs de
+    auditoria da API, com actor 'embedded:<usuário do SO>'), devolvendo o
+    mesmo formato de resposta. Quem tem acesso aos arquivos de dados já é
+    o administrador: não há token nem papel a verificar.
+    """
+    if path.startswith("/auth/"):
+        raise ApiError(400, "login/logout não se aplicam ao modo --embedded")
+    params = {k: v for k, v in (params or {}).items() if v not in (None, "")}
+    for route_method, pattern, error_status, handler in _EMBEDDED_ROUTES:
+        m = re.fullmatch(pattern, path)
+        if route_method != method or not m:
+            continue
+        try:
+            result = handler(_storage(), params, json or {}, *map(unquote, m.groups()))
+        except ValueError as e:
+            raise ApiError(error_status, str(e))
+        if isinstance(result, _LocalResponse):
+            return result
+        if isinstance(result, bytes):
+            return _LocalResponse(content=result)
+        return _LocalResponse(data=result)
+    raise ApiError(404, f"{method} {path} não disponível no modo --embedded")
+
+
+def _cell(value):
+    if value is None:
+        return "-"
+    if isinstance(value, bool):
+        return "SIM" if value else "NÃO"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _emit(rows, columns, fmt, out=None):
+    """Escreve `rows` (lista de dicts) como tabela, JSON ou NDJSON (uma linha por registro)."""
+    out = out or sys.stdout
+    if fmt == "json":
+        json.dump(rows, out, indent=2, ensure_ascii=False)
+        out.write("\n")
+    elif fmt == "ndjson":
+        for r in rows:
+            out.write(json.dumps(r, ensure_ascii=False) + "\n")
+    else:
+        table = [[_cell(r.get(c)) for c in columns] for r in rows]
+        widths = [max([len(c)] + [len(line[i]) for line in table]) for i, c in enumerate(columns)]
+        out.write("  ".join(c.upper().ljust(w) for c, w in zip(columns, widths)).rstrip() + "\n")
+        for line in table:
+            out.write("  ".join(v.ljust(w) for v, w in zip(line, widths)).rstrip() + "\n")
+    out.flush()
+
+
+STUDENT_COLUMNS = ["id", "nome", "tipo_id", "identificador", "ativo", "data_cadastro", "disciplinas"]
+COURSE_COLUMNS = ["id", "nome", "E1", "E2", "E3", "media", "status", "data_cadastro"]
+LOG_COLUMNS = ["timestamp", "action", "actor", "aluno_id", "mensagem"]
+CATALOG_COLUMNS = ["id", "nome", "alunos"]
+ROSTER_COLUMNS = ["nome", "tipo_id", "identificador", "E1", "E2", "E3", "media", "status"]
+
+
+def _student_row(a, fmt):
+    if fmt != "table":
+        return a
+    return dict(a, disciplinas=len(a.get("disciplinas", [])))
+
+
+def _course_row(d, fmt):
+    if fmt != "table":
+        return d
+    return dict(d, **{e: d["notas"].get(e) for e in ("E1", "E2", "E3")})
+
+
+def _params(**values):
+    return {k: v for k, v in values.items() if v not in (None, "")}
+
+
+def cmd_login(args):
+    global TOKEN
+    password = args.password if args.password is not None else getpass.getpass("Senha: ")
+    resp = _api("POST", "/auth/login", json={"username": args.username, "password": password})
+    TOKEN = resp.json()["token"]
+    _save_cached_token(TOKEN, args.username)
+    print(f"✅ Login como {args.username}; token salvo em {TOKEN_FILE}", file=sys.stderr)
+
+
+def cmd_logout(args):
+    if TOKEN:
+        try:
+            _api("POST", "/auth/logout")
+        except ApiError:
+            pass
+    _save_cached_token(None)
+    print("✅ Sessão encerrada.", file=sys.stderr)
+
+
+def cmd_students_list(args):
+    params = _params(name=args.name, tipo=args.tipo, ident=args.ident,
+                     date_min=args.date_min, date_max=args.date_max)
+    rows = _api("GET", "/students", params=params).json()
+    _emit([_student_row(a, args.format) for a in rows], STUDENT_COLUMNS, args.format)
+
+
+def cmd_students_get(args):
+    a = _api("GET", f"/students/{args.aid}").json()
+    _emit([_student_row(a, args.format)], STUDENT_COLUMNS, args.format)
+
+
+def cmd_students_create(args):
+    body = {"nome": args.nome, "tipo_id": args.tipo, "identificador": args.ident,
+            "data_cadastro": args.data, "ativo": not args.inativo}
+    a = _api("POST", "/students", json=body).json()
+    _emit([_student_row(a, args.format)], STUDENT_COLUMNS, args.format)
+
+
+def cmd_students_delete(args):
+    _api("DELETE", f"/students/{args.aid}")
+    print(f"✅ Aluno {args.aid} removido.", file=sys.stderr)
+
+
+def cmd_courses_catalog(args):
+    _emit(_api("GET", "/courses").json(), CATALOG_COLUMNS, args.format)
+
+
+def cmd_courses_students(args):
+    """Turma de uma disciplina do catálogo; as estatísticas vão para o stderr."""
+    turma = _api("GET", f"/courses/{quote(args.ref, safe='')}/students").json()
+    _emit([_course_row(r, args.format) for r in turma["alunos"]], ROSTER_COLUMNS, args.format)
+    s = turma["estatisticas"]
+    print(f"📊 {turma['disciplina']['nome']}: {s['total']} aluno(s), {s['aprovados']} aprovado(s), "
+          f"{s['reprovados']} reprovado(s), {s['em_curso']} em curso; média {_cell(s['media'])}",
+          file=sys.stderr)
+
+
+def cmd_courses_list(args):
+    rows = _api("GET", f"/students/{args.aid}/courses").json()
+    _emit([_course_row(d, args.format) for d in rows], COURSE_COLUMNS, args.format)
+
+
+def cmd_courses_add(args):
+    d = _api("POST", f"/students/{args.aid}/courses",
+             json={"nome": args.nome, "data_cadastro": args.data}).json()
+    _emit([_course_row(d, args.format)], COURSE_COLUMNS, args.format)
+
+
+def cmd_courses_delete(args):
+    _api("DELETE", f"/students/{args.aid}/courses/{args.did}")
+    print(f"✅ Disciplina {args.did} removida.", file=sys.stderr)
+
+
+def cmd_grades_set(args):
+    d = _api("PATCH", f"/students/{args.aid}/courses/{args.did}/grade",
+             json={"estagio": args.estagio, "nota": args.nota}).json()
+    _emit([_course_row(d, args.format)], COURSE_COLUMNS, args.format)
+
+
+# ---------- envio de notas a partir de planilha ----------
+UPLOAD_RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def _read_grade_rows(path):
+    """
+    Linhas do CSV de notas. Aceita duas formas:
+    - uma nota por linha: identificador|aluno_id, disciplina|disciplina_id, estagio, nota
+    - uma linha por disciplina com colunas E1, E2, E3 (células vazias são ignoradas)
+    Retorna [(número_da_linha, dict_da_linha, estágio, nota_texto)].
+    """
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        fields = {c.strip().lower() for c in reader.fieldnames or []}
+        out = []
+        for lineno, row in enumerate(reader, start=2):
+            row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+            if "estagio" in fields:
+                out.append((lineno, row, row.get("estagio", ""), row.get("nota", "")))
+            else:
+                for e in ("e1", "e2", "e3"):
+                    if row.get(e):
+                        out.append((lineno, row, e.upper(), row[e]))
+    return out
+
+
+def _grade_index(alunos):
+    """Índices locais (de uma única listagem) para resolver aluno e disciplina por linha."""
+    by_id = {a["id"]: a for a in alunos}
+    by_ident = {}
+    for a in alunos:
+        by_ident.setdefault(a["identificador"], []).append(a)
+    return by_id, by_ident
+
+
+def _resolve_grade(row, by_id, by_ident):
+    """(aid, did) da linha; lança ValueError explicando por que não resolveu."""
+    if row.get("aluno_id"):
+        aluno = by_id.get(row["aluno_id"])
+    else:
+        matches = by_ident.get(row.get("identificador", ""), [])
+        if row.get("tipo_id"):
+            matches = [a for a in matches if a["tipo_id"] == row["tipo_id"].upper()]
+        if len(matches) > 1:
+            raise ValueError("identificador ambíguo (informe tipo_id)")
+        aluno = matches[0] if matches else None
+    if aluno is None:
+        raise ValueError("aluno não encontrado")
+
+    if row.get("disciplina_id"):
+        ds = [d for d in aluno["disciplinas"] if d["id"] == row["disciplina_id"]]
+    else:
+        nome = row.get("disciplina", "").lower()
+        ds = [d for d in aluno["disciplinas"] if d["nome"].lower() == nome]
+    if not ds:
+        raise ValueError("disciplina não encontrada para o aluno")
+    if len(ds) > 1:
+        raise ValueError("disciplina ambígua (use disciplina_id)")
+    return aluno["id"], ds[0]["id"]
+
+
+def _send_grade(aid, did, estagio, nota, retries, backoff):
+    """PATCH da nota com novas tentativas para erros transitórios (rede, 429, 5xx)."""
+    for attempt in range(retries + 1):
+        try:
+            _api("PATCH", f"/students/{aid}/courses/{did}/grade", json={"estagio": estagio, "nota": nota})
+            return attempt
+        except ApiError as e:
+            if e.status not in UPLOAD_RETRY_STATUS or attempt == retries:
+                raise
+        except requests.RequestException:
+            if attempt == retries:
+                raise
+        time.sleep(backoff * (2 ** attempt))
+
+
+def cmd_grades_upload(args):
+    rows = _read_grade_rows(args.file)
+    by_id, by_ident = _grade_index(_api("GET", "/students").json())
+
+    failures = []
+    jobs = []
+    for lineno, row, estagio, nota in rows:
+        try:
+            aid, did = _resolve_grade(row, by_id, by_ident)
+        except ValueError as e:
+            failures.append({"linha": lineno, "erro": str(e)})
+            continue
+        try:
+            value = float(nota.replace(",", "."))
+        except ValueError:
+            failures.append({"linha": lineno, "erro": f"nota inválida: {nota!r}"})
+            continue
+        jobs.append((lineno, aid, did, estagio, value))
+
+    if args.dry_run:
+        print(f"🔎 {len(jobs)} nota(s) prontas para envio, {len(failures)} linha(s) com problema.", file=sys.stderr)
+        _emit(failures, ["linha", "erro"], args.format)
+        return
+
+    start = time.perf_counter()
+    sent = retried = 0
+    if EMBEDDED:
+        # sem rede não há latência a esconder: em sequência e com uma única gravação
+        with _storage().batch():
+            for lineno, aid, did, estagio, nota in jobs:
+                try:
+                    _send_grade(aid, did, estagio, nota, 0, 0)
+                    sent += 1
+                except ApiError as e:
+                    failures.append({"linha": lineno, "erro": f"{e.status}: {e.detail}"})
+        jobs = []
+
+    # o pool de conexões da sessão precisa acompanhar o número de threads
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=args.workers)
+    SESSION.mount("http://", adapter)
+    SESSION.mount("https://", adapter)
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            pool.submit(_send_grade, aid, did, estagio, nota, args.retries, args.backoff): lineno
+            for lineno, aid, did, estagio, nota in jobs
+        }
+        for fut in as_completed(futures):
+            try:
+                retried += 1 if fut.result() else 0
+                sent += 1
+            except ApiError as e:
+                failures.append({"linha": futures[fut], "erro": f"{e.status}: {e.detail}"})
+            except requests.RequestException as e:
+                failures.append({"linha": futures[fut], "erro": f"conexão: {e}"})
+
+    failures.sort(key=lambda f: f["linha"])
+    elapsed = time.perf_counter() - start
+    print(f"✅ {sent} nota(s) enviada(s) em {elapsed:.1f} s ({retried} após nova tentativa); "
+          f"{len(failures)} falha(s).", file=sys.stderr)
+    if failures:
+        _emit(failures, ["linha", "erro"], args.format)
+        raise ApiError(1, f"{len(failures)} linha(s) não enviadas")
+
+
+def _logs_after(params, last):
+    """
+    Logs mais novos que `last` (o último mostrado), em ordem cronológica.
+    Desce as páginas pelo cursor keyset (X-Next-Cursor) até encontrá-lo,
+    então nada se perde se chegarem mais de `limit` logs entre duas
+    consultas. Sem `last`, só a página mais nova.
+    """
+    new, cursor = [], None
+    while True:
+        resp = _api("GET", "/logs", params=_params(cursor=cursor, **params))
+        for log in resp.json():
+            # o último mostrado, ou já anterior a ele (arquivado no meio tempo)
+            if last and (log["id"] == last["id"] or log["timestamp"] < last["timestamp"]):
+                return new[::-1]
+            new.append(log)
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not last or not cursor:
+            return new[::-1]
+
+
+def cmd_logs_tail(args):
+    """Últimos logs em ordem cronológica; com --follow continua mostrando os novos."""
+    params = _params(aid=args.aid, action=args.action, actor=args.actor, limit=args.limit)
+    last = None
+    while True:
+        new = _logs_after(params, last)
+        if new:
+            _emit(new, LOG_COLUMNS, args.format)
+            last = new[-1]
+        if not args.follow:
+            return
+        time.sleep(args.interval)
+
+
+def cmd_reports(args):
+    if args.course:
+        path = f"/courses/{quote(args.course, safe='')}/report.csv"
+    elif args.aid:
+        path = f"/students/{args.aid}/report.csv"
+    else:
+        path = "/reports/class.csv"
+    content = _api("GET", path).content
+    if args.output and args.output != "-":
+        with open(args.output, "wb") as f:
+            f.write(content)
+        print(f"✅ Relatório salvo em {args.output}", file=sys.stderr)
+    else:
+        sys.stdout.buffer.write(content)
+
+
+def cmd_export(args):
+    """Exporta os boletins de todos os alunos num ZIP, acompanhando o progresso."""
+    job = _api("POST", "/exports/boletins").json()
+    while job["status"] not in ("CONCLUIDO", "ERRO"):
+        print(f"\r⏳ {job['done']}/{job['total']} boletins", end="", file=sys.stderr, flush=True)
+        time.sleep(args.interval)
+        job = _api("GET", f"/exports/{job['id']}").json()
+    print(file=sys.stderr)
+    if job["status"] == "ERRO":
+        raise ApiError(500, f"exportação falhou: {job['error']}")
+
+    resp = _api("GET", f"/exports/{job['id']}/download", stream=True)
+    output = args.output or f"boletins_{job['created'][:10]}.zip"
+    with open(output, "wb") as f:
+        for chunk in resp.iter_content(64 * 1024):
+            f.write(chunk)
+    print(f"✅ {job['total']} boletins em {output}", file=sys.stderr)
+
+
+def cmd_batch(args):
+    """
+    Executa vários subcomandos (um por linha, '#' comenta) no mesmo processo,
+    reaproveitando a sessão HTTP e o token: sem custo de inicialização por operação.
+    Com --embedded o lote inteiro é um único ciclo de leitura/gravação dos dados.
+    """
+    source = open(args.file, "r", encoding="utf-8") if args.file != "-" else sys.stdin
+    parser = build_parser()
+    ok = failed = 0
+    with source, (_storage().batch() if EMBEDDED else contextlib.nullcontext()):
+        for lineno, line in enumerate(source, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                sub_args = parser.parse_args(["--format", args.format] + shlex.split(line))
+                if sub_args.func is cmd_batch:
+                    raise ApiError(400, "batch dentro de batch")
+                sub_args.func(sub_args)
+                ok += 1
+            except (ApiError, SystemExit) as e:
+                failed += 1
+                detail = f"{e.status}: {e.detail}" if isinstance(e, ApiError) else "argumentos inválidos"
+                print(f"❌ linha {lineno}: {detail}", file=sys.stderr)
+                if args.stop_on_error:
+                    break
+    print(f"✅ {ok} comando(s) executado(s), {failed} com erro.", file=sys.stderr)
+    if failed:
+        raise ApiError(1, f"{failed} comando(s) falharam")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="cli.py",
+        description="Controle Acadêmico — sem argumentos abre o menu interativo.",
+    )
+    parser.add_argument("--url", default=BASE_URL, help=f"URL da API (padrão {BASE_URL}, ou CONTROLE_API_URL)")
+    parser.add_argument("--format", "-f", choices=("table", "json", "ndjson"), default="table",
+                        help="formato da saída")
+    parser.add_argument("--embedded", action="store_true",
+                        help="usa os arquivos de dados direto (no servidor), sem passar pela API")
+    # --format também vale depois do subcomando (cli.py students list -f json)
+    fmt = argparse.ArgumentParser(add_help=False)
+    fmt.add_argument("--format", "-f", choices=("table", "json", "ndjson"), default=argparse.SUPPRESS)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("login", help="autentica e salva o token")
+    p.add_argument("-u", "--username", default="admin")
+    p.add_argument("-p", "--password", help="se omitida, é pedida sem eco")
+    p.set_defaults(func=cmd_login)
+
+    p = sub.add_parser("logout", help="revoga e apaga o token salvo")
+    p.set_defaults(func=cmd_logout)
+
+    students = sub.add_parser("students", help="alunos").add_subparsers(dest="action", required=True)
+    p = students.add_parser("list", parents=[fmt])
+    p.add_argument("--name")
+    p.add_argument("--tipo", choices=("MATRICULA", "CPF"))
+    p.add_argument("--ident")
+    p.add_argument("--date-min")
+    p.add_argument("--date-max")
+    p.set_defaults(func=cmd_students_list)
+    p = students.add_parser("get", parents=[fmt])
+    p.add_argument("aid")
+    p.set_defaults(func=cmd_students_get)
+    p = students.add_parser("create", parents=[fmt])
+    p.add_argument("--nome", required=True)
+    p.add_argument("--tipo", choices=("MATRICULA", "CPF"), default="MATRICULA")
+    p.add_argument("--ident", required=True)
+    p.add_argument("--data", help="YYYY-MM-DD")
+    p.add_argument("--inativo", action="store_true")
+    p.set_defaults(func=cmd_students_create)
+    p = students.add_parser("delete")
+    p.add_argument("aid")
+    p.set_defaults(func=cmd_students_delete)
+
+    courses = sub.add_parser("courses", help="disciplinas").add_subparsers(dest="action", required=True)
+    p = courses.add_parser("catalog", parents=[fmt], help="catálogo de disciplinas com o total de alunos")
+    p.set_defaults(func=cmd_courses_catalog)
+    p = courses.add_parser("students", parents=[fmt], help="alunos, notas e estatísticas de uma disciplina")
+    p.add_argument("ref", help="id ou nome da disciplina do catálogo")
+    p.set_defaults(func=cmd_courses_students)
+    p = courses.add_parser("list", parents=[fmt])
+    p.add_argument("aid")
+    p.set_defaults(func=cmd_courses_list)
+    p = courses.add_parser("add", parents=[fmt])
+    p.add_argument("aid")
+    p.add_argument("nome")
+    p.add_argument("--data", help="YYYY-MM-DD")
+    p.set_defaults(func=cmd_courses_add)
+    p = courses.add_parser("delete")
+    p.add_argument("aid")
+    p.add_argument("did")
+    p.set_defaults(func=cmd_courses_delete)
+
+    grades = sub.add_parser("grades", help="notas").add_subparsers(dest="action", required=True)
+    p = grades.add_parser("set", parents=[fmt])
+    p.add_argument("aid")
+    p.add_argument("did")
+    p.add_argument("estagio", help="E1, E2 ou E3")
+    p.add_argument("nota", type=float)
+    p.set_defaults(func=cmd_grades_set)
+    p = grades.add_parser("upload", parents=[fmt], help="envia as notas de uma planilha CSV")
+    p.add_argument("file", help="CSV com identificador,disciplina,estagio,nota ou identificador,disciplina,E1,E2,E3")
+    p.add_argument("-w", "--workers", type=int, default=8, help="requisições simultâneas")
+    p.add_argument("--retries", type=int, default=3)
+    p.add_argument("--backoff", type=float, default=0.2, help="espera inicial entre tentativas (s)")
+    p.add_argument("--dry-run", action="store_true", help="só resolve as linhas, sem enviar")
+    p.set_defaults(func=cmd_grades_upload)
+
+    logs = sub.add_parser("logs", help="logs de auditoria").add_subparsers(dest="action", required=True)
+    p = logs.add_parser("tail", parents=[fmt])
+    p.add_argument("--aid")
+    p.add_argument("--action")
+    p.add_argument("--actor")
+    p.add_argument("-n", "--limit", type=int, default=20)
+    p.add_argument("--follow", action="store_true", help="continua mostrando logs novos")
+    p.add_argument("--interval", type=float, default=2.0)
+    p.set_defaults(func=cmd_logs_tail)
+
+    p = sub.add_parser("report", help="CSV do boletim (--aid), de uma disciplina (--course) ou da escola")
+    p.add_argument("--aid")
+    p.add_argument("--course", help="id ou nome da disciplina do catálogo")
+    p.add_argument("-o", "--output", help="arquivo de saída (padrão: stdout)")
+    p.set_defaults(func=cmd_reports)
+
+    p = sub.add_parser("export", help="ZIP com o boletim de todos os alunos")
+    p.add_argument("-o", "--output", help="arquivo ZIP (padrão: boletins_<data>.zip)")
+    p.add_argument("--interval", type=float, default=1.0, help="intervalo entre consultas ao progresso (s)")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("batch", help="executa subcomandos de um arquivo (ou '-' para stdin)")
+    p.add_argument("file", nargs="?", default="-")
+    p.add_argument("--stop-on-error", action="store_true")
+    p.set_defaults(func=cmd_batch)
+    return parser
+
+
+def run_command(argv):
+    """Executa um subcomando; retorna o código de saída do processo."""
+    global BASE_URL, TOKEN, EMBEDDED
+    args = build_parser().parse_args(argv)
+    BASE_URL = args.url.rstrip("/")
+    EMBEDDED = args.embedded
+    TOKEN = None if EMBEDDED else _load_cached_token()
+    try:
+        args.func(args)
+    except ApiError as e:
+        if args.func is not cmd_batch:
+            hint = " (use: cli.py login)" if e.status == 401 else ""
+            print(f"❌ {e.status}: {e.detail}{hint}", file=sys.stderr)
+        return 1
+    except requests.RequestException as e:
+        print(f"❌ Erro de conexão com a API: {e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if EMBEDDED:
+            _storage().shutdown()  # grava os logs de auditoria ainda na fila
+    return 0
+
+
 # ------------------------------------------------------------------------------
 # MENU PRINCIPAL
 # ------------------------------------------------------------------------------
 def main():
+    global TOKEN
+    TOKEN = _load_cached_token()
     while True:
         print("\n=== CONTROLE ACADÊMICO (CLI) ===")
         print("1) Login")
@@ -400,6 +1190,7 @@ def main():
         print("7) Atualizar disciplina")
         print("8) Remover disciplina")
         print("9) Ver logs de auditoria")
+        print("10) Consultar logs arquivados")
         print("0) Sair")
         op = input("Opção: ").strip()
 
@@ -421,6 +1212,8 @@ def main():
             remover_disciplina()
         elif op == "9":
             ver_logs()
+        elif op == "10":
+            ver_logs_arquivados()
         elif op == "0":
             print("Saindo...")
             break
@@ -429,4 +1222,6 @@ def main():
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_command(sys.argv[1:]))
     main()
@@ -0,0 +1,185 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import zipfile
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import storage
+import reports
+from util import DATA_DIR
+
+# --------------------------------------------------------------------------------------
+# Configuração
+# --------------------------------------------------------------------------------------
+
+EXPORTS_DIR = os.path.join(DATA_DIR, "exports")
+# threads que renderizam os boletins em segundo plano, enquanto a thread do
+# job compacta o ZIP (a compressão do zlib libera o GIL; a renderização do
+# CSV, em Python puro, não roda em paralelo entre si)
+EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", "2"))
+EXPORT_CHUNK = 200             # boletins por tarefa do pool
+EXPORT_MAX_AGE_HOURS = float(os.environ.get("EXPORT_MAX_AGE_HOURS", "24"))
+
+STATUS_PENDING = "PENDENTE"
+STATUS_RUNNING = "EM_ANDAMENTO"
+STATUS_DONE = "CONCLUIDO"
+STATUS_ERROR = "ERRO"
+
+
+# --------------------------------------------------------------------------------------
+# Jobs (estado em memória e em data/exports/<id>.json, visível a todos os workers)
+# --------------------------------------------------------------------------------------
+
+_jobs: Dict[str, Dict[str, Any]] = {}
+_jobs_lock = threading.Lock()
+
+
+def _job_file(job_id: str) -> str:
+    return os.path.join(EXPORTS_DIR, f"{job_id}.json")
+
+
+def zip_path(job_id: str) -> str:
+    return os.path.join(EXPORTS_DIR, f"{job_id}.zip")
+
+
+def _save_job(job: Dict[str, Any]):
+    tmp = _job_file(job["id"]) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(job, f, ensure_ascii=False)
+    os.replace(tmp, _job_file(job["id"]))
+
+
+def _update(job_id: str, **fields) -> Dict[str, Any]:
+    with _jobs_lock:
+        job = _jobs[job_id]
+        job.update(fields)
+        snapshot = dict(job)
+    _save_job(snapshot)
+    return snapshot
+
+
+def get_job(job_id: str) -> Dict[str, Any]:
+    """Estado do job (deste ou de outro processo). Lança ValueError se não existir."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            return dict(job)
+    if not re.fullmatch(r"[0-9a-f]{32}", job_id) or not os.path.exists(_job_file(job_id)):
+        raise ValueError("Exportação não encontrada")
+    with open(_job_file(job_id), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _cleanup_old():
+    """
+    Apaga exportações mais velhas que EXPORT_MAX_AGE_HOURS e esquece os jobs
+    terminados deste processo cujo arquivo sumiu (apagado aqui ou pela
+    limpeza de outro worker).
+    """
+    limit = time.time() - EXPORT_MAX_AGE_HOURS * 3600
+    for name in os.listdir(EXPORTS_DIR):
+        path = os.path.join(EXPORTS_DIR, name)
+        try:
+            if os.path.getmtime(path) < limit:
+                os.remove(path)
+        except OSError:
+            pass
+    with _jobs_lock:
+        for job_id in [j for j, job in _jobs.items()
+                       if job["status"] in (STATUS_DONE, STATUS_ERROR) and not os.path.exists(_job_file(j))]:
+            del _jobs[job_id]
+
+
+# --------------------------------------------------------------------------------------
+# Exportação de boletins
+# --------------------------------------------------------------------------------------
+
+def _boletim_name(a: storage.Aluno, used: set) -> str:
+    # mesmo nome do download individual; identificador repetido (MATRICULA e CPF
+    # iguais) ou com caracteres de caminho ganha sufixo/substituição
+    ident = re.sub(r'[\\/:*?"<>|]', "_", a.identificador)
+    name = f"boletim_{ident}.csv"
+    if name in used:
+        name = f"boletim_{ident}_{a.tipo_id}_{a.id[:8]}.csv"
+    used.add(name)
+    return name
+
+
+def _render_chunk(alunos: List[storage.Aluno]) -> List[bytes]:
+    return [reports.boletim_csv(a).encode("utf-8") for a in alunos]
+
+
+def _run_boletins(job_id: str, alunos: List[storage.Aluno]):
+    """
+    Renderiza os boletins em lotes no pool, adiantando os próximos lotes
+    enquanto esta thread compacta os anteriores no ZIP, em ordem. No máximo
+    EXPORT_WORKERS + 1 lotes ficam em memória ao mesmo tempo.
+    """
+    _update(job_id, status=STATUS_RUNNING)
+    tmp = zip_path(job_id) + ".tmp"
+    try:
+        chunks = [alunos[i:i + EXPORT_CHUNK] for i in range(0, len(alunos), EXPORT_CHUNK)]
+        used: set = set()
+        done = 0
+        with ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export") as pool, \
+                zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            window = EXPORT_WORKERS + 1
+            pending = [pool.submit(_render_chunk, c) for c in chunks[:window]]
+            for i, chunk in enumerate(chunks):
+                rendered = pending.pop(0).result()
+                if i + window < len(chunks):
+                    pending.append(pool.submit(_render_chunk, chunks[i + window]))
+                for a, data in zip(chunk, rendered):
+                    zf.writestr(_boletim_name(a, used), data)
+                done += len(chunk)
+                _update(job_id, done=done)
+        os.replace(tmp, zip_path(job_id))
+    except Exception as e:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        _update(job_id, status=STATUS_ERROR, error=str(e), finished=_now())
+        print(f"❌ Falha na exportação {job_id}: {e}", file=sys.stderr)
+        return
+    _update(job_id, status=STATUS_DONE, finished=_now(), size=os.path.getsize(zip_path(job_id)))
+
+
+def _now() -> str:
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def start_boletins_export(actor: str = "admin") -> Dict[str, Any]:
+    """
+    Inicia a exportação de todos os boletins num ZIP (data/exports/<id>.zip),
+    a partir de uma única cópia dos alunos. Retorna o job; o progresso é
+    acompanhado com get_job.
+    """
+    os.makedirs(EXPORTS_DIR, exist_ok=True)
+    _cleanup_old()
+    alunos = storage.snapshot_alunos()
+    job = {
+        "id": uuid.uuid4().hex,
+        "kind": "boletins",
+        "status": STATUS_PENDING,
+        "total": len(alunos),
+        "done": 0,
+        "created": _now(),
+        "finished": None,
+        "error": None,
+        "size": None,
+    }
+    with _jobs_lock:
+        _jobs[job["id"]] = job
+    _save_job(job)
+    storage.audit("EXPORTACAO_BOLETINS", actor=actor, job_id=job["id"], total=len(alunos))
+
+    thread = threading.Thread(target=_run_boletins, args=(job["id"], alunos),
+                              name=f"export-{job['id'][:8]}", daemon=True)
+    thread.start()
+    return dict(job)
+
@@ -0,0 +1,114 @@
+import os
+import mmap
+import struct
+import threading
+from typing import Iterable
+
+from util import DATA_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows: vale só o lock entre threads do processo
+    fcntl = None
+
+# --------------------------------------------------------------------------------------
+# Lock entre processos
+# --------------------------------------------------------------------------------------
+
+class FileLock:
+    """
+    Lock exclusivo entre processos (flock num arquivo .lock) e reentrante
+    entre as threads do mesmo processo, com a mesma interface de um RLock
+    (`with lock:`). Serve para a API e o CLI embutido (ou vários workers)
+    alterarem os mesmos arquivos de dados sem perder alterações.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+        self._owner = None
+
+    def acquire(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            except BaseException:
+                self._lock.release()
+                raise
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+            except BaseException:
+                os.close(fd)
+                self._lock.release()
+                raise
+            self._fd = fd
+            self._owner = threading.get_ident()
+        self._depth += 1
+
+    def owned(self) -> bool:
+        """True se a thread atual segura o lock."""
+        return self._owner == threading.get_ident()
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._owner = None
+            fd, self._fd = self._fd, None
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+# --------------------------------------------------------------------------------------
+# Gerações compartilhadas (coerência dos caches entre workers)
+# --------------------------------------------------------------------------------------
+
+class Generations:
+    """
+    Contadores de geração num arquivo mapeado em memória (mmap), um por
+    recurso que os processos guardam em cache. Quem grava o recurso chama
+    bump(nome) depois de gravar; quem tem cache guarda o valor visto e o
+    compara com current(nome), uma leitura de memória sem syscall, para
+    saber se precisa revalidar. Vale entre processos do mesmo host.
+    """
+
+    def __init__(self, path: str, names: Iterable[str]):
+        self.path = path
+        self._offsets = {name: i * 8 for i, name in enumerate(names)}
+        self._lock = FileLock(path)
+        size = 8 * len(self._offsets)
+        with self._lock:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size < size:
+                    os.ftruncate(fd, size)
+                self._mm = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+
+    def current(self, name: str) -> int:
+        return struct.unpack_from("<Q", self._mm, self._offsets[name])[0]
+
+    def bump(self, name: str) -> int:
+        with self._lock:
+            value = self.current(name) + 1
+            struct.pack_into("<Q", self._mm, self._offsets[name], value)
+        return value
+
+
+os.makedirs(DATA_DIR, exist_ok=True)
+# usuários (UserStore), revogações de token (RevocationList), tokens opacos
+# (TokenStore) e log de auditoria (SegmentLog)
+GENERATIONS = Generations(os.path.join(DATA_DIR, ".generations"), ("users", "revoked", "logs", "tokens"))
@@ -0,0 +1,338 @@
+"""
+Teste de carga ponta a ponta da API.
+
+Sobe a API localmente (TestClient no mesmo processo ou um uvicorn local)
+contra uma pasta de dados temporária, dispara uma mistura configurável de
+requisições a partir de vários workers concorrentes e mostra vazão e
+p50/p95/p99 por rota. No fim confere o estado final das notas com as
+operações emitidas para detectar atualizações perdidas.
+
+    python loadtest.py                                   # TestClient, 8 workers, 20 s
+    python loadtest.py --workers 32 --duration 60 --mix grade=10,list=3,csv=1,logs=2,login=1
+    python loadtest.py --server uvicorn --port 8765 --json resultado.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_MIX = "grade=10,list=3,csv=1,logs=2,login=1"
+STUDENTS_PER_WORKER = 5
+ADMIN = {"username": "admin", "password": "1234"}
+STAGES = ("E1", "E2", "E3")
+OPERATIONS = ("login", "list", "grade", "csv", "logs")
+TRANSPORT_ERROR = 599
+
+
+# --------------------------------------------------------------------------------------
+# Estatísticas
+# --------------------------------------------------------------------------------------
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Percentil pelo método nearest-rank (lista já ordenada)."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class Recorder:
+    """Latências e status por rota, compartilhados entre os workers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+
+    def add(self, route: str, elapsed: float, status: int):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(elapsed)
+            if status >= 400:
+                errs = self.errors.setdefault(route, {})
+                errs[str(status)] = errs.get(str(status), 0) + 1
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        routes = {}
+        total = 0
+        for route, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            total += len(values)
+            routes[route] = {
+                "requests": len(values),
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+                "errors": self.errors.get(route, {}),
+            }
+        return {"elapsed_s": round(elapsed, 2), "requests": total,
+                "rps": round(total / elapsed, 2), "routes": routes}
+
+
+# --------------------------------------------------------------------------------------
+# Servidor
+# --------------------------------------------------------------------------------------
+
+class _InProcess:
+    """API no mesmo processo via TestClient (compartilhado entre as threads)."""
+
+    def __init__(self):
+        from fastapi.testclient import TestClient
+        from app import app
+        # erros do servidor viram respostas 500 contadas nas estatísticas
+        self._ctx = TestClient(app, raise_server_exceptions=False)
+        self.client = self._ctx.__enter__()
+
+    def session(self):
+        return self.client
+
+    def close(self):
+        self._ctx.__exit__(None, None, None)
+
+
+class _Uvicorn:
+    """uvicorn local num subprocesso; cada worker usa seu próprio httpx.Client."""
+
+    def __init__(self, port: int, env: Dict[str, str]):
+        import httpx
+        self._httpx = httpx
+        self.base_url = f"http://127.0.0.1:{port}"
+        root = os.path.dirname(os.path.abspath(__file__))
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+            cwd=root, env=env,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                if httpx.get(self.base_url + "/").status_code == 200:
+                    return
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        self.close()
+        raise RuntimeError("uvicorn não respondeu em 30 s")
+
+    def session(self):
+        return self._httpx.Client(base_url=self.base_url, timeout=60)
+
+    def close(self):
+        self.proc.terminate()
+        self.proc.wait(timeout=10)
+
+
+# --------------------------------------------------------------------------------------
+# Carga
+# --------------------------------------------------------------------------------------
+
+def parse_mix(text: str) -> List[Tuple[str, int]]:
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Operação desconhecida: {name} (use {', '.join(OPERATIONS)})")
+        mix.append((name, int(weight or 1)))
+    return mix
+
+
+def _login(client) -> Dict[str, str]:
+    resp = client.post("/auth/login", json=ADMIN)
+    resp.raise_for_status()
+    return {"Authorization": f"Bearer {resp.json()['token']}"}
+
+
+class Worker:
+    """
+    Cada worker é dono de um conjunto disjunto de (aluno, disciplina): as
+    notas de uma chave só são escritas por ele, em sequência, então o valor
+    final esperado é exatamente a última nota aceita pela API.
+    """
+
+    def __init__(self, wid: int, client, headers, owned: List[Tuple[str, str]], rec: Recorder, seed: int):
+        self.wid = wid
+        self.client = client
+        self.headers = headers
+        self.owned = owned
+        self.rec = rec
+        self.rnd = random.Random(seed)
+        self.expected: Dict[Tuple[str, str, str], float] = {}
+        self.seq = 0
+
+    def timed(self, route: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            resp = self.client.request(method, url, **kwargs)
+        except Exception:
+            # conexão caiu / timeout: conta como erro e segue a carga
+            self.rec.add(route, time.perf_counter() - start, TRANSPORT_ERROR)
+            return None
+        self.rec.add(route, time.perf_counter() - start, resp.status_code)
+        return resp
+
+    def op_login(self):
+        resp = self.timed("POST /auth/login", "POST", "/auth/login", json=ADMIN)
+        if resp is not None and resp.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {resp.json()['token']}"}
+
+    def op_list(self):
+        self.timed("GET /students", "GET", "/students", headers=self.headers)
+
+    def op_grade(self):
+        aid, did = self.rnd.choice(self.owned)
+        stage = self.rnd.choice(STAGES)
+        # valor único por worker para não confundir com o de outra operação
+        self.seq += 1
+        nota = round((self.wid * 7 + self.seq) % 100 / 10, 1)
+        resp = self.timed("PATCH /students/{aid}/courses/{did}/grade", "PATCH",
+                          f"/students/{aid}/courses/{did}/grade",
+                          headers=self.headers, json={"estagio": stage, "nota": nota})
+        if resp is not None and resp.status_code == 200:
+            self.expected[(aid, did, stage)] = nota
+
+    def op_csv(self):
+        self.timed("GET /reports/class.csv", "GET", "/reports/class.csv", headers=self.headers)
+
+    def op_logs(self):
+        aid, _ = self.rnd.choice(self.owned)
+        self.timed("GET /logs", "GET", "/logs", headers=self.headers, params={"aid": aid, "limit": 50})
+
+    def run(self, mix: List[Tuple[str, int]], deadline: float):
+        names = [n for n, _ in mix]
+        weights = [w for _, w in mix]
+        while time.monotonic() < deadline:
+            getattr(self, "op_" + self.rnd.choices(names, weights)[0])()
+
+
+
+def _seed_students(client, headers, count: int) -> List[Tuple[str, str]]:
+    owned = []
+    for i in range(count):
+        resp = client.post("/students", headers=headers, json={
+            "nome": f"Aluno Carga {i}", "tipo_id": "MATRICULA", "identificador": f"LOAD{i:06d}",
+        })
+        resp.raise_for_status()
+        aid = resp.json()["id"]
+        resp = client.post(f"/students/{aid}/courses", headers=headers, json={"nome": "Carga"})
+        resp.raise_for_status()
+        owned.append((aid, resp.json()["id"]))
+    return owned
+
+
+def find_lost_updates(client, headers, workers: List[Worker]) -> List[Dict[str, Any]]:
+    """Compara as notas finais de cada aluno com a última nota aceita para ele."""
+    resp = client.get("/students", headers=headers)
+    if resp.status_code != 200:
+        # a base ficou ilegível (ex.: gravações concorrentes intercaladas): tudo se perdeu
+        return [{"aluno_id": key[0], "disciplina_id": key[1], "estagio": key[2],
+                 "esperado": nota, "encontrado": f"HTTP {resp.status_code}"}
+                for w in workers for key, nota in w.expected.items()]
+    final = {}
+    for a in resp.json():
+        for d in a.get("disciplinas", []):
+            for stage in STAGES:
+                final[(a["id"], d["id"], stage)] = d["notas"].get(stage)
+
+    lost = []
+    for w in workers:
+        for key, nota in w.expected.items():
+            got = final.get(key)
+            if got is None or got != nota:
+                lost.append({"aluno_id": key[0], "disciplina_id": key[1], "estagio": key[2],
+                             "esperado": nota, "encontrado": got})
+    return lost
+
+
+def run(workers: int, duration: float, mix: List[Tuple[str, int]], server: str = "testclient",
+        port: int = 8765, seed: int = 1) -> Dict[str, Any]:
+    data_dir = tempfile.mkdtemp(prefix="controle_load_")
+    env = dict(os.environ, CONTROLE_DATA_DIR=data_dir)
+    if server == "testclient":
+        os.environ["CONTROLE_DATA_DIR"] = data_dir
+        import util
+        if os.path.realpath(util.DATA_DIR) != os.path.realpath(data_dir):
+            raise RuntimeError("a API já foi importada com outra pasta de dados")
+        backend = _InProcess()
+    else:
+        backend = _Uvicorn(port, env)
+
+    try:
+        admin = backend.session()
+        headers = _login(admin)
+        owned = _seed_students(admin, headers, workers * STUDENTS_PER_WORKER)
+
+        rec = Recorder()
+        pool = []
+        for wid in range(workers):
+            mine = owned[wid * STUDENTS_PER_WORKER:(wid + 1) * STUDENTS_PER_WORKER]
+            pool.append(Worker(wid, backend.session(), dict(headers), mine, rec, seed + wid))
+
+        deadline = time.monotonic() + duration
+        start = time.perf_counter()
+        threads = [threading.Thread(target=w.run, args=(mix, deadline), name=f"load-{w.wid}") for w in pool]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        result = rec.summary(elapsed)
+        result["workers"] = workers
+        result["server"] = server
+        result["lost_updates"] = find_lost_updates(admin, headers, pool)
+        result["grade_keys_checked"] = sum(len(w.expected) for w in pool)
+        return result
+    finally:
+        backend.close()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def print_report(result: Dict[str, Any]):
+    print(f"\n{result['requests']} requisições em {result['elapsed_s']} s "
+          f"({result['rps']} req/s, {result['workers']} workers, {result['server']})\n")
+    print(f"{'Rota':<45}{'req':>7}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  erros")
+    for route, r in result["routes"].items():
+        errs = ", ".join(f"{k}×{v}" for k, v in r["errors"].items()) or "-"
+        print(f"{route:<45}{r['requests']:>7}{r['rps']:>9}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}  {errs}")
+
+    lost = result["lost_updates"]
+    print()
+    if lost:
+        print(f"❌ {len(lost)} atualização(ões) perdida(s) de {result['grade_keys_checked']} notas conferidas:")
+        for item in lost[:10]:
+            print(f"  - aluno {item['aluno_id']} / {item['estagio']}: "
+                  f"esperado {item['esperado']}, encontrado {item['encontrado']}")
+    else:
+        print(f"✅ Nenhuma atualização perdida ({result['grade_keys_checked']} notas conferidas).")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Teste de carga da API")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20, help="segundos de carga")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help=f"pesos das operações ({', '.join(OPERATIONS)}); padrão {DEFAULT_MIX}")
+    parser.add_argument("--server", choices=("testclient", "uvicorn"), default="testclient")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="grava o resultado neste arquivo")
+    args = parser.parse_args(argv)
+
+    result = run(args.workers, args.duration, parse_mix(args.mix), args.server, args.port, args.seed)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    return 1 if result["lost_updates"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
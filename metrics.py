@@ -0,0 +1,257 @@
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# --------------------------------------------------------------------------------------
+# Métricas no formato texto do Prometheus (sem dependências externas)
+# --------------------------------------------------------------------------------------
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000)
+BYTES_BUCKETS = (0, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_num(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.label_names, k)} {_fmt_num(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        # por série: contagem por bucket (não cumulativa), soma, total
+        self._series: Dict[LabelValues, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def count(self, **labels) -> int:
+        s = self._series.get(self._key(labels))
+        return s[2] if s else 0
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        out = []
+        for key, (counts, total, n) in items:
+            acc = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                le = f'le="{_fmt_num(bound)}"'
+                out.append(f"{self.name}_bucket{_fmt_labels(self.label_names, key, le)} {acc}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.label_names, key)} {_fmt_num(total)}")
+            out.append(f"{self.name}_count{_fmt_labels(self.label_names, key)} {n}")
+        return out
+
+
+# --------------------------------------------------------------------------------------
+# Registro
+# --------------------------------------------------------------------------------------
+
+_REGISTRY: List[_Metric] = []
+
+
+def _register(metric):
+    _REGISTRY.append(metric)
+    return metric
+
+
+def render() -> str:
+    """Todas as métricas no formato de exposição texto do Prometheus."""
+    lines: List[str] = []
+    for m in _REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------- HTTP ----------
+REQUEST_LATENCY = _register(Histogram(
+    "http_request_duration_seconds", "Latência das requisições por rota.",
+    ("method", "route")))
+REQUESTS = _register(Counter(
+    "http_requests_total", "Requisições por rota e status.",
+    ("method", "route", "status")))
+IN_FLIGHT = _register(Gauge(
+    "http_requests_in_flight", "Requisições em andamento."))
+
+# ---------- spans internos ----------
+SPAN_LATENCY = _register(Histogram(
+    "span_duration_seconds",
+    "Tempo gasto em trechos internos (token, load_alunos, fernet, serialização, log).",
+    ("span",)))
+
+# ---------- armazenamento / criptografia ----------
+FILE_READS = _register(Counter(
+    "storage_file_reads_total", "Arquivos lidos pela camada de armazenamento.", ("file",)))
+FILE_WRITES = _register(Counter(
+    "storage_file_writes_total", "Arquivos gravados pela camada de armazenamento.", ("file",)))
+BYTES_READ = _register(Counter(
+    "storage_bytes_read_total", "Bytes lidos do disco.", ("file",)))
+BYTES_WRITTEN = _register(Counter(
+    "storage_bytes_written_total", "Bytes gravados em disco.", ("file",)))
+CRYPTO_OPS = _register(Counter(
+    "crypto_operations_total", "Operações criptográficas por tipo.", ("op",)))
+
+# ---------- single-flight ----------
+COALESCED = _register(Counter(
+    "singleflight_coalesced_total",
+    "Chamadas que aproveitaram o resultado de uma computação idêntica em andamento.", ("name",)))
+
+# ---------- por requisição ----------
+REQ_FILE_READS = _register(Histogram(
+    "request_file_reads", "Arquivos lidos por requisição.", ("route",), COUNT_BUCKETS))
+REQ_BYTES_READ = _register(Histogram(
+    "request_bytes_read", "Bytes lidos por requisição.", ("route",), BYTES_BUCKETS))
+REQ_BYTES_WRITTEN = _register(Histogram(
+    "request_bytes_written", "Bytes gravados por requisição.", ("route",), BYTES_BUCKETS))
+REQ_CRYPTO_OPS = _register(Histogram(
+    "request_crypto_operations", "Operações criptográficas por requisição.", ("route",), COUNT_BUCKETS))
+
+
+# --------------------------------------------------------------------------------------
+# Contexto da requisição
+# --------------------------------------------------------------------------------------
+
+class RequestStats:
+    """Acumuladores da requisição atual (compartilhados com o threadpool via contextvars)."""
+
+    __slots__ = ("file_reads", "bytes_read", "bytes_written", "crypto_ops")
+
+    def __init__(self):
+        self.file_reads = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.crypto_ops = 0
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "request_stats", default=None)
+
+
+def begin_request() -> Tuple[RequestStats, contextvars.Token]:
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(stats: RequestStats, token: contextvars.Token, method: str,
+                route: str, status: int, elapsed: float):
+    _current.reset(token)
+    REQUEST_LATENCY.observe(elapsed, method=method, route=route)
+    REQUESTS.inc(method=method, route=route, status=str(status))
+    REQ_FILE_READS.observe(stats.file_reads, route=route)
+    REQ_BYTES_READ.observe(stats.bytes_read, route=route)
+    REQ_BYTES_WRITTEN.observe(stats.bytes_written, route=route)
+    REQ_CRYPTO_OPS.observe(stats.crypto_ops, route=route)
+
+
+def record_read(file: str, nbytes: int):
+    FILE_READS.inc(file=file)
+    BYTES_READ.inc(nbytes, file=file)
+    stats = _current.get()
+    if stats is not None:
+        stats.file_reads += 1
+        stats.bytes_read += nbytes
+
+
+def record_write(file: str, nbytes: int):
+    FILE_WRITES.inc(file=file)
+    BYTES_WRITTEN.inc(nbytes, file=file)
+    stats = _current.get()
+    if stats is not None:
+        stats.bytes_written += nbytes
+
+
+def record_crypto(op: str):
+    CRYPTO_OPS.inc(op=op)
+    stats = _current.get()
+    if stats is not None:
+        stats.crypto_ops += 1
+
+
+@contextmanager
+def span(name: str):
+    """Mede um trecho interno: with metrics.span("load_alunos"): ..."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_LATENCY.observe(time.perf_counter() - start, span=name)
@@ -16,6 +16,23 @@ class ChangePasswordIn(BaseModel):
     new_password: str
 
 
+# ---------------------------
+# Usuários
+# ---------------------------
+class UserIn(BaseModel):
+    username: str
+    password: str
+    role: str = "teacher"   # 'admin' | 'teacher' | 'read-only'
+
+class UserUpdateIn(BaseModel):
+    role: Optional[str] = None
+    password: Optional[str] = None
+
+class UserOut(BaseModel):
+    username: str
+    role: str
+
+
 # ---------------------------
 # Disciplinas / Notas
 # ---------------------------
@@ -34,6 +51,53 @@ class DisciplinaOut(BaseModel):
     notas: Dict[str, Optional[float]]  # {'E1': float|None, 'E2':..., 'E3':...}
     media: Optional[float]             # média ponderada 0..10 ou None se incompleta
     status: str                        # 'EM_CURSO' | 'APROVADO' | 'REPROVADO'
+    catalogo_id: Optional[str] = None  # disciplina do catálogo (/courses)
+
+class CatalogoOut(BaseModel):
+    id: str
+    nome: str
+    alunos: int                        # matrículas na disciplina
+
+class MatriculaOut(BaseModel):
+    aluno_id: str
+    nome: str
+    tipo_id: str
+    identificador: str
+    ativo: bool
+    disciplina_id: str                 # id da matrícula (disciplina do aluno)
+    notas: Dict[str, Optional[float]]
+    media: Optional[float]
+    status: str
+    data_cadastro: str
+
+class TurmaStatsOut(BaseModel):
+    total: int
+    aprovados: int
+    reprovados: int
+    em_curso: int
+    media: Optional[float]             # média das médias completas
+    minima: Optional[float]
+    maxima: Optional[float]
+
+class TurmaOut(BaseModel):
+    disciplina: CatalogoOut
+    alunos: List[MatriculaOut]
+    estatisticas: TurmaStatsOut
+
+
+# ---------------------------
+# Exportações
+# ---------------------------
+class ExportJobOut(BaseModel):
+    id: str
+    kind: str                          # 'boletins'
+    status: str                        # 'PENDENTE' | 'EM_ANDAMENTO' | 'CONCLUIDO' | 'ERRO'
+    total: int                         # alunos na cópia exportada
+    done: int                          # boletins já gravados no ZIP
+    created: str
+    finished: Optional[str] = None
+    error: Optional[str] = None
+    size: Optional[int] = None         # bytes do ZIP (quando concluído)
 
 
 # ---------------------------
@@ -75,3 +139,18 @@ class LogOut(BaseModel):
     details: dict = Field(default_factory=dict)
     mensagem: Optional[str] = None
 
+
+
+class ChangeOut(BaseModel):
+    version: str                       # versão logo após esta alteração ('segmento:posição')
+    timestamp: str
+    action: str                        # 'ALUNO_CRIADO' | 'NOTA_ATUALIZADA' | ...
+    actor: str
+    aluno_id: Optional[str] = None
+    disciplina_id: Optional[str] = None
+    details: dict = Field(default_factory=dict)
+
+
+class ChangesOut(BaseModel):
+    changes: List[ChangeOut]
+    version: str                       # use como ?since= na próxima chamada
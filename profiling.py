@@ -0,0 +1,393 @@
+import os
+import io
+import sys
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import threading
+import traceback
+import tracemalloc
+import contextvars
+import datetime
+import functools
+import asyncio
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from util import DATA_DIR
+from interprocess import FileLock
+
+# --------------------------------------------------------------------------------------
+# Configuração
+# --------------------------------------------------------------------------------------
+
+PROFILES_DIR = os.path.join(DATA_DIR, "profiles")
+SLOW_LOG_FILE = os.path.join(PROFILES_DIR, "slow.jsonl")
+
+PROFILE_HEADER = "x-profile"
+SLOW_REQUEST_SECONDS = float(os.environ.get("SLOW_REQUEST_SECONDS", "1.0"))
+# slow.jsonl é rotacionado ao passar de SLOW_LOG_MAX_BYTES; ficam os
+# SLOW_LOG_KEEP arquivos anteriores (slow.jsonl.1 é o mais novo)
+SLOW_LOG_MAX_BYTES = int(os.environ.get("SLOW_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+SLOW_LOG_KEEP = int(os.environ.get("SLOW_LOG_KEEP", "5"))
+TOP_N = 30
+
+os.makedirs(PROFILES_DIR, exist_ok=True)
+
+
+# --------------------------------------------------------------------------------------
+# tracemalloc compartilhado (liga enquanto houver alguém medindo)
+# --------------------------------------------------------------------------------------
+
+_trace_lock = threading.Lock()
+_trace_users = 0
+
+
+def _trace_start():
+    global _trace_users
+    with _trace_lock:
+        if _trace_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _trace_users += 1
+
+
+def _trace_stop():
+    global _trace_users
+    with _trace_lock:
+        _trace_users -= 1
+        if _trace_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+# --------------------------------------------------------------------------------------
+# Resultados
+# --------------------------------------------------------------------------------------
+
+def _summary(stats: pstats.Stats, snapshot: Optional[tracemalloc.Snapshot],
+             peak: int, header: str) -> str:
+    out = io.StringIO()
+    out.write(header + "\n\n")
+    stats.stream = out
+    stats.sort_stats("cumulative").print_stats(TOP_N)
+    if snapshot is not None:
+        out.write(f"\n=== Memória (tracemalloc) — pico {peak / 1024:.1f} KiB ===\n")
+        for stat in snapshot.statistics("lineno")[:TOP_N]:
+            out.write(f"{stat}\n")
+    return out.getvalue()
+
+
+def _save_profile(kind: str, route: str, duration: float, stats: pstats.Stats,
+                  snapshot: Optional[tracemalloc.Snapshot], peak: int) -> str:
+    pid = uuid.uuid4().hex[:12]
+    meta = {
+        "id": pid,
+        "kind": kind,
+        "route": route,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "duration": round(duration, 6),
+        "peak_memory_bytes": peak,
+    }
+    stats.dump_stats(os.path.join(PROFILES_DIR, f"{pid}.prof"))
+    header = f"{kind} {route} — {duration * 1000:.1f} ms — {meta['created']}"
+    with open(os.path.join(PROFILES_DIR, f"{pid}.txt"), "w", encoding="utf-8") as f:
+        f.write(_summary(stats, snapshot, peak, header))
+    with open(os.path.join(PROFILES_DIR, f"{pid}.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return pid
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    out = []
+    for name in os.listdir(PROFILES_DIR):
+        if name.endswith(".json"):
+            try:
+                with open(os.path.join(PROFILES_DIR, name), "r", encoding="utf-8") as f:
+                    out.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    out.sort(key=lambda m: m.get("created", ""), reverse=True)
+    return out
+
+
+def profile_path(pid: str, fmt: str) -> str:
+    """Caminho do resultado ('prof' ou 'txt'). Lança ValueError se não existir."""
+    if fmt not in ("prof", "txt") or not pid.isalnum():
+        raise ValueError("Perfil inválido")
+    path = os.path.join(PROFILES_DIR, f"{pid}.{fmt}")
+    if not os.path.exists(path):
+        raise ValueError("Perfil não encontrado")
+    return path
+
+
+# --------------------------------------------------------------------------------------
+# Janela de profiling (todas as requisições por N segundos)
+# --------------------------------------------------------------------------------------
+
+class _Window:
+    def __init__(self, seconds: float):
+        self.started = time.perf_counter()
+        self.deadline = time.monotonic() + seconds
+        self.stats: Optional[pstats.Stats] = None
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def add(self, profiler: cProfile.Profile):
+        with self.lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profiler)
+            else:
+                self.stats.add(profiler)
+            self.requests += 1
+
+
+_window: Optional[_Window] = None
+_window_lock = threading.Lock()
+
+
+def start_window(seconds: float) -> Dict[str, Any]:
+    """
+    Perfila todas as requisições durante `seconds` segundos; ao final grava
+    um único resultado agregado (cProfile + tracemalloc).
+    """
+    global _window
+    with _window_lock:
+        if _window is not None:
+            raise ValueError("Já existe uma janela de profiling em andamento")
+        _window = _Window(seconds)
+    _trace_start()
+    timer = threading.Timer(seconds, _finish_window)
+    timer.daemon = True
+    timer.start()
+    return {"ok": True, "seconds": seconds}
+
+
+def _finish_window():
+    global _window
+    with _window_lock:
+        window, _window = _window, None
+    if window is None:
+        return
+    snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+    peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+    _trace_stop()
+    if window.stats is not None:
+        _save_profile("window", f"{window.requests} requisições",
+                      time.perf_counter() - window.started, window.stats, snapshot, peak)
+
+
+def _active_window() -> Optional[_Window]:
+    window = _window
+    if window is not None and time.monotonic() > window.deadline:
+        return None
+    return window
+
+
+# --------------------------------------------------------------------------------------
+# Requisição atual
+# --------------------------------------------------------------------------------------
+
+class ProfileRequest:
+    """Pedido de profiling vindo do cabeçalho X-Profile (preenchido pelo wrapper)."""
+
+    __slots__ = ("profile_id",)
+
+    def __init__(self):
+        self.profile_id: Optional[str] = None
+
+
+_requested: contextvars.ContextVar[Optional[ProfileRequest]] = contextvars.ContextVar(
+    "profile_request", default=None)
+
+
+def request_profile() -> contextvars.Token:
+    return _requested.set(ProfileRequest())
+
+
+def requested() -> Optional[ProfileRequest]:
+    return _requested.get()
+
+
+def reset(token: contextvars.Token):
+    _requested.reset(token)
+
+
+# --------------------------------------------------------------------------------------
+# Log de requisições lentas (watchdog com amostra da pilha)
+# --------------------------------------------------------------------------------------
+
+class _InFlight:
+    __slots__ = ("route", "thread_id", "start", "stack")
+
+    def __init__(self, route: str, thread_id: int):
+        self.route = route
+        self.thread_id = thread_id
+        self.start = time.perf_counter()
+        self.stack: Optional[List[str]] = None
+
+
+_inflight: Dict[int, _InFlight] = {}
+_inflight_lock = threading.Lock()
+_watchdog: Optional[threading.Thread] = None
+
+
+def _watch():
+    """Tira uma foto da pilha de cada requisição que passa do limite."""
+    interval = max(0.05, SLOW_REQUEST_SECONDS / 4)
+    while True:
+        time.sleep(interval)
+        now = time.perf_counter()
+        with _inflight_lock:
+            late = [r for r in _inflight.values()
+                    if r.stack is None and now - r.start > SLOW_REQUEST_SECONDS]
+        if not late:
+            continue
+        frames = sys._current_frames()
+        for r in late:
+            frame = frames.get(r.thread_id)
+            if frame is not None:
+                r.stack = traceback.format_stack(frame)[-15:]
+
+
+def _ensure_watchdog():
+    global _watchdog
+    if _watchdog is None:
+        with _inflight_lock:
+            if _watchdog is None:
+                _watchdog = threading.Thread(target=_watch, name="slow-request-watchdog", daemon=True)
+                _watchdog.start()
+
+
+_slow_lock = FileLock(SLOW_LOG_FILE + ".lock")
+
+
+def _log_slow(r: _InFlight, duration: float):
+    entry = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "route": r.route,
+        "duration": round(duration, 6),
+        "stack": r.stack or [],
+    }
+    line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+    try:
+        # os workers gravam no mesmo arquivo: a rotação não pode se cruzar
+        with _slow_lock:
+            if os.path.exists(SLOW_LOG_FILE) and os.path.getsize(SLOW_LOG_FILE) + len(line) > SLOW_LOG_MAX_BYTES:
+                _rotate_slow_log()
+            with open(SLOW_LOG_FILE, "ab") as f:
+                f.write(line)
+    except OSError as e:
+        print(f"❌ Falha ao gravar log de requisição lenta: {e}", file=sys.stderr)
+
+
+def _slow_log_files() -> List[str]:
+    """Do mais novo para o mais velho."""
+    return [SLOW_LOG_FILE] + [f"{SLOW_LOG_FILE}.{n}" for n in range(1, SLOW_LOG_KEEP + 1)]
+
+
+def _rotate_slow_log():
+    """slow.jsonl -> .1 -> .2 ...; o que passaria de SLOW_LOG_KEEP é sobrescrito."""
+    files = _slow_log_files()
+    for n in range(len(files) - 1, 0, -1):
+        if os.path.exists(files[n - 1]):
+            os.replace(files[n - 1], files[n])
+    if os.path.exists(SLOW_LOG_FILE):   # SLOW_LOG_KEEP = 0
+        os.remove(SLOW_LOG_FILE)
+
+
+def slow_requests(limit: int = 50) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    for path in _slow_log_files():
+        if len(out) >= limit:
+            break
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                lines = [l for l in f.readlines() if l.strip()]
+        except FileNotFoundError:
+            continue
+        out.extend(json.loads(l) for l in reversed(lines[-(limit - len(out)):]))
+    return out
+
+
+# --------------------------------------------------------------------------------------
+# Wrapper dos endpoints
+# --------------------------------------------------------------------------------------
+
+@contextmanager
+def _observed(route: str, allowed: Callable[[Dict[str, Any]], bool], values: Dict[str, Any],
+              profile: bool = True):
+    """
+    Mede lentidão do trecho e, se pedido, roda com cProfile/tracemalloc.
+    Com profile=False só mede (endpoints async: ver _wrap).
+    """
+    req = requested() if profile else None
+    window = _active_window() if profile else None
+    profile_this = req is not None and allowed(values)
+
+    record = _InFlight(route, threading.get_ident())
+    with _inflight_lock:
+        _inflight[id(record)] = record
+
+    profiler = None
+    if profile_this or window is not None:
+        profiler = cProfile.Profile()
+    if profile_this:
+        _trace_start()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+    finally:
+        duration = time.perf_counter() - record.start
+        with _inflight_lock:
+            _inflight.pop(id(record), None)
+        if duration > SLOW_REQUEST_SECONDS:
+            _log_slow(record, duration)
+        if profiler is not None and window is not None:
+            window.add(profiler)
+        if profile_this:
+            snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+            peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+            _trace_stop()
+            req.profile_id = _save_profile("request", route, duration,
+                                           pstats.Stats(profiler), snapshot, peak)
+
+
+def _wrap(route: str, call: Callable, allowed: Callable[[Dict[str, Any]], bool]) -> Callable:
+    # o wrapper precisa ser do mesmo tipo (sync/async) que o endpoint: o FastAPI
+    # decide na criação da rota se chama direto no loop ou no threadpool
+    if asyncio.iscoroutinefunction(call):
+        # endpoint async: só o tempo. O cProfile é por thread e ficaria ligado
+        # durante os awaits, somando ao perfil desta requisição o que as outras
+        # corotinas rodam no mesmo loop (e no 3.11 brigando pelo mesmo hook)
+        @functools.wraps(call)
+        async def async_wrapper(**values):
+            with _observed(route, allowed, values, profile=False):
+                return await call(**values)
+        return async_wrapper
+
+    @functools.wraps(call)
+    def wrapper(**values):
+        with _observed(route, allowed, values):
+            return call(**values)
+    return wrapper
+
+
+def instrument_routes(app, allowed: Callable[[Dict[str, Any]], bool]):
+    """
+    Envolve o corpo de cada endpoint (na thread em que ele roda) com o log
+    de lentidão e o profiling sob demanda. `allowed(values)` recebe os
+    parâmetros resolvidos do endpoint e decide se o X-Profile é aceito.
+    """
+    from fastapi.routing import APIRoute
+
+    _ensure_watchdog()
+    for route in app.routes:
+        if isinstance(route, APIRoute) and not getattr(route.dependant.call, "_profiled", False):
+            route.dependant.call = _wrap(route.path, route.dependant.call, allowed)
+            route.dependant.call._profiled = True
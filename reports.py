@@ -0,0 +1,278 @@
+import os
+import re
+import csv
+import time
+import hashlib
+import threading
+import unicodedata
+from io import StringIO
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import storage
+from storage import Aluno, Disciplina
+from util import DATA_DIR
+
+# --------------------------------------------------------------------------------------
+# Relatórios CSV (boletim do aluno e relatório da turma)
+# --------------------------------------------------------------------------------------
+
+CLASS_HEADER = ['Aluno', 'Tipo', 'Identificador', 'Ativo', 'Disciplina', 'E1', 'E2', 'E3', 'Média', 'Status', 'Cadastro']
+COURSE_HEADER = ['Aluno', 'Tipo', 'Identificador', 'Ativo', 'ID Disciplina', 'E1', 'E2', 'E3', 'Média', 'Status', 'Cadastro']
+
+
+def boletim_csv(a: Aluno) -> str:
+    """Boletim de um aluno: cabeçalho com os dados do aluno e uma linha por disciplina."""
+    sio = StringIO()
+    w = csv.writer(sio)
+    w.writerow(['Aluno', a.nome])
+    w.writerow(['Identificador', f'{a.tipo_id}: {a.identificador}'])
+    w.writerow(['Cadastro', a.data_cadastro])
+    w.writerow(['Ativo', 'SIM' if a.ativo else 'NÃO'])
+    w.writerow([])
+    w.writerow(['ID Disciplina', 'Nome', 'E1', 'E2', 'E3', 'Média', 'Status', 'Cadastro'])
+    for d in a.disciplinas:
+        w.writerow([d.id, d.nome, d.notas.get('E1'), d.notas.get('E2'), d.notas.get('E3'), d.media(), d.status(), d.data_cadastro])
+    return sio.getvalue()
+
+
+def _write_class_rows(w, a: Aluno):
+    ativo = 'SIM' if a.ativo else 'NÃO'
+    if not a.disciplinas:
+        w.writerow([a.nome, a.tipo_id, a.identificador, ativo, '(sem disciplinas)', '', '', '', '', 'EM CURSO', a.data_cadastro])
+    for d in a.disciplinas:
+        media, status = d.resultado()
+        w.writerow([a.nome, a.tipo_id, a.identificador, ativo, d.nome, d.notas.get('E1'), d.notas.get('E2'), d.notas.get('E3'), media, status, d.data_cadastro])
+
+
+def class_report_csv(alunos: Iterable[Aluno]) -> str:
+    """Relatório da turma: uma linha por aluno/disciplina."""
+    sio = StringIO()
+    w = csv.writer(sio)
+    w.writerow(CLASS_HEADER)
+    for a in alunos:
+        _write_class_rows(w, a)
+    return sio.getvalue()
+
+
+# --------------------------------------------------------------------------------------
+# Turma de uma disciplina (a partir do índice de matrículas)
+# --------------------------------------------------------------------------------------
+
+class TurmaStats:
+    """Estatísticas da turma acumuladas linha a linha, na mesma passada das linhas."""
+
+    def __init__(self):
+        self.total = 0
+        self.aprovados = 0
+        self.reprovados = 0
+        self.em_curso = 0
+        self._soma = 0.0
+        self._completas = 0
+        self.minima: Optional[float] = None
+        self.maxima: Optional[float] = None
+
+    def add(self, media: Optional[float], status: str):
+        self.total += 1
+        if status == 'APROVADO':
+            self.aprovados += 1
+        elif status == 'REPROVADO':
+            self.reprovados += 1
+        else:
+            self.em_curso += 1
+        if media is not None:
+            self._soma += media
+            self._completas += 1
+            self.minima = media if self.minima is None else min(self.minima, media)
+            self.maxima = media if self.maxima is None else max(self.maxima, media)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'total': self.total,
+            'aprovados': self.aprovados,
+            'reprovados': self.reprovados,
+            'em_curso': self.em_curso,
+            'media': round(self._soma / self._completas, 2) if self._completas else None,
+            'minima': self.minima,
+            'maxima': self.maxima,
+        }
+
+
+def turma(matriculas: Iterable[Tuple[Aluno, Disciplina]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Linhas (aluno + notas, média e status) e estatísticas da turma."""
+    stats = TurmaStats()
+    rows = []
+    for a, d in matriculas:
+        media, status = d.resultado()
+        stats.add(media, status)
+        rows.append({
+            'aluno_id': a.id, 'nome': a.nome, 'tipo_id': a.tipo_id, 'identificador': a.identificador,
+            'ativo': a.ativo, 'disciplina_id': d.id, 'notas': dict(d.notas),
+            'media': media, 'status': status, 'data_cadastro': d.data_cadastro,
+        })
+    return rows, stats.as_dict()
+
+
+def course_report_csv(nome: str, matriculas: Iterable[Tuple[Aluno, Disciplina]]) -> Iterator[str]:
+    """
+    CSV da turma de uma disciplina, gerado linha a linha (para streaming),
+    com as estatísticas da turma no rodapé.
+    """
+    sio = StringIO()
+    w = csv.writer(sio)
+
+    def line(row) -> str:
+        sio.seek(0)
+        sio.truncate()
+        w.writerow(row)
+        return sio.getvalue()
+
+    stats = TurmaStats()
+    yield line(['Disciplina', nome])
+    yield line(COURSE_HEADER)
+    for a, d in matriculas:
+        media, status = d.resultado()
+        stats.add(media, status)
+        yield line([a.nome, a.tipo_id, a.identificador, 'SIM' if a.ativo else 'NÃO', d.id,
+                    d.notas.get('E1'), d.notas.get('E2'), d.notas.get('E3'), media, status, d.data_cadastro])
+
+    totais = stats.as_dict()
+    yield line([])
+    yield line(['Alunos', totais['total']])
+    yield line(['Aprovados', totais['aprovados']])
+    yield line(['Reprovados', totais['reprovados']])
+    yield line(['Em curso', totais['em_curso']])
+    yield line(['Média da turma', totais['media']])
+    yield line(['Menor média', totais['minima']])
+    yield line(['Maior média', totais['maxima']])
+
+
+def filename_slug(text: str) -> str:
+    """Trecho seguro (ASCII) para nome de arquivo em Content-Disposition."""
+    ascii_text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^A-Za-z0-9]+', '_', ascii_text).strip('_').lower() or 'disciplina'
+
+
+# --------------------------------------------------------------------------------------
+# Relatório da turma materializado (atualizado incrementalmente)
+# --------------------------------------------------------------------------------------
+
+CLASS_REPORT_DIR = os.path.join(DATA_DIR, "reports")
+STALE_REPORT_SECONDS = 3600   # arquivos de outros processos (já encerrados) são apagados depois disso
+# versões substituídas continuam em disco por este tempo, para downloads que
+# já pegaram o caminho e ainda vão abrir ou estão lendo o arquivo
+REPORT_GRACE_SECONDS = float(os.environ.get("CLASS_REPORT_GRACE_SECONDS", "300"))
+
+
+class ClassReport:
+    """
+    Relatório geral mantido pronto em disco. Guarda o trecho CSV já
+    renderizado de cada aluno e, avisado pelo storage (add_listener), só
+    renderiza de novo os alunos que mudaram. Cada versão é gravada num
+    arquivo próprio (class-<pid>-<geração>.csv), servido com FileResponse;
+    uma versão substituída só é apagada depois de REPORT_GRACE_SECONDS, então
+    downloads lentos ou que ainda vão abrir o arquivo não o perdem.
+    """
+
+    def __init__(self, directory: str = CLASS_REPORT_DIR):
+        self.directory = directory
+        self._render_lock = threading.Lock()   # uma renderização por vez
+        self._dirty_lock = threading.Lock()    # só protege o conjunto abaixo
+        self._dirty: set = set()
+        self._all_dirty = True
+        self._chunks: Dict[str, str] = {}
+        self._generation = 0
+        self._path: Optional[str] = None
+        self._etag = ""
+        self._retired: List[Tuple[float, str]] = []   # (quando foi substituído, caminho)
+        self.rendered_rows = 0                 # alunos renderizados desde o início (diagnóstico)
+
+    def mark(self, aid: Optional[str]):
+        """Listener do storage: roda com o lock dos dados, então só anota."""
+        with self._dirty_lock:
+            if aid is None:
+                self._all_dirty = True
+            else:
+                self._dirty.add(aid)
+
+    def _render_chunk(self, a: Aluno) -> str:
+        sio = StringIO()
+        _write_class_rows(csv.writer(sio), a)
+        self.rendered_rows += 1
+        return sio.getvalue()
+
+    def path(self) -> str:
+        """Caminho do arquivo atualizado, renderizando só o que mudou desde a última vez."""
+        return self.current()[0]
+
+    def current(self) -> Tuple[str, str]:
+        """
+        (caminho, etag) da versão atualizada. O etag é o hash do conteúdo:
+        vale entre workers e reinícios, ao contrário do nome do arquivo.
+        """
+        storage.sync()  # alterações de outro processo chegam como mark(None)
+        with self._render_lock:
+            # pega as marcas antes de ler os alunos: o que mudar daqui em
+            # diante fica marcado para a próxima vez
+            with self._dirty_lock:
+                dirty, self._dirty = self._dirty, set()
+                all_dirty, self._all_dirty = self._all_dirty, False
+            if self._path and not dirty and not all_dirty and os.path.exists(self._path):
+                return self._path, self._etag
+
+            chunks = {}
+            parts = [_csv_line(CLASS_HEADER)]
+            for a in storage.list_alunos():
+                chunk = None if (all_dirty or a.id in dirty) else self._chunks.get(a.id)
+                if chunk is None:
+                    chunk = self._render_chunk(a)
+                chunks[a.id] = chunk
+                parts.append(chunk)
+            self._chunks = chunks
+
+            os.makedirs(self.directory, exist_ok=True)
+            self._generation += 1
+            path = os.path.join(self.directory, f"class-{os.getpid()}-{self._generation}.csv")
+            digest = hashlib.sha256()
+            with open(path + ".tmp", "w", encoding="utf-8", newline="") as f:
+                for part in parts:
+                    f.write(part)
+                    digest.update(part.encode("utf-8"))
+            os.replace(path + ".tmp", path)
+            if self._path:
+                self._retired.append((time.time(), self._path))
+            self._path, self._etag = path, digest.hexdigest()[:32]
+            self._cleanup()
+            return path, self._etag
+
+    def _cleanup(self):
+        # cada processo (worker do uvicorn, CLI) tem seus próprios arquivos:
+        # os deste processo saem REPORT_GRACE_SECONDS depois de substituídos;
+        # os de outros, só quando ficam velhos (o processo já encerrou)
+        now = time.time()
+        expired = [p for t, p in self._retired if now - t > REPORT_GRACE_SECONDS]
+        self._retired = [(t, p) for t, p in self._retired if now - t <= REPORT_GRACE_SECONDS]
+        for full in expired:
+            try:
+                os.remove(full)
+            except OSError:
+                pass
+        mine = {self._path} | {p for _, p in self._retired}
+        for name in os.listdir(self.directory):
+            full = os.path.join(self.directory, name)
+            if not name.startswith("class-") or full in mine:
+                continue
+            try:
+                if now - os.path.getmtime(full) > STALE_REPORT_SECONDS:
+                    os.remove(full)
+            except OSError:
+                pass
+
+
+def _csv_line(row) -> str:
+    sio = StringIO()
+    csv.writer(sio).writerow(row)
+    return sio.getvalue()
+
+
+CLASS_REPORT = ClassReport()
+storage.add_listener(CLASS_REPORT.mark)
@@ -1,8 +1,14 @@
+import sys
 import pytest
 import textwrap
 
 
 def main():
+    # python run_tests.py --bench [opções do bench.py]
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        import bench
+        return bench.main(sys.argv[2:])
+
     print("=" * 80)
     print("🧪 Iniciando suíte de testes do Sistema de Controle Acadêmico")
     print("=" * 80)
@@ -32,6 +38,9 @@ def main():
                   - Criptografia simétrica (Fernet) em dados sensíveis
                   - Hash de senha do administrador (PBKDF2-HMAC-SHA256)
                   - Troca de senha do admin e verificação de login
+                  - Login sem regravar o arquivo do usuário e fila do PBKDF2
+                  - Usuários com papéis e sessões ligadas ao usuário
+                  - Outro worker enxerga troca de papel e remoção (gerações)
 
             📁 tests/test_api_integration.py
               • Tipo: TESTE INTEGRADO (API completa)
@@ -42,6 +51,88 @@ def main():
                   - Lançamento de notas (E1, E2, E3) e cálculo da média/status
                   - Geração do boletim CSV do aluno
                   - Geração e leitura de logs, incluindo mensagem decifrada
+                  - Permissões por papel (read-only/teacher) e ator nos logs
+                  - Catálogo de disciplinas (/courses) por id ou nome
+                  - Turma e CSV de uma disciplina com estatísticas no rodapé
+                  - ETag e 304 no relatório geral
+                  - Exportação dos boletins em ZIP com status do job
+                  - Feed de alterações (/changes) com long-poll e SSE
+
+            📁 tests/test_auditlog.py
+              • Tipo: TESTES UNITÁRIOS (log de auditoria)
+              • O que verifica:
+                  - Escritor em segundo plano nos três modos de durabilidade
+                  - Drenagem das entradas pendentes no encerramento
+                  - Rotação dos segmentos do log
+                  - Consulta indexada por aluno com cursor de paginação
+                  - Arquivamento (gzip) por quantidade e por idade
+                  - Dois processos gravando e consultando o mesmo log
+                  - Leitura em ordem por ação a partir de uma posição
+
+            📁 tests/test_tokens.py
+              • Tipo: TESTES UNITÁRIOS (tokens de sessão)
+              • O que verifica:
+                  - Emissão, validação e revogação em memória
+                  - Varredura de tokens expirados (min-heap)
+                  - Gravação write-behind sem apagar tokens de outro processo
+                  - Tokens assinados (HMAC) e revogação compartilhada com filtro de Bloom
+
+            📁 tests/test_metrics.py
+              • Tipo: TESTES UNITÁRIOS (observabilidade)
+              • O que verifica:
+                  - Histogramas e contadores no formato do Prometheus
+                  - Contadores de I/O e criptografia por requisição
+
+            📁 tests/test_profiling.py
+              • Tipo: TESTES DE INTEGRAÇÃO (profiling)
+              • O que verifica:
+                  - X-Profile gera perfil (cProfile + tracemalloc) para admin
+                  - Download do resumo e do dump pstats
+                  - Registro de requisições lentas
+
+            📁 tests/test_bench.py
+              • Tipo: TESTES UNITÁRIOS (benchmarks)
+              • O que verifica:
+                  - Comparação com a baseline acusa apenas regressões acima da tolerância
+
+            📁 tests/test_loadtest.py
+              • Tipo: TESTES UNITÁRIOS (teste de carga)
+              • O que verifica:
+                  - Percentis p50/p95/p99 e leitura da mistura de operações
+
+            📁 tests/test_storage.py
+              • Tipo: TESTES UNITÁRIOS (armazenamento)
+              • O que verifica:
+                  - Notas lançadas em paralelo não se perdem
+                  - Cache acompanha alterações externas do arquivo
+                  - Releitura externa refaz só os alunos alterados
+                  - Versões imutáveis (snapshot) lidas sem esperar o lock de escrita
+                  - batch() grava alunos.json uma única vez
+                  - Índice de matrículas por disciplina do catálogo
+
+            📁 tests/test_reports.py
+              • Tipo: TESTES UNITÁRIOS (relatórios)
+              • O que verifica:
+                  - Relatório da turma materializado renderiza só os alunos alterados
+
+            📁 tests/test_singleflight.py
+              • Tipo: TESTES UNITÁRIOS (single-flight)
+              • O que verifica:
+                  - Chamadas idênticas simultâneas computam uma única vez
+                  - Erro compartilhado e chaves diferentes independentes
+
+            📁 tests/test_cli.py
+              • Tipo: TESTES UNITÁRIOS (CLI)
+              • O que verifica:
+                  - Saída em tabela/JSON/NDJSON e parsing dos subcomandos
+                  - Resolução local da planilha de notas
+                  - Modo --embedded direto no storage, com ator próprio nos logs
+
+            📁 tests/test_backup.py
+              • Tipo: TESTES UNITÁRIOS (backup)
+              • O que verifica:
+                  - Delta leva só alunos alterados/novos, removidos e o log novo
+                  - Restauração (completo + deltas) reproduz a pasta de dados
             """
         )
         print(resumo)
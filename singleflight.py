@@ -0,0 +1,61 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import metrics
+
+# --------------------------------------------------------------------------------------
+# Single-flight: uma computação por chave, compartilhada por quem chegar junto
+# --------------------------------------------------------------------------------------
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Junta chamadas idênticas simultâneas: a primeira com uma chave executa
+    `fn`; as que chegam enquanto ela roda esperam e recebem o mesmo
+    resultado (ou a mesma exceção). Nada fica guardado depois que a
+    computação termina, então a chave deve incluir a versão dos dados
+    (storage.snapshot().version) para que uma alteração nunca seja servida
+    com um resultado anterior a ela.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.COALESCED.inc(name=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -1,27 +1,65 @@
 import os
 import json
+import asyncio
+import atexit
+import threading
+import time
 import uuid
 import datetime
-from typing import List, Optional, Dict, Any
-from dataclasses import dataclass, field
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from collections.abc import Mapping
+from typing import Callable, List, Optional, Dict, Any, Set, Tuple
+from dataclasses import dataclass, field, replace
 
 from util import (
     encrypt_sensitive,
     decrypt_sensitive,
     caesar_encrypt,
     caesar_decrypt,
+    ensure_date,
+    DATA_DIR,
 )
+import auditlog
+import metrics
+from interprocess import FileLock, GENERATIONS
 
 # --------------------------------------------------------------------------------------
 # Arquivos de dados (JSON)
 # --------------------------------------------------------------------------------------
 
-DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 ALUNOS_FILE = os.path.join(DATA_DIR, "alunos.json")
-LOGS_FILE = os.path.join(DATA_DIR, "logs.json")
+ALUNOS_LOCK_FILE = os.path.join(DATA_DIR, "alunos.lock")
+CATALOGO_FILE = os.path.join(DATA_DIR, "disciplinas.json")  # catálogo de disciplinas (ids estáveis)
+LOGS_FILE = os.path.join(DATA_DIR, "logs.json")   # formato antigo (migrado)
+LOGS_DIR = os.path.join(DATA_DIR, "logs")
+
+# Durabilidade do log de auditoria: "batch" (fsync por lote),
+# "entry" (fsync por entrada) ou "os" (buffer do sistema operacional).
+LOG_DURABILITY = os.environ.get("AUDIT_LOG_DURABILITY", auditlog.DURABILITY_BATCH)
+LOG_BATCH_SIZE = int(os.environ.get("AUDIT_LOG_BATCH_SIZE", "256"))
+LOG_FLUSH_INTERVAL = float(os.environ.get("AUDIT_LOG_FLUSH_INTERVAL", "0.2"))
+
+# Retenção do log quente: segmentos além destes limites vão para o
+# arquivo comprimido (data/logs/archive). 0 desativa o limite.
+LOG_ARCHIVE_DIR = os.path.join(LOGS_DIR, "archive")
+LOG_MAX_AGE_DAYS = int(os.environ.get("AUDIT_LOG_MAX_AGE_DAYS", "90"))
+LOG_MAX_ENTRIES = int(os.environ.get("AUDIT_LOG_MAX_ENTRIES", "50000"))
+
+# Feed de alterações (/changes): ações do log que alteram alunos, disciplinas
+# ou notas, e a espera máxima de um long-poll, em segundos.
+CHANGE_ACTIONS = [
+    "ALUNO_CRIADO", "ALUNO_ATUALIZADO", "ALUNO_REMOVIDO", "ALUNO_STATUS_ALTERADO",
+    "DISCIPLINA_CRIADA", "DISCIPLINA_ATUALIZADA", "DISCIPLINA_REMOVIDA", "NOTA_ATUALIZADA",
+]
+CHANGES_MAX_WAIT = float(os.environ.get("CHANGES_MAX_WAIT", "30"))
+# threads que fazem as leituras curtas do feed para os handlers async
+# (a espera do long-poll não ocupa thread: ver changes_async)
+CHANGES_READ_WORKERS = int(os.environ.get("CHANGES_READ_WORKERS", "2"))
 
 os.makedirs(DATA_DIR, exist_ok=True)
-for path, seed in [(ALUNOS_FILE, []), (LOGS_FILE, [])]:
+for path, seed in [(ALUNOS_FILE, [])]:
     if not os.path.exists(path):
         with open(path, "w", encoding="utf-8") as f:
             json.dump(seed, f, indent=2, ensure_ascii=False)
@@ -38,11 +76,19 @@ def _now_iso() -> str:
 
 def _read_json(path: str):
     with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+        text = f.read()
+    metrics.record_read(os.path.basename(path), len(text))
+    return json.loads(text)
 
 def _write_json(path: str, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    with metrics.span("serialize"):
+        text = json.dumps(data, indent=2, ensure_ascii=False)
+    # grava num temporário e troca: um leitor nunca vê o arquivo pela metade
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+    metrics.record_write(os.path.basename(path), len(text))
 
 # --------------------------------------------------------------------------------------
 # Modelos de domínio
@@ -55,6 +101,7 @@ class Disciplina:
     data_cadastro: str
     notas: Dict[str, Optional[float]] = field(default_factory=dict)
     # notas = {"E1": float|None, "E2": float|None, "E3": float|None}
+    catalogo_id: Optional[str] = None   # disciplina do catálogo desta matrícula
 
     def media(self) -> Optional[float]:
         """Média ponderada: E1=30%, E2=30%, E3=40%. Retorna None se falta nota."""
@@ -69,10 +116,14 @@ class Disciplina:
 
     def status(self) -> str:
         """APROVADO se média >= 7, REPROVADO se < 7, EM_CURSO se incompleta."""
+        return self.resultado()[1]
+
+    def resultado(self) -> Tuple[Optional[float], str]:
+        """(média, status) calculando a média uma vez só (relatórios)."""
         m = self.media()
         if m is None:
-            return "EM_CURSO"
-        return "APROVADO" if m >= 7 else "REPROVADO"
+            return None, "EM_CURSO"
+        return m, ("APROVADO" if m >= 7 else "REPROVADO")
 
 
 @dataclass
@@ -85,10 +136,29 @@ class Aluno:
     ativo: bool = True
     disciplinas: List[Disciplina] = field(default_factory=list)
 
+
+@dataclass
+class CatalogoDisciplina:
+    """Disciplina do catálogo: uma por nome (sem diferenciar maiúsculas/espaços)."""
+    id: str
+    nome: str
+
 # --------------------------------------------------------------------------------------
 # Serialização / desserialização
 # --------------------------------------------------------------------------------------
 
+# identificador em claro -> token Fernet já calculado. Salvar N alunos não
+# recifra os N identificadores: só os novos ou alterados vão para o Fernet.
+_ident_tokens: Dict[str, str] = {}
+
+
+def _encrypt_ident(identificador: str) -> str:
+    token = _ident_tokens.get(identificador)
+    if token is None:
+        token = _ident_tokens[identificador] = encrypt_sensitive(identificador)
+    return token
+
+
 def _to_dict_aluno(a: Aluno) -> Dict[str, Any]:
     """
     Converte objeto Aluno para dict (para salvar em JSON).
@@ -101,7 +171,7 @@ def _to_dict_aluno(a: Aluno) -> Dict[str, Any]:
         "nome": a.nome,
         "tipo_id": a.tipo_id,
         "identificador": a.identificador,  # em claro (compatibilidade)
-        "identificador_enc": encrypt_sensitive(a.identificador),
+        "identificador_enc": _encrypt_ident(a.identificador),
         "data_cadastro": a.data_cadastro,
         "ativo": a.ativo,
         "disciplinas": [
@@ -110,6 +180,7 @@ def _to_dict_aluno(a: Aluno) -> Dict[str, Any]:
                 "nome": d.nome,
                 "data_cadastro": d.data_cadastro,
                 "notas": d.notas,
+                "catalogo_id": d.catalogo_id,
             }
             for d in a.disciplinas
         ],
@@ -128,6 +199,7 @@ def _from_dict_aluno(obj: Dict[str, Any]) -> Aluno:
     if enc:
         try:
             ident = decrypt_sensitive(enc)
+            _ident_tokens[ident] = enc
         except Exception:
             ident = raw
     else:
@@ -146,6 +218,7 @@ def _from_dict_aluno(obj: Dict[str, Any]) -> Aluno:
                 nome=d["nome"],
                 data_cadastro=d.get("data_cadastro") or _today_iso(),
                 notas=d.get("notas", {"E1": None, "E2": None, "E3": None}),
+                catalogo_id=d.get("catalogo_id"),
             )
             for d in obj.get("disciplinas", [])
         ],
@@ -156,50 +229,170 @@ def _from_dict_aluno(obj: Dict[str, Any]) -> Aluno:
 # --------------------------------------------------------------------------------------
 
 def _load_alunos() -> List[Aluno]:
-    return [_from_dict_aluno(x) for x in _read_json(ALUNOS_FILE)]
+    with metrics.span("load_alunos"):
+        return [_from_dict_aluno(x) for x in _read_json(ALUNOS_FILE)]
 
 def _save_alunos(items: List[Aluno]):
-    _write_json(ALUNOS_FILE, [_to_dict_aluno(x) for x in items])
+    with metrics.span("save_alunos"):
+        _write_json(ALUNOS_FILE, [_to_dict_aluno(x) for x in items])
 
 # --------------------------------------------------------------------------------------
 # Logs (cifrados com cifra de César)
 # --------------------------------------------------------------------------------------
 
+def _migrate_legacy_logs(log: auditlog.SegmentLog):
+    """
+    Converte o antigo logs.json (lista JSON reescrita a cada log) para os
+    segmentos append-only. Executa uma única vez: o arquivo antigo é
+    renomeado para logs.json.migrated.
+    """
+    if not os.path.exists(LOGS_FILE) or log.segments():
+        return
+    try:
+        legacy = _read_json(LOGS_FILE)
+    except (json.JSONDecodeError, OSError):
+        legacy = []
+    if isinstance(legacy, list) and legacy:
+        legacy.sort(key=lambda x: x.get("timestamp", ""))
+        log.append_batch(legacy)
+    os.replace(LOGS_FILE, LOGS_FILE + ".migrated")
+
+
+# a API e o CLI embutido (--embedded) podem gravar no mesmo log ao mesmo tempo
+AUDIT_LOG = auditlog.SegmentLog(LOGS_DIR, write_lock=FileLock(os.path.join(LOGS_DIR, ".lock")),
+                                generations=GENERATIONS)
+LOG_ARCHIVE = auditlog.LogArchive(LOG_ARCHIVE_DIR)
+_migrate_legacy_logs(AUDIT_LOG)
+LOG_WRITER = auditlog.LogWriter(
+    AUDIT_LOG,
+    durability=LOG_DURABILITY,
+    batch_size=LOG_BATCH_SIZE,
+    flush_interval=LOG_FLUSH_INTERVAL,
+)
+atexit.register(LOG_WRITER.close)
+
+
+def _enforce_log_retention(max_age_days: Optional[int] = None,
+                           max_entries: Optional[int] = None) -> List[int]:
+    max_age_days = LOG_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    max_entries = LOG_MAX_ENTRIES if max_entries is None else max_entries
+    return AUDIT_LOG.archive_old_segments(
+        LOG_ARCHIVE,
+        max_age_days=max_age_days or None,
+        max_entries=max_entries or None,
+    )
+
+
+# roda na thread do writer sempre que um segmento é fechado
+AUDIT_LOG.on_seal = _enforce_log_retention
+
+
+def archive_logs(max_age_days: Optional[int] = None,
+                 max_entries: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Aplica a política de retenção agora: move os segmentos antigos do log
+    quente para o arquivo comprimido. Sem argumentos, usa os limites
+    configurados (AUDIT_LOG_MAX_AGE_DAYS / AUDIT_LOG_MAX_ENTRIES).
+    """
+    LOG_WRITER.flush()
+    archived = _enforce_log_retention(max_age_days, max_entries)
+    return {"archived_segments": archived, "hot_entries": AUDIT_LOG.count()}
+
+
+def shutdown():
+    """Drena os logs de auditoria pendentes (chamado no encerramento da API)."""
+    LOG_WRITER.close()
+
+
 def _append_log(action: str, actor: str = "admin",
                 aluno_id: Optional[str] = None, **details):
     """
     Acrescenta um log com 'mensagem_cifrada' usando cifra de César (clássica).
 
+    A entrada é apenas enfileirada: a gravação em disco acontece na thread
+    do LogWriter, fora do caminho da requisição.
     A mensagem em claro é reconstruída quando listamos os logs.
     """
-    logs = _read_json(LOGS_FILE)
-
-    mensagem_clara = f"{action} - aluno={aluno_id}" if aluno_id else action
-    mensagem_cifrada = caesar_encrypt(mensagem_clara, shift=3)
-
-    logs.append(
-        {
-            "id": str(uuid.uuid4()),
-            "timestamp": _now_iso(),
-            "actor": actor,
-            "action": action,
-            "aluno_id": aluno_id,
-            "details": details or {},
-            "mensagem_cifrada": mensagem_cifrada,
-        }
-    )
-    _write_json(LOGS_FILE, logs)
+    with metrics.span("append_log"):
+        mensagem_clara = f"{action} - aluno={aluno_id}" if aluno_id else action
+        mensagem_cifrada = caesar_encrypt(mensagem_clara, shift=3)
 
+        LOG_WRITER.submit(
+            {
+                "id": str(uuid.uuid4()),
+                "timestamp": _now_iso(),
+                "actor": actor,
+                "action": action,
+                "aluno_id": aluno_id,
+                "details": details or {},
+                "mensagem_cifrada": mensagem_cifrada,
+            }
+        )
 
-def list_logs(aid: Optional[str] = None, limit: int = 100):
-    logs = _read_json(LOGS_FILE)
 
-    if aid:
-        logs = [l for l in logs if l.get("aluno_id") == aid]
+def query_logs(
+    aid: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    action: Optional[str] = None,
+    actor: Optional[str] = None,
+    disciplina_id: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+):
+    """
+    Consulta os logs mais novos usando os índices dos segmentos: os filtros
+    (aluno, ação, ator, disciplina e período) são resolvidos nas posting
+    lists e só as entradas devolvidas são lidas do disco e decifradas.
+
+    - start/end: datas YYYY-MM-DD ('end' cobre o dia inteiro) ou timestamps ISO
 
-    logs.sort(key=lambda x: x["timestamp"], reverse=True)
+    Retorna (logs, próximo_cursor). O cursor é keyset ('segmento:posição')
+    e aponta para a página de logs mais antigos com os mesmos filtros;
+    None quando acabou. Lança ValueError se o cursor ou as datas forem inválidos.
+    """
+    before = auditlog.parse_cursor(cursor) if cursor else None
+    start, end = _ts_bound(start, "T00:00:00"), _ts_bound(end, "T23:59:59")
+    filters = {
+        "aluno_id": aid,
+        "action": action.upper() if action else None,
+        "actor": actor,
+        "disciplina_id": disciplina_id,
+    }
 
-    # decifra antes de retornar
+    # garante que o leitor veja os logs ainda na fila do writer
+    LOG_WRITER.flush()
+    logs, next_pos = AUDIT_LOG.query(filters, limit, before, start, end)
+
+    # decifra apenas o que será retornado
+    _decrypt_messages(logs)
+    return logs, (auditlog.format_cursor(*next_pos) if next_pos else None)
+
+
+def query_archived_logs(start: Optional[str] = None, end: Optional[str] = None,
+                        aid: Optional[str] = None, limit: int = 100):
+    """
+    Consulta logs já arquivados no período [start, end]. Aceita datas
+    (YYYY-MM-DD, com 'end' cobrindo o dia inteiro) ou timestamps ISO.
+    Lança ValueError se uma data for inválida.
+    """
+    start, end = _ts_bound(start, "T00:00:00"), _ts_bound(end, "T23:59:59")
+    logs = LOG_ARCHIVE.query(start, end, {"aluno_id": aid}, limit)
+    _decrypt_messages(logs)
+    return logs
+
+
+def _ts_bound(value: Optional[str], day_suffix: str) -> Optional[str]:
+    if not value:
+        return None
+    if len(value) == 10:
+        ensure_date(value)
+        return value + day_suffix
+    datetime.datetime.fromisoformat(value)
+    return value
+
+
+def _decrypt_messages(logs: List[Dict[str, Any]]):
     for l in logs:
         enc = l.get("mensagem_cifrada")
         if enc:
@@ -208,14 +401,579 @@ def list_logs(aid: Optional[str] = None, limit: int = 100):
             except Exception:
                 l["mensagem"] = "(erro ao decifrar mensagem)"
 
-    return logs[:limit]
+
+def list_logs(aid: Optional[str] = None, limit: int = 100):
+    logs, _ = query_logs(aid, limit)
+    return logs
+
+
+def changes(since: Optional[str] = None, limit: int = 100, wait: float = 0):
+    """
+    Feed de alterações: as entradas de log de CHANGE_ACTIONS a partir da
+    versão `since`, em ordem, e a versão de onde continuar. Custa O(alterações),
+    pelas posting lists de 'action'. Sem `since`, devolve só a versão atual
+    (ponto de partida depois de uma carga completa de /students).
+
+    Com `wait` > 0 (long-poll) e nada novo, espera até `wait` segundos
+    (no máximo CHANGES_MAX_WAIT) por uma alteração.
+
+    A versão tem o formato 'segmento:posição' do log. Lança ValueError se
+    for inválida e auditlog.PositionExpired se já foi arquivada (refaça a
+    carga completa).
+    """
+    LOG_WRITER.flush()
+    if not since:
+        return [], auditlog.format_cursor(*AUDIT_LOG.head())
+    try:
+        pos = auditlog.parse_cursor(since)
+    except ValueError:
+        raise ValueError("Versão inválida")
+    deadline = time.monotonic() + min(max(wait, 0), CHANGES_MAX_WAIT)
+    while True:
+        found, pos = AUDIT_LOG.read_after(pos, limit, CHANGE_ACTIONS)
+        remaining = deadline - time.monotonic()
+        if found or remaining <= 0 or not AUDIT_LOG.wait_after(pos, remaining):
+            break
+        LOG_WRITER.flush()
+    return [_change_out(p, e) for p, e in found], auditlog.format_cursor(*pos)
+
+
+def _change_out(pos: Tuple[int, int], entry: Dict[str, Any]) -> Dict[str, Any]:
+    details = dict(entry.get("details") or {})
+    return {
+        "version": auditlog.format_cursor(pos[0], pos[1] + 1),
+        "timestamp": entry.get("timestamp"),
+        "action": entry.get("action"),
+        "actor": entry.get("actor"),
+        "aluno_id": entry.get("aluno_id"),
+        "disciplina_id": details.pop("disciplina_id", None),
+        "details": details,
+    }
+
+
+class _AppendWatcher:
+    """
+    Uma thread por processo espera o log crescer (SegmentLog.wait_after) e
+    acorda os long-polls assíncronos inscritos, cada um com seu asyncio.Event
+    no seu event loop. Com N clientes esperando continua sendo uma thread só.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self) -> asyncio.Event:
+        event = asyncio.Event()
+        with self._lock:
+            self._waiters.add((asyncio.get_running_loop(), event))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="changes-watcher", daemon=True)
+                self._thread.start()
+        return event
+
+    def unsubscribe(self, event: asyncio.Event):
+        with self._lock:
+            self._waiters = {w for w in self._waiters if w[1] is not event}
+
+    def _run(self):
+        pos = AUDIT_LOG.head()
+        while True:
+            if not AUDIT_LOG.wait_after(pos, 60):
+                continue
+            pos = AUDIT_LOG.head()
+            with self._lock:
+                waiters = list(self._waiters)
+            for loop, event in waiters:
+                try:
+                    loop.call_soon_threadsafe(event.set)
+                except RuntimeError:
+                    pass   # event loop já encerrado
+
+
+_FEED_POOL = ThreadPoolExecutor(max_workers=CHANGES_READ_WORKERS, thread_name_prefix="changes")
+_WATCHER = _AppendWatcher()
+
+
+async def changes_async(since: Optional[str] = None, limit: int = 100, wait: float = 0):
+    """
+    changes() para handlers async: as leituras rodam no pool _FEED_POOL e a
+    espera do long-poll é um asyncio.Event acordado por _AppendWatcher, então
+    clientes parados esperando não prendem threads do servidor.
+    """
+    loop = asyncio.get_running_loop()
+    wait = min(max(wait, 0), CHANGES_MAX_WAIT)
+    if not since or wait <= 0:
+        return await loop.run_in_executor(_FEED_POOL, changes, since, limit)
+    deadline = loop.time() + wait
+    event = _WATCHER.subscribe()
+    try:
+        while True:
+            # limpa antes de ler: um append durante a leitura deixa o evento marcado
+            event.clear()
+            found, since = await loop.run_in_executor(_FEED_POOL, changes, since, limit)
+            remaining = deadline - loop.time()
+            if found or remaining <= 0:
+                return found, since
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        _WATCHER.unsubscribe(event)
+
+# --------------------------------------------------------------------------------------
+# Alunos em memória + índice por id
+# --------------------------------------------------------------------------------------
+
+# Todas as alterações passam por este lock: ler, alterar e gravar alunos.json
+# é uma única seção crítica, então duas requisições simultâneas não perdem a
+# alteração uma da outra. O lock vale também entre processos (a API e o CLI
+# em modo --embedded). O cache só é recarregado se o arquivo mudou por
+# fora (inode/mtime/tamanho), como no UserStore.
+_LOCK = FileLock(ALUNOS_LOCK_FILE)
+_cache_sig: Optional[Tuple[int, int, int]] = None
+_cache_items: List[Aluno] = []
+_cache_index: Dict[str, Aluno] = {}
+# registro de cada aluno como está em alunos.json: quando outro processo
+# regrava o arquivo, só os registros que mudaram viram Aluno de novo (e
+# decifram o identificador) e são avisados aos listeners
+_cache_raw: Dict[str, Dict[str, Any]] = {}
+
+# Catálogo de disciplinas e índice de matrículas. Cada Disciplina de um
+# aluno é uma matrícula que aponta (catalogo_id) para uma entrada do
+# catálogo; _turmas responde "quem cursa X" sem varrer todos os alunos.
+# O caminho aluno -> matrículas é o próprio Aluno.disciplinas via _cache_index.
+_catalog_sig: Optional[Tuple[int, int, int]] = None
+_catalog_stale = True
+_catalog_dirty = False
+_catalog: Dict[str, CatalogoDisciplina] = {}
+_catalog_keys: Dict[str, str] = {}                                  # nome normalizado -> id
+_turmas: Dict[str, Dict[str, Tuple[Aluno, Disciplina]]] = {}         # catalogo_id -> {did: (aluno, disciplina)}
+
+# dentro de batch() as alterações só marcam o cache como sujo e guardam os
+# ids a avisar (em ordem, sem repetição) para depois da publicação
+_batch_depth = 0
+_dirty = False
+_pending: Dict[Optional[str], None] = {}
+
+# avisados a cada aluno alterado (id) ou quando tudo pode ter mudado (None)
+_listeners: List[Callable[[Optional[str]], None]] = []
+
+
+# estrutura das versões publicadas: o índice id -> aluno é dividido em baldes
+# (pelo hash do id) e a ordem da listagem em trechos; uma versão nova copia
+# só os baldes e trechos que contêm alunos alterados
+SNAPSHOT_BUCKETS = 512
+SNAPSHOT_CHUNK = 256
+_chunk_keys = itertools.count()
+
+
+class SnapshotIndex(Mapping):
+    """Índice id -> aluno de um Snapshot (só leitura), em baldes compartilhados entre versões."""
+
+    __slots__ = ("_buckets", "_len")
+
+    def __init__(self, buckets: Tuple[Dict[str, Tuple[Aluno, int]], ...], length: int):
+        self._buckets = buckets     # cada balde: id -> (aluno, chave do trecho na ordem)
+        self._len = length
+
+    def __getitem__(self, aid: str) -> Aluno:
+        return self._buckets[hash(aid) % SNAPSHOT_BUCKETS][aid][0]
+
+    def get(self, aid: str, default=None):
+        entry = self._buckets[hash(aid) % SNAPSHOT_BUCKETS].get(aid)
+        return default if entry is None else entry[0]
+
+    def __contains__(self, aid) -> bool:
+        return aid in self._buckets[hash(aid) % SNAPSHOT_BUCKETS]
+
+    def __iter__(self):
+        for bucket in self._buckets:
+            yield from bucket
+
+    def __len__(self) -> int:
+        return self._len
+
+
+class Snapshot:
+    """
+    Versão imutável do conjunto de alunos, publicada a cada gravação. Os
+    leitores pegam a referência atual sem lock e enxergam um estado
+    consistente pelo tempo que precisarem; quem grava troca a referência
+    por uma nova. Alunos que não mudaram são os mesmos objetos de uma
+    versão para a outra, e a estrutura também é compartilhada: uma
+    alteração copia o aluno alterado, o balde do índice e o trecho da
+    ordem onde ele está (evolve), não o conjunto inteiro. Os objetos são
+    só para leitura.
+    """
+
+    __slots__ = ("version", "index", "_order", "_chunks", "_alunos")
+
+    def __init__(self, version: int, index: SnapshotIndex,
+                 order: Tuple[int, ...], chunks: Dict[int, Tuple[Aluno, ...]]):
+        self.version = version
+        self.index = index
+        self._order = order          # chaves dos trechos, na ordem da listagem
+        self._chunks = chunks        # chave -> trecho (tupla de alunos)
+        self._alunos: Optional[Tuple[Aluno, ...]] = None
+
+    @classmethod
+    def build(cls, version: int, alunos: List[Aluno]) -> "Snapshot":
+        buckets: List[Dict[str, Tuple[Aluno, int]]] = [{} for _ in range(SNAPSHOT_BUCKETS)]
+        order, chunks = [], {}
+        for i in range(0, len(alunos), SNAPSHOT_CHUNK):
+            key = next(_chunk_keys)
+            chunk = tuple(alunos[i:i + SNAPSHOT_CHUNK])
+            for a in chunk:
+                buckets[hash(a.id) % SNAPSHOT_BUCKETS][a.id] = (a, key)
+            order.append(key)
+            chunks[key] = chunk
+        return cls(version, SnapshotIndex(tuple(buckets), len(alunos)), tuple(order), chunks)
+
+    @property
+    def alunos(self) -> Tuple[Aluno, ...]:
+        """Todos os alunos, na ordem da listagem (montado na primeira leitura da versão)."""
+        if self._alunos is None:
+            self._alunos = tuple(itertools.chain.from_iterable(self._chunks[k] for k in self._order))
+        return self._alunos
+
+    def evolve(self, version: int, changed: Dict[str, Optional[Aluno]], front: List[Aluno]) -> "Snapshot":
+        """
+        Próxima versão: `changed` troca alunos existentes (None remove) e
+        `front` são alunos novos, na frente da listagem, na ordem dada.
+        """
+        buckets = list(self.index._buckets)
+        chunks = dict(self._chunks)
+        order = list(self._order)
+        copied: Set[int] = set()
+        edited: Dict[int, List[Aluno]] = {}
+        length = len(self.index)
+
+        def bucket(aid: str) -> Dict[str, Tuple[Aluno, int]]:
+            b = hash(aid) % SNAPSHOT_BUCKETS
+            if b not in copied:
+                buckets[b] = dict(buckets[b])
+                copied.add(b)
+            return buckets[b]
+
+        def chunk(key: int) -> List[Aluno]:
+            if key not in edited:
+                edited[key] = list(chunks.get(key, ()))
+            return edited[key]
+
+        for aid, a in changed.items():
+            b = bucket(aid)
+            old, key = b[aid]
+            items = chunk(key)
+            i = next(n for n, x in enumerate(items) if x is old)
+            if a is None:
+                del items[i]
+                del b[aid]
+                length -= 1
+            else:
+                items[i] = a
+                b[aid] = (a, key)
+        for a in reversed(front):
+            if not order or len(chunk(order[0])) >= SNAPSHOT_CHUNK:
+                order.insert(0, next(_chunk_keys))
+            chunk(order[0]).insert(0, a)
+            bucket(a.id)[a.id] = (a, order[0])
+            length += 1
+        for key, items in edited.items():
+            if items:
+                chunks[key] = tuple(items)
+            else:
+                chunks.pop(key, None)
+                order.remove(key)
+        return Snapshot(version, SnapshotIndex(tuple(buckets), length), tuple(order), chunks)
+
+
+_snapshot: Optional[Snapshot] = None
+_frozen: Dict[str, Aluno] = {}      # id -> cópia publicada, reaproveitada enquanto o aluno não muda
+_unpublished: Dict[str, None] = {}  # ids alterados desde a última publicação (em ordem)
+
+
+def _file_sig(path: str = ALUNOS_FILE) -> Optional[Tuple[int, int, int]]:
+    # o inode muda a cada gravação (_write_json troca o arquivo): duas gravações
+    # de outro processo no mesmo tique do relógio, com o mesmo tamanho, não passam
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _catalog_key(nome: str) -> str:
+    return " ".join(nome.split()).casefold()
+
+
+def _load_catalog():
+    global _catalog, _catalog_keys, _catalog_sig, _catalog_stale, _catalog_dirty
+    sig = _file_sig(CATALOGO_FILE)
+    data = _read_json(CATALOGO_FILE) if sig is not None else []
+    _catalog = {c["id"]: CatalogoDisciplina(id=c["id"], nome=c["nome"]) for c in data}
+    _catalog_keys = {_catalog_key(c.nome): c.id for c in _catalog.values()}
+    _catalog_sig, _catalog_stale, _catalog_dirty = sig, False, False
+
+
+def _save_catalog():
+    global _catalog_sig, _catalog_dirty
+    _write_json(CATALOGO_FILE, [{"id": c.id, "nome": c.nome} for c in _catalog.values()])
+    _catalog_sig, _catalog_dirty = _file_sig(CATALOGO_FILE), False
+
+
+def _catalog_id(nome: str, prefer: Optional[str] = None) -> str:
+    """
+    Id do catálogo para o nome, criando a entrada se for nova. `prefer`
+    reaproveita o id que a matrícula já tinha (catálogo apagado ou antigo).
+    """
+    global _catalog_dirty
+    key = _catalog_key(nome)
+    cid = _catalog_keys.get(key)
+    if cid is None:
+        cid = prefer if prefer and prefer not in _catalog else str(uuid.uuid4())
+        _catalog[cid] = CatalogoDisciplina(id=cid, nome=" ".join(nome.split()))
+        _catalog_keys[key] = cid
+        _catalog_dirty = True
+    return cid
+
+
+def _enroll(a: Aluno, d: Disciplina):
+    _turmas.setdefault(d.catalogo_id, {})[d.id] = (a, d)
+
+
+def _unenroll(d: Disciplina):
+    turma = _turmas.get(d.catalogo_id)
+    if turma is not None:
+        turma.pop(d.id, None)
+        if not turma:
+            del _turmas[d.catalogo_id]
+
+
+def _rebuild_indexes():
+    """Índice de alunos e de matrículas a partir de _cache_items (liga cada matrícula ao catálogo)."""
+    global _cache_index
+    _cache_index = {a.id: a for a in _cache_items}
+    _turmas.clear()
+    for a in _cache_items:
+        for d in a.disciplinas:
+            if d.catalogo_id not in _catalog:
+                # alunos.json anterior ao catálogo: associa pelo nome
+                d.catalogo_id = _catalog_id(d.nome, prefer=d.catalogo_id)
+            _enroll(a, d)
+    if _catalog_dirty:
+        _save_catalog()
+
+
+def _alunos_state() -> Tuple[List[Aluno], Dict[str, Aluno]]:
+    """Lista de alunos (mais novos primeiro) e índice id -> aluno, do cache."""
+    global _cache_sig
+    with _LOCK:
+        catalog_changed = _catalog_stale or _file_sig(CATALOGO_FILE) != _catalog_sig
+        if catalog_changed:
+            _load_catalog()
+        sig = _file_sig()
+        if sig is None or sig != _cache_sig or catalog_changed:
+            first = not _cache_raw
+            changed = _reload_alunos()
+            _cache_sig = sig
+            _rebuild_indexes()
+            if first or catalog_changed:
+                _frozen.clear()
+            for aid in changed:
+                _frozen.pop(aid, None)
+            # a ordem do arquivo pode ter mudado por inteiro: versão montada do zero
+            _publish(full=True)
+            if first or catalog_changed:
+                _notify(None)
+            else:
+                for aid in changed:
+                    _notify(aid)
+        return _cache_items, _cache_index
+
+
+def _freeze(a: Aluno) -> Aluno:
+    return replace(a, disciplinas=[replace(d, notas=dict(d.notas)) for d in a.disciplinas])
+
+
+def _frozen_copy(a: Aluno) -> Aluno:
+    f = _frozen.get(a.id)
+    if f is None:
+        f = _frozen[a.id] = _freeze(a)
+    return f
+
+
+def _publish(full: bool = False):
+    """
+    Publica um Snapshot do cache (chamar com _LOCK). Normalmente deriva da
+    versão anterior só com os alunos alterados (_unpublished); monta do zero
+    na primeira vez, depois de uma releitura do arquivo ou se os alunos
+    novos não estão na frente da lista.
+    """
+    global _snapshot
+    prev = _snapshot
+    pending = list(_unpublished)
+    _unpublished.clear()
+    version = prev.version + 1 if prev else 1
+    if prev is not None and not full:
+        changed: Dict[str, Optional[Aluno]] = {}
+        new = set()
+        for aid in pending:
+            a = _cache_index.get(aid)
+            if aid in prev.index:
+                changed[aid] = _frozen_copy(a) if a is not None else None
+            elif a is not None:
+                new.add(aid)
+        front = _cache_items[:len(new)]
+        if {a.id for a in front} == new:
+            _snapshot = prev.evolve(version, changed, [_frozen_copy(a) for a in front])
+            return
+    _snapshot = Snapshot.build(version, [_frozen_copy(a) for a in _cache_items])
+
+
+def snapshot() -> Snapshot:
+    """
+    Versão publicada mais recente, sem lock. Só toma o lock se outro
+    processo alterou os arquivos (para reler) ou se a própria thread está
+    dentro de um batch() com alterações ainda não publicadas.
+    """
+    snap = _snapshot
+    if (snap is None or _file_sig() != _cache_sig or _file_sig(CATALOGO_FILE) != _catalog_sig
+            or (_batch_depth and _LOCK.owned())):
+        with _LOCK:
+            _alunos_state()
+            if _dirty:
+                _publish()
+            return _snapshot
+    return snap
+
+
+def _reload_alunos() -> List[str]:
+    """
+    Relê alunos.json reaproveitando os Aluno cujo registro não mudou desde a
+    última leitura. Retorna os ids alterados, incluídos ou removidos.
+    """
+    global _cache_items, _cache_raw
+    with metrics.span("load_alunos"):
+        items, raw, changed = [], {}, []
+        for obj in _read_json(ALUNOS_FILE):
+            aid = obj["id"]
+            a = _cache_index.get(aid)
+            if a is None or _cache_raw.get(aid) != obj:
+                a = _from_dict_aluno(obj)
+                changed.append(aid)
+            items.append(a)
+            raw[aid] = obj
+        changed.extend(aid for aid in _cache_raw if aid not in raw)
+    _cache_items, _cache_raw = items, raw
+    return changed
+
+
+def _commit():
+    """Grava o estado do cache (chamar com _LOCK). Se falhar, o cache é descartado."""
+    global _cache_sig, _catalog_stale, _dirty
+    if _batch_depth:
+        _dirty = True
+        return
+    try:
+        if _catalog_dirty:
+            _save_catalog()
+        _save_alunos(_cache_items)
+    except Exception:
+        _cache_sig = None
+        _catalog_stale = True
+        _cache_raw.clear()      # objetos alterados em memória não valem mais
+        raise
+    _cache_sig = _file_sig()
+
+
+def add_listener(fn: Callable[[Optional[str]], None]):
+    """
+    Registra `fn(aid)`, chamada (com o lock dos dados) depois de cada
+    alteração de um aluno, de suas disciplinas ou notas; `aid=None` quando
+    alunos.json foi relido e qualquer aluno pode ter mudado. Precisa ser
+    rápida e não pode chamar o storage: só anote o que mudou.
+    """
+    _listeners.append(fn)
+
+
+def _changed(aid: Optional[str]):
+    # alteração local: o registro passa a ser o que _commit grava (o token
+    # do identificador vem do cache, sem Fernet)
+    a = _cache_index.get(aid)
+    if a is not None:
+        _cache_raw[aid] = _to_dict_aluno(a)
+    else:
+        _cache_raw.pop(aid, None)
+    # publica antes de avisar: quem for avisado já encontra a versão nova
+    # (num batch, os dois ficam para a saída do batch)
+    _frozen.pop(aid, None)
+    _unpublished[aid] = None
+    if _batch_depth:
+        _pending[aid] = None
+        return
+    _publish()
+    _notify(aid)
+
+
+def _notify(aid: Optional[str]):
+    for fn in _listeners:
+        fn(aid)
+
+
+def sync():
+    """Relê alunos.json se outro processo o alterou (avisando os listeners)."""
+    snapshot()
+
+
+@contextmanager
+def batch():
+    """
+    Agrupa várias operações num único ciclo de leitura/gravação: segura o
+    lock do início ao fim e grava alunos.json uma vez só na saída (mesmo
+    se uma operação falhar no meio, o que já foi feito é gravado). Os logs
+    de auditoria continuam sendo gerados por operação; os listeners são
+    avisados na saída, uma vez por aluno, depois de publicada a versão
+    nova. Pode ser aninhado.
+    """
+    global _batch_depth, _dirty
+    with _LOCK:
+        _batch_depth += 1
+        try:
+            yield
+        finally:
+            _batch_depth -= 1
+            if _batch_depth == 0 and _dirty:
+                _dirty = False
+                _commit()
+                _publish()
+            if _batch_depth == 0 and _pending:
+                pending = list(_pending)
+                _pending.clear()
+                for aid in pending:
+                    _notify(aid)
+
+
+def _get(aid: str) -> Aluno:
+    a = _alunos_state()[1].get(aid)
+    if a is None:
+        raise ValueError("Aluno não encontrado")
+    return a
+
+
+def _get_disciplina(a: Aluno, did: str) -> Disciplina:
+    for d in a.disciplinas:
+        if d.id == did:
+            return d
+    raise ValueError("Disciplina não encontrada")
 
 # --------------------------------------------------------------------------------------
 # CRUD de Aluno
 # --------------------------------------------------------------------------------------
 
 def list_alunos() -> List[Aluno]:
-    return _load_alunos()
+    return list(snapshot().alunos)
 
 
 def filter_alunos(
@@ -233,7 +991,7 @@ def filter_alunos(
     - ident: identificador exato
     - date_min/date_max: datas no formato YYYY-MM-DD (string)
     """
-    items = _load_alunos()
+    items = list_alunos()
 
     if name:
         items = [a for a in items if name.lower() in a.nome.lower()]
@@ -254,7 +1012,7 @@ def filter_alunos(
 
 
 def _ensure_unique(tipo_id: str, identificador: str):
-    for a in _load_alunos():
+    for a in _alunos_state()[0]:
         if a.tipo_id == tipo_id and a.identificador == identificador:
             raise ValueError(f"{tipo_id} já cadastrado para outro aluno")
 
@@ -265,9 +1023,8 @@ def create_aluno(
     identificador: str,
     data_cadastro: Optional[str] = None,
     ativo: bool = True,
+    actor: str = "admin",
 ) -> Aluno:
-    _ensure_unique(tipo_id, identificador)
-
     aluno = Aluno(
         id=str(uuid.uuid4()),
         nome=nome,
@@ -278,18 +1035,23 @@ def create_aluno(
         disciplinas=[],
     )
 
-    items = _load_alunos()
-    items.insert(0, aluno)
-    _save_alunos(items)
-
-    _append_log(
-        "ALUNO_CRIADO",
-        aluno_id=aluno.id,
-        nome=nome,
-        tipo_id=tipo_id,
-        identificador=identificador,
-        ativo=aluno.ativo,
-    )
+    with _LOCK:
+        _ensure_unique(tipo_id, identificador)
+        items, index = _alunos_state()
+        items.insert(0, aluno)
+        index[aluno.id] = aluno
+        _commit()
+        _changed(aluno.id)
+
+        _append_log(
+            "ALUNO_CRIADO",
+            actor=actor,
+            aluno_id=aluno.id,
+            nome=nome,
+            tipo_id=tipo_id,
+            identificador=identificador,
+            ativo=aluno.ativo,
+        )
     return aluno
 
 
@@ -300,92 +1062,107 @@ def update_aluno(
     identificador: Optional[str] = None,
     data_cadastro: Optional[str] = None,
     ativo: Optional[bool] = None,
+    actor: str = "admin",
 ) -> Aluno:
-    items = _load_alunos()
-
-    for i, a in enumerate(items):
-        if a.id == aid:
-            if nome is not None:
-                a.nome = nome
-            if tipo_id is not None:
-                a.tipo_id = tipo_id
-            if identificador is not None:
-                a.identificador = identificador
-            if data_cadastro is not None:
-                a.data_cadastro = data_cadastro
-            if ativo is not None:
-                a.ativo = bool(ativo)
-
-            items[i] = a
-            _save_alunos(items)
-
-            _append_log(
-                "ALUNO_ATUALIZADO",
-                aluno_id=aid,
-                fields={
-                    "nome": nome,
-                    "tipo_id": tipo_id,
-                    "identificador": identificador,
-                    "data_cadastro": data_cadastro,
-                    "ativo": ativo,
-                },
-            )
-            return a
+    with _LOCK:
+        a = _get(aid)
+        if nome is not None:
+            a.nome = nome
+        if tipo_id is not None:
+            a.tipo_id = tipo_id
+        if identificador is not None:
+            a.identificador = identificador
+        if data_cadastro is not None:
+            a.data_cadastro = data_cadastro
+        if ativo is not None:
+            a.ativo = bool(ativo)
+        _commit()
+        _changed(aid)
+
+        _append_log(
+            "ALUNO_ATUALIZADO",
+            actor=actor,
+            aluno_id=aid,
+            fields={
+                "nome": nome,
+                "tipo_id": tipo_id,
+                "identificador": identificador,
+                "data_cadastro": data_cadastro,
+                "ativo": ativo,
+            },
+        )
+        return a
 
-    raise ValueError("Aluno não encontrado")
 
+def delete_aluno(aid: str, actor: str = "admin"):
+    with _LOCK:
+        a = _get(aid)
+        items, index = _alunos_state()
+        items.remove(a)
+        del index[aid]
+        for d in a.disciplinas:
+            _unenroll(d)
+        _commit()
+        _changed(aid)
+        _append_log("ALUNO_REMOVIDO", actor=actor, aluno_id=aid)
 
-def delete_aluno(aid: str):
-    items = _load_alunos()
-    new = [a for a in items if a.id != aid]
 
-    if len(new) == len(items):
-        raise ValueError("Aluno não encontrado")
+def snapshot_alunos() -> List[Aluno]:
+    """Alunos de uma versão publicada (consistente, sem lock), para trabalhos longos."""
+    return list(snapshot().alunos)
+
 
-    _save_alunos(new)
-    _append_log("ALUNO_REMOVIDO", aluno_id=aid)
+def audit(action: str, actor: str = "admin", **details):
+    """Registra no log de auditoria uma ação que não altera alunos (ex.: exportações)."""
+    _append_log(action, actor=actor, **details)
 
 
 def find_aluno(aid: str) -> Aluno:
-    for a in _load_alunos():
-        if a.id == aid:
-            return a
-    raise ValueError("Aluno não encontrado")
+    """Busca O(1) no índice da versão publicada. Lança ValueError se não existir."""
+    a = snapshot().index.get(aid)
+    if a is None:
+        raise ValueError("Aluno não encontrado")
+    return a
 
 
-def set_aluno_status(aid: str, ativo: bool) -> Aluno:
-    a = update_aluno(aid, ativo=ativo)
-    _append_log("ALUNO_STATUS_ALTERADO", aluno_id=aid, ativo=ativo)
+def find_disciplina(aid: str, did: str) -> Disciplina:
+    return _get_disciplina(find_aluno(aid), did)
+
+
+def set_aluno_status(aid: str, ativo: bool, actor: str = "admin") -> Aluno:
+    with _LOCK:
+        a = update_aluno(aid, ativo=ativo, actor=actor)
+        _append_log("ALUNO_STATUS_ALTERADO", actor=actor, aluno_id=aid, ativo=ativo)
     return a
 
 # --------------------------------------------------------------------------------------
 # Disciplinas e notas
 # --------------------------------------------------------------------------------------
 
-def add_disciplina(aid: str, nome: str, data_cadastro: Optional[str] = None) -> Disciplina:
-    items = _load_alunos()
-
-    for i, a in enumerate(items):
-        if a.id == aid:
-            d = Disciplina(
-                id=str(uuid.uuid4()),
-                nome=nome,
-                data_cadastro=data_cadastro or _today_iso(),
-                notas={"E1": None, "E2": None, "E3": None},
-            )
-            a.disciplinas.insert(0, d)
-            items[i] = a
-            _save_alunos(items)
-
-            _append_log(
-                "DISCIPLINA_CRIADA",
-                aluno_id=aid,
-                disciplina_id=d.id,
-                nome=nome,
-            )
-            return d
-
-    raise ValueError("Aluno não encontrado")
+def add_disciplina(aid: str, nome: str, data_cadastro: Optional[str] = None,
+                   actor: str = "admin") -> Disciplina:
+    with _LOCK:
+        a = _get(aid)
+        d = Disciplina(
+            id=str(uuid.uuid4()),
+            nome=nome,
+            data_cadastro=data_cadastro or _today_iso(),
+            notas={"E1": None, "E2": None, "E3": None},
+            catalogo_id=_catalog_id(nome),
+        )
+        a.disciplinas.insert(0, d)
+        _enroll(a, d)
+        _commit()
+        _changed(aid)
+
+        _append_log(
+            "DISCIPLINA_CRIADA",
+            actor=actor,
+            aluno_id=aid,
+            disciplina_id=d.id,
+            nome=nome,
+        )
+        return d
 
 
 def update_disciplina(
@@ -393,52 +1170,46 @@ def update_disciplina(
     did: str,
     nome: Optional[str] = None,
     data_cadastro: Optional[str] = None,
+    actor: str = "admin",
 ) -> Disciplina:
-    items = _load_alunos()
-
-    for i, a in enumerate(items):
-        if a.id == aid:
-            for j, d in enumerate(a.disciplinas):
-                if d.id == did:
-                    if nome is not None:
-                        d.nome = nome
-                    if data_cadastro is not None:
-                        d.data_cadastro = data_cadastro
-                    a.disciplinas[j] = d
-                    items[i] = a
-                    _save_alunos(items)
-
-                    _append_log(
-                        "DISCIPLINA_ATUALIZADA",
-                        aluno_id=aid,
-                        disciplina_id=did,
-                        nome=nome,
-                        data_cadastro=data_cadastro,
-                    )
-                    return d
-
-    raise ValueError("Disciplina não encontrada")
-
-
-def del_disciplina(aid: str, did: str):
-    items = _load_alunos()
-
-    for i, a in enumerate(items):
-        if a.id == aid:
-            new_ds = [d for d in a.disciplinas if d.id != did]
-            if len(new_ds) == len(a.disciplinas):
-                raise ValueError("Disciplina não encontrada")
-            a.disciplinas = new_ds
-            items[i] = a
-            _save_alunos(items)
+    with _LOCK:
+        a = _alunos_state()[1].get(aid)
+        if a is None:
+            raise ValueError("Disciplina não encontrada")
+        d = _get_disciplina(a, did)
+        if nome is not None:
+            d.nome = nome
+            _unenroll(d)
+            d.catalogo_id = _catalog_id(nome)
+            _enroll(a, d)
+        if data_cadastro is not None:
+            d.data_cadastro = data_cadastro
+        _commit()
+        _changed(aid)
+
+        _append_log(
+            "DISCIPLINA_ATUALIZADA",
+            actor=actor,
+            aluno_id=aid,
+            disciplina_id=did,
+            nome=nome,
+            data_cadastro=data_cadastro,
+        )
+        return d
 
-            _append_log("DISCIPLINA_REMOVIDA", aluno_id=aid, disciplina_id=did)
-            return
 
-    raise ValueError("Aluno não encontrado")
+def del_disciplina(aid: str, did: str, actor: str = "admin"):
+    with _LOCK:
+        a = _get(aid)
+        d = _get_disciplina(a, did)
+        a.disciplinas.remove(d)
+        _unenroll(d)
+        _commit()
+        _changed(aid)
+        _append_log("DISCIPLINA_REMOVIDA", actor=actor, aluno_id=aid, disciplina_id=did)
 
 
-def set_nota(aid: str, did: str, estagio: str, nota: float) -> Disciplina:
+def set_nota(aid: str, did: str, estagio: str, nota: float, actor: str = "admin") -> Disciplina:
     """
     Atualiza nota de E1, E2 ou E3.
     Aceita formatos como 'E1', 'e1', '1', '2', '3' etc.
@@ -450,28 +1221,71 @@ def set_nota(aid: str, did: str, estagio: str, nota: float) -> Disciplina:
     if e not in ("E1", "E2", "E3"):
         raise ValueError("Estágio inválido")
 
-    items = _load_alunos()
+    with _LOCK:
+        a = _alunos_state()[1].get(aid)
+        if a is None:
+            raise ValueError("Disciplina não encontrada")
+        d = _get_disciplina(a, did)
+        d.notas[e] = float(nota)
+        _commit()
+        _changed(aid)
+
+        _append_log(
+            "NOTA_ATUALIZADA",
+            actor=actor,
+            aluno_id=aid,
+            disciplina_id=did,
+            estagio=e,
+            nota=nota,
+            media=d.media(),
+            status=d.status(),
+        )
+        return d
 
-    for i, a in enumerate(items):
-        if a.id != aid:
-            continue
+# --------------------------------------------------------------------------------------
+# Catálogo de disciplinas e matrículas
+# --------------------------------------------------------------------------------------
 
-        for j, d in enumerate(a.disciplinas):
-            if d.id == did:
-                d.notas[e] = float(nota)
-                a.disciplinas[j] = d
-                items[i] = a
-                _save_alunos(items)
-
-                _append_log(
-                    "NOTA_ATUALIZADA",
-                    aluno_id=aid,
-                    disciplina_id=did,
-                    estagio=e,
-                    nota=nota,
-                    media=d.media(),
-                    status=d.status(),
-                )
-                return d
+def list_catalogo() -> List[Tuple[CatalogoDisciplina, int]]:
+    """Disciplinas do catálogo (ordem alfabética) com a quantidade de alunos matriculados."""
+    with _LOCK:
+        _alunos_state()
+        out = [(c, len(_turmas.get(c.id, ()))) for c in _catalog.values()]
+    out.sort(key=lambda x: _catalog_key(x[0].nome))
+    return out
 
-    raise ValueError("Disciplina não encontrada")
+
+def find_catalogo(ref: str) -> CatalogoDisciplina:
+    """Busca no catálogo pelo id ou pelo nome. Lança ValueError se não existir."""
+    with _LOCK:
+        _alunos_state()
+        c = _catalog.get(ref) or _catalog.get(_catalog_keys.get(_catalog_key(ref), ""))
+    if c is None:
+        raise ValueError("Disciplina não encontrada no catálogo")
+    return c
+
+
+def count_matriculas(ref: str) -> int:
+    """Quantidade de matrículas na disciplina (id ou nome), sem montar a turma."""
+    with _LOCK:
+        c = find_catalogo(ref)
+        return len(_turmas.get(c.id, ()))
+
+
+def matriculas(ref: str) -> List[Tuple[Aluno, Disciplina]]:
+    """
+    Alunos matriculados na disciplina (id ou nome do catálogo), pelo índice
+    de matrículas: custa o tamanho da turma, não o da escola. Ordem por nome
+    do aluno. Lança ValueError se a disciplina não existir.
+    """
+    with _LOCK:
+        c = find_catalogo(ref)
+        keys = [(a.id, did) for did, (a, _) in _turmas.get(c.id, {}).items()]
+        snap = snapshot()
+    # devolve as cópias publicadas: quem renderiza a turma não segura o lock
+    out = []
+    for aid, did in keys:
+        a = snap.index[aid]
+        out.append((a, _get_disciplina(a, did)))
+    out.sort(key=lambda x: (x[0].nome.casefold(), x[0].id))
+    return out
@@ -1,6 +1,7 @@
 import os
 import sys
 import json
+import asyncio
 from fastapi.testclient import TestClient
 
 ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
@@ -119,3 +120,214 @@ def test_fluxo_completo_aluno_disciplina_notas_e_logs():
     assert isinstance(logs, list)
     if logs:
         assert "mensagem" in logs[0]
+
+
+def _create_user_and_login(admin_headers, username, role):
+    client.delete(f"/users/{username}", headers=admin_headers)
+    resp = client.post(
+        "/users",
+        headers=admin_headers,
+        json={"username": username, "password": "abc", "role": role},
+    )
+    assert resp.status_code == 200
+    resp = client.post("/auth/login", json={"username": username, "password": "abc"})
+    assert resp.status_code == 200
+    return {"Authorization": f"Bearer {resp.json()['token']}"}
+
+
+def test_papeis_de_usuario_e_ator_nos_logs():
+    _cleanup_test_student()
+    admin = {"Authorization": f"Bearer {_login_admin()}"}
+    leitor = _create_user_and_login(admin, "leitor_teste", "read-only")
+    prof = _create_user_and_login(admin, "prof_teste", "teacher")
+
+    novo = {"nome": "João Teste", "tipo_id": "MATRICULA", "identificador": "2025A0001"}
+    assert client.get("/students", headers=leitor).status_code == 200
+    assert client.post("/students", headers=leitor, json=novo).status_code == 403
+    assert client.get("/users", headers=prof).status_code == 403
+
+    # o ator do log vem do token, não mais fixo em "admin"
+    resp = client.post("/students", headers=prof, json=novo)
+    assert resp.status_code == 200
+    aid = resp.json()["id"]
+    logs = client.get("/logs", headers=admin, params={"aid": aid}).json()
+    assert logs[0]["actor"] == "prof_teste"
+
+    for username in ("leitor_teste", "prof_teste"):
+        assert client.delete(f"/users/{username}", headers=admin).status_code == 200
+    _cleanup_test_student()
+
+
+def test_busca_direta_de_aluno_e_disciplina():
+    _cleanup_test_student()
+    headers = {"Authorization": f"Bearer {_login_admin()}"}
+
+    aid = client.post("/students", headers=headers, json={
+        "nome": "João Teste", "tipo_id": "MATRICULA", "identificador": "2025A0001",
+    }).json()["id"]
+    did = client.post(f"/students/{aid}/courses", headers=headers, json={"nome": "Redes"}).json()["id"]
+
+    resp = client.get(f"/students/{aid}", headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["nome"] == "João Teste"
+    assert [d["id"] for d in resp.json()["disciplinas"]] == [did]
+
+    resp = client.get(f"/students/{aid}/courses/{did}", headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["nome"] == "Redes" and resp.json()["status"] == "EM_CURSO"
+
+    assert client.get("/students/nao-existe", headers=headers).status_code == 404
+    assert client.get(f"/students/{aid}/courses/nao-existe", headers=headers).status_code == 404
+    _cleanup_test_student()
+
+
+def test_catalogo_de_disciplinas():
+    _cleanup_test_student()
+    headers = {"Authorization": f"Bearer {_login_admin()}"}
+
+    aid = client.post("/students", headers=headers, json={
+        "nome": "João Teste", "tipo_id": "MATRICULA", "identificador": "2025A0001",
+    }).json()["id"]
+    d = client.post(f"/students/{aid}/courses", headers=headers, json={"nome": "  criptografia   aplicada"}).json()
+
+    resp = client.get("/courses/Criptografia Aplicada", headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["id"] == d["catalogo_id"] and resp.json()["alunos"] == 1
+    assert d["catalogo_id"] in [c["id"] for c in client.get("/courses", headers=headers).json()]
+
+    client.delete(f"/students/{aid}", headers=headers)
+    assert client.get(f"/courses/{d['catalogo_id']}", headers=headers).json()["alunos"] == 0
+    assert client.get("/courses/nao-existe", headers=headers).status_code == 404
+
+
+def test_turma_e_relatorio_da_disciplina():
+    _cleanup_test_student()
+    headers = {"Authorization": f"Bearer {_login_admin()}"}
+
+    aid = client.post("/students", headers=headers, json={
+        "nome": "João Teste", "tipo_id": "MATRICULA", "identificador": "2025A0001",
+    }).json()["id"]
+    did = client.post(f"/students/{aid}/courses", headers=headers, json={"nome": "Teoria da Computação"}).json()["id"]
+    for estagio, nota in (("E1", 8), ("E2", 7), ("E3", 9)):
+        client.patch(f"/students/{aid}/courses/{did}/grade", headers=headers, json={"estagio": estagio, "nota": nota})
+
+    resp = client.get("/courses/teoria da computação/students", headers=headers)
+    assert resp.status_code == 200
+    turma = resp.json()
+    assert [(r["aluno_id"], r["disciplina_id"], r["media"], r["status"]) for r in turma["alunos"]] == [
+        (aid, did, 8.1, "APROVADO")]
+    assert turma["estatisticas"]["aprovados"] == 1 and turma["estatisticas"]["media"] == 8.1
+
+    resp = client.get("/courses/Teoria da Computação/report.csv", headers=headers)
+    assert resp.status_code == 200
+    assert 'filename="turma_teoria_da_computacao.csv"' in resp.headers["content-disposition"]
+    linhas = resp.text.splitlines()
+    assert "João Teste" in linhas[2] and "8.1" in linhas[2]
+    assert linhas[-6:-4] == ["Aprovados,1", "Reprovados,0"]
+
+    assert client.get("/courses/nao-existe/students", headers=headers).status_code == 404
+    _cleanup_test_student()
+
+
+def test_relatorio_da_turma_com_etag():
+    headers = {"Authorization": f"Bearer {_login_admin()}"}
+    resp = client.get("/reports/class.csv", headers=headers)
+    assert resp.status_code == 200 and resp.text.startswith("Aluno,Tipo,Identificador")
+    etag = resp.headers["etag"]
+
+    resp = client.get("/reports/class.csv", headers=dict(headers, **{"If-None-Match": etag}))
+    assert resp.status_code == 304
+
+
+def test_exportacao_de_boletins_em_zip():
+    import io
+    import time
+    import zipfile
+    import exports
+
+    _cleanup_test_student()
+    headers = {"Authorization": f"Bearer {_login_admin()}"}
+    aid = client.post("/students", headers=headers, json={
+        "nome": "João Teste", "tipo_id": "MATRICULA", "identificador": "2025A0001",
+    }).json()["id"]
+    client.post(f"/students/{aid}/courses", headers=headers, json={"nome": "Redes"})
+
+    resp = client.post("/exports/boletins", headers=headers)
+    assert resp.status_code == 202
+    job = resp.json()
+    for _ in range(100):
+        if job["status"] in ("CONCLUIDO", "ERRO"):
+            break
+        time.sleep(0.05)
+        job = client.get(f"/exports/{job['id']}", headers=headers).json()
+    assert job["status"] == "CONCLUIDO" and job["done"] == job["total"]
+
+    resp = client.get(f"/exports/{job['id']}/download", headers=headers)
+    assert resp.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
+        assert len(zf.namelist()) == job["total"]
+        individual = client.get(f"/students/{aid}/report.csv", headers=headers).text
+        assert zf.read("boletim_2025A0001.csv").decode("utf-8") == individual
+
+    assert client.get("/exports/nao-existe", headers=headers).status_code == 404
+
+    # expirada: arquivos e job em memória somem juntos
+    velho = time.time() - (exports.EXPORT_MAX_AGE_HOURS + 1) * 3600
+    for path in (exports.zip_path(job["id"]), exports._job_file(job["id"])):
+        os.utime(path, (velho, velho))
+    exports._cleanup_old()
+    assert client.get(f"/exports/{job['id']}", headers=headers).status_code == 404
+    _cleanup_test_student()
+
+
+def test_feed_de_alteracoes_long_poll_e_sse():
+    import threading
+    import app as api
+
+    _cleanup_test_student()
+    headers = {"Authorization": f"Bearer {_login_admin()}"}
+    inicio = client.get("/changes", headers=headers).json()
+    assert inicio["changes"] == []
+
+    aid = client.post("/students", headers=headers, json={
+        "nome": "João Teste", "tipo_id": "MATRICULA", "identificador": "2025A0001",
+    }).json()["id"]
+    did = client.post(f"/students/{aid}/courses", headers=headers, json={"nome": "Redes"}).json()["id"]
+    client.patch(f"/students/{aid}/courses/{did}/grade", headers=headers, json={"estagio": "E1", "nota": 8})
+    client.get("/logs", headers=headers)   # leitura não entra no feed
+
+    feed = client.get("/changes", headers=headers, params={"since": inicio["version"]}).json()
+    assert [c["action"] for c in feed["changes"]] == ["ALUNO_CRIADO", "DISCIPLINA_CRIADA", "NOTA_ATUALIZADA"]
+    assert feed["changes"][2]["disciplina_id"] == did
+    assert feed["changes"][-1]["version"] == feed["version"]
+
+    # long-poll: responde assim que a próxima alteração acontece
+    result = {}
+    t = threading.Thread(target=lambda: result.update(client.get(
+        "/changes", headers=headers, params={"since": feed["version"], "wait": 10}).json()))
+    t.start()
+    client.delete(f"/students/{aid}", headers=headers)
+    t.join(5)
+    assert [c["action"] for c in result["changes"]] == ["ALUNO_REMOVIDO"]
+
+    # SSE: os mesmos eventos, com a versão como id; para quando o cliente desconecta
+    class _Cliente:
+        def __init__(self, desconectado):
+            self.desconectado = desconectado
+
+        async def is_disconnected(self):
+            return self.desconectado
+
+    async def _eventos(desconectado):
+        events = api._sse_changes(_Cliente(desconectado), inicio["version"])
+        try:
+            return [e async for e in events][:1] if desconectado else [await events.__anext__()]
+        finally:
+            await events.aclose()
+
+    first = asyncio.run(_eventos(False))[0]
+    assert first.startswith("id: ") and "event: change" in first and "ALUNO_CRIADO" in first
+    assert asyncio.run(_eventos(True)) == []
+
+    assert client.get("/changes", headers=headers, params={"since": "x"}).status_code == 400
+    _cleanup_test_student()
@@ -0,0 +1,228 @@
+import os
+import sys
+import datetime
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT_DIR)
+
+from auditlog import SegmentLog, LogWriter, LogArchive, PositionExpired, DURABILITY_MODES
+
+
+def _entry(i):
+    return {"id": str(i), "timestamp": f"2025-01-01T00:00:{i:02d}", "action": "TESTE"}
+
+
+@pytest.mark.parametrize("durability", DURABILITY_MODES)
+def test_writer_flush_torna_entradas_visiveis(tmp_path, durability):
+    log = SegmentLog(str(tmp_path))
+    writer = LogWriter(log, durability=durability, batch_size=4, flush_interval=5)
+
+    for i in range(10):
+        writer.submit(_entry(i))
+    assert writer.flush(timeout=5)
+
+    ids = [e["id"] for e in log.iter_entries()]
+    assert ids == [str(i) for i in range(10)]
+    writer.close()
+
+
+def test_close_drena_pendentes(tmp_path):
+    log = SegmentLog(str(tmp_path))
+    writer = LogWriter(log, batch_size=1000, flush_interval=60)
+    for i in range(5):
+        writer.submit(_entry(i))
+    writer.close(timeout=5)
+
+    assert writer.pending() == 0
+    assert len(list(log.iter_entries())) == 5
+
+
+def test_lote_que_falha_e_regravado_sem_perder_nem_repetir(tmp_path, monkeypatch):
+    import auditlog
+
+    monkeypatch.setattr(auditlog, "WRITE_RETRY_INITIAL", 0.01)
+    log = SegmentLog(str(tmp_path))
+    original = log.append_batch
+    falhas = ["parcial", "disco"]
+
+    def append_batch(entries, durability):
+        if not falhas:
+            return original(entries, durability)
+        falha = falhas.pop(0)
+        if falha == "parcial":          # grava 2 e falha no resto
+            original(entries[:2], durability)
+            raise auditlog.PartialAppend(2) from OSError("sem espaço")
+        raise OSError("disco indisponível")
+
+    monkeypatch.setattr(log, "append_batch", append_batch)
+    writer = LogWriter(log, batch_size=100, flush_interval=0.01)
+    for i in range(5):
+        writer.submit(_entry(i))
+    assert writer.flush(timeout=5)
+    assert writer.pending() == 0
+    assert [e["id"] for e in log.iter_entries()] == [str(i) for i in range(5)]
+    writer.close()
+
+
+def test_flush_nao_confirma_o_que_nao_foi_gravado(tmp_path, monkeypatch):
+    import auditlog
+
+    monkeypatch.setattr(auditlog, "WRITE_RETRY_ON_CLOSE", 0.05)
+    log = SegmentLog(str(tmp_path))
+    monkeypatch.setattr(log, "append_batch", lambda entries, durability: (_ for _ in ()).throw(OSError("ro")))
+    writer = LogWriter(log, flush_interval=0.01)
+    writer.submit(_entry(0))
+    assert not writer.flush(timeout=0.2)
+    assert writer.pending() == 1
+    writer.close(timeout=5)
+    assert writer.pending() == 1
+
+
+def test_segmentos_rotacionam(tmp_path):
+    log = SegmentLog(str(tmp_path), segment_max_entries=3)
+    log.append_batch([_entry(i) for i in range(7)])
+    assert log.segments() == [1, 2, 3]
+
+    # reabrir continua no último segmento
+    reopened = SegmentLog(str(tmp_path), segment_max_entries=3)
+    reopened.append_batch([_entry(7), _entry(8)])
+    assert reopened.segments() == [1, 2, 3]
+    assert [e["id"] for e in reopened.iter_entries()] == [str(i) for i in range(9)]
+
+
+def test_query_por_aluno_com_cursor(tmp_path):
+    log = SegmentLog(str(tmp_path), segment_max_entries=4)
+    entries = []
+    for i in range(10):
+        e = _entry(i)
+        e["aluno_id"] = "a" if i % 2 == 0 else "b"
+        entries.append(e)
+    log.append_batch(entries)
+
+    page, cursor = log.query({"aluno_id": "a"}, limit=3)
+    assert [e["id"] for e in page] == ["8", "6", "4"]
+    assert cursor is not None
+
+    page, cursor = log.query({"aluno_id": "a"}, limit=3, before=cursor)
+    assert [e["id"] for e in page] == ["2", "0"]
+    assert cursor is None
+
+    page, _ = log.query(limit=4)
+    assert [e["id"] for e in page] == ["9", "8", "7", "6"]
+
+
+def test_indice_salvo_e_reaproveitado(tmp_path):
+    log = SegmentLog(str(tmp_path), segment_max_entries=3)
+    log.append_batch([dict(_entry(i), aluno_id="x") for i in range(7)])
+    assert os.path.exists(log.index_path(1))
+
+    reopened = SegmentLog(str(tmp_path), segment_max_entries=3)
+    page, _ = reopened.query({"aluno_id": "x"}, limit=10)
+    assert [e["id"] for e in page] == [str(i) for i in reversed(range(7))]
+
+
+def test_arquivamento_por_quantidade_e_consulta(tmp_path):
+    log = SegmentLog(str(tmp_path / "hot"), segment_max_entries=3)
+    archive = LogArchive(str(tmp_path / "archive"))
+    log.append_batch([dict(_entry(i), aluno_id="a") for i in range(8)])
+
+    archived = log.archive_old_segments(archive, max_entries=3)
+    assert archived == [1, 2]
+    assert log.count() == 2
+    assert [r["segment"] for r in archive.ranges()] == [1, 2]
+
+    # o log quente continua consultável sem os segmentos movidos
+    page, _ = log.query({"aluno_id": "a"}, limit=10)
+    assert [e["id"] for e in page] == ["7", "6"]
+
+    old = archive.query("2025-01-01T00:00:02", "2025-01-01T00:00:04")
+    assert [e["id"] for e in old] == ["4", "3", "2"]
+
+
+def test_arquivamento_por_idade_fecha_segmento_ativo(tmp_path):
+    log = SegmentLog(str(tmp_path / "hot"), segment_max_entries=100)
+    archive = LogArchive(str(tmp_path / "archive"))
+    log.append_batch([_entry(i) for i in range(5)])
+
+    now = datetime.datetime(2025, 6, 1)
+    assert log.archive_old_segments(archive, max_age_days=30, now=now) == [1]
+    assert log.count() == 0
+    assert len(archive.query()) == 5
+
+
+def test_filtros_combinados_com_periodo_e_cursor(tmp_path):
+    log = SegmentLog(str(tmp_path), segment_max_entries=4)
+    entries = []
+    for i in range(12):
+        e = _entry(i)
+        e["action"] = "NOTA_ATUALIZADA" if i % 2 == 0 else "ALUNO_ATUALIZADO"
+        e["actor"] = "prof" if i % 3 == 0 else "admin"
+        e["details"] = {"disciplina_id": "d1" if i < 8 else "d2"}
+        entries.append(e)
+    log.append_batch(entries)
+
+    filters = {"action": "NOTA_ATUALIZADA", "disciplina_id": "d1"}
+    page, _ = log.query(filters, limit=10)
+    assert [e["id"] for e in page] == ["6", "4", "2", "0"]
+
+    page, _ = log.query({"action": "NOTA_ATUALIZADA", "actor": "prof"}, limit=10)
+    assert [e["id"] for e in page] == ["6", "0"]
+
+    page, cursor = log.query(filters, limit=1, start="2025-01-01T00:00:02", end="2025-01-01T00:00:06")
+    assert [e["id"] for e in page] == ["6"]
+    page, cursor = log.query(filters, limit=5, before=cursor,
+                             start="2025-01-01T00:00:02", end="2025-01-01T00:00:06")
+    assert [e["id"] for e in page] == ["4", "2"]
+    assert cursor is None
+
+
+def test_dois_processos_no_mesmo_log(tmp_path):
+    from interprocess import FileLock
+
+    # duas instâncias no mesmo diretório fazem o papel da API e do CLI embutido
+    lock_path = str(tmp_path / ".lock")
+    api = SegmentLog(str(tmp_path), segment_max_entries=4, write_lock=FileLock(lock_path))
+    cli = SegmentLog(str(tmp_path), segment_max_entries=4, write_lock=FileLock(lock_path))
+
+    api.append_batch([_entry(i) for i in range(3)])
+    cli.append_batch([_entry(i) for i in range(3, 6)])   # completa o segmento 1 e abre o 2
+    api.append_batch([_entry(6)])
+
+    for log in (api, cli):
+        entries, _ = log.query(limit=100)
+        assert [e["id"] for e in entries] == [str(i) for i in reversed(range(7))]
+    assert [len(list(open(cli.segment_path(s)))) for s in cli.segments()] == [4, 3]
+
+
+def test_entrada_gravada_atrasada_nao_some_da_busca_por_periodo(tmp_path):
+    from interprocess import FileLock
+
+    lock_path = str(tmp_path / ".lock")
+    api = SegmentLog(str(tmp_path), segment_max_entries=10, write_lock=FileLock(lock_path))
+    cli = SegmentLog(str(tmp_path), segment_max_entries=10, write_lock=FileLock(lock_path))
+    api.append_batch([_entry(i) for i in range(0, 10, 2)])
+    # o outro processo gerou 1, 3, 5, 7 antes, mas grava depois (fila do writer)
+    cli.append_batch([_entry(i) for i in range(1, 8, 2)])
+
+    timestamps = api._indexes[1].timestamps
+    assert timestamps == sorted(timestamps)
+    page, _ = api.query(limit=20, start="2025-01-01T00:00:08")
+    assert sorted(e["id"] for e in page) == ["1", "3", "5", "7", "8"]
+
+
+def test_read_after_por_acao_com_continuacao(tmp_path):
+    log = SegmentLog(str(tmp_path / "hot"), segment_max_entries=3)
+    archive = LogArchive(str(tmp_path / "archive"))
+    log.append_batch([dict(_entry(i), action="NOTA" if i % 2 else "LOGIN") for i in range(8)])
+
+    found, nxt = log.read_after((1, 0), limit=3, actions=["NOTA"])
+    assert [e["id"] for _, e in found] == ["1", "3", "5"]
+    found, nxt = log.read_after(nxt, limit=3, actions=["NOTA"])
+    assert [e["id"] for _, e in found] == ["7"] and nxt == log.head() == (3, 2)
+    assert log.read_after(nxt, actions=["NOTA"]) == ([], nxt)
+    assert not log.wait_after(nxt, timeout=0.05)
+
+    log.archive_old_segments(archive, max_entries=2)
+    with pytest.raises(PositionExpired):
+        log.read_after((1, 0))
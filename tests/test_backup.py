@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import gzip
+import zipfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT_DIR)
+
+import backup
+
+
+def _aluno(i, nota=7.0):
+    return {"id": f"id{i:04d}", "nome": f"Aluno {i}", "disciplinas": [{"nome": "Física", "nota1": nota}]}
+
+
+def _write_data(data_dir, alunos, log_lines):
+    os.makedirs(os.path.join(data_dir, "logs", "archive"), exist_ok=True)
+    os.makedirs(os.path.join(data_dir, "users"), exist_ok=True)
+    with open(os.path.join(data_dir, "alunos.json"), "w", encoding="utf-8") as f:
+        json.dump(alunos, f)
+    with open(os.path.join(data_dir, "users", "admin.json"), "w", encoding="utf-8") as f:
+        json.dump({"username": "admin"}, f)
+    with open(os.path.join(data_dir, "logs", "00000002.jsonl"), "ab") as f:
+        f.write(b"".join(json.dumps(line).encode() + b"\n" for line in log_lines))
+
+
+def test_delta_leva_so_o_que_mudou_e_restore_reproduz_os_dados(tmp_path):
+    data_dir, backup_dir = str(tmp_path / "data"), str(tmp_path / "backups")
+    alunos = [_aluno(i) for i in range(50)]
+    _write_data(data_dir, alunos, [{"n": 1}, {"n": 2}])
+    with gzip.open(os.path.join(data_dir, "logs", "archive", "00000001.jsonl.gz"), "wb") as f:
+        f.write(b'{"n": 0}\n')
+
+    full = backup.create_backup(data_dir, backup_dir, backup.KIND_FULL)
+    assert full["changed"] == 50 and set(full["log"]) == {"1", "2"}
+
+    # um aluno alterado, um novo (na frente, como storage faz), um removido e mais log
+    alunos[10] = _aluno(10, nota=9.5)
+    alunos = [_aluno(99)] + [a for a in alunos if a["id"] != "id0020"]
+    _write_data(data_dir, alunos, [{"n": 3}])
+
+    delta = backup.create_backup(data_dir, backup_dir, backup.KIND_DELTA)
+    assert delta["base"] == full["id"]
+    assert delta["changed"] == 2 and delta["deleted"] == ["id0020"]
+    assert delta["new_front"] == ["id0099"]
+    assert delta["log"] == {"2": [18, 27]}    # só a linha nova do segmento ativo
+    with zipfile.ZipFile(os.path.join(backup_dir, "000002-delta.zip")) as zf:
+        ids = [json.loads(line)["id"] for line in zf.read("alunos.jsonl").splitlines()]
+    assert ids == ["id0099", "id0010"]
+
+    target = str(tmp_path / "restaurado")
+    result = backup.restore(target, backup_dir)
+    assert result["backups"] == ["000001", "000002"]
+    with open(os.path.join(target, "alunos.json"), encoding="utf-8") as f:
+        assert json.load(f) == alunos
+    with open(os.path.join(target, "logs", "00000002.jsonl"), "rb") as f, \
+            open(os.path.join(data_dir, "logs", "00000002.jsonl"), "rb") as g:
+        assert f.read() == g.read()
+    with open(os.path.join(target, "logs", "00000001.jsonl"), "rb") as f:
+        assert f.read() == b'{"n": 0}\n'
+    assert os.path.exists(os.path.join(target, "users", "admin.json"))
+
+    # destino com dados só com --force; --upto restaura um ponto anterior
+    try:
+        backup.restore(target, backup_dir, upto="000001")
+        assert False, "deveria recusar sobrescrever"
+    except ValueError:
+        pass
+    backup.restore(target, backup_dir, upto="000001", force=True)
+    with open(os.path.join(target, "alunos.json"), encoding="utf-8") as f:
+        assert len(json.load(f)) == 50
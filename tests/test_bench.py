@@ -0,0 +1,20 @@
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT_DIR)
+
+from bench import compare
+
+
+def _results(**ops):
+    return {"results": {"1000": {name: {"median_s": v} for name, v in ops.items()}}}
+
+
+def test_compare_acusa_apenas_regressoes_acima_da_tolerancia():
+    baseline = _results(load_alunos=0.100, set_nota=0.200, nova=None)
+    atual = _results(load_alunos=0.120, set_nota=0.300, outra=0.5)
+
+    regressions = compare(atual, baseline, tolerance=0.25)
+    assert len(regressions) == 1
+    assert "set_nota" in regressions[0] and "1.50x" in regressions[0]
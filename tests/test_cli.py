@@ -0,0 +1,108 @@
+import io
+import os
+import sys
+import json
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT_DIR)
+
+import cli
+
+
+ROWS = [{"id": "1", "nome": "Ana", "ativo": True}, {"id": "22", "nome": "Bruno Lima", "ativo": False}]
+
+
+def test_saida_em_tabela_json_e_ndjson():
+    out = io.StringIO()
+    cli._emit(ROWS, ["id", "nome", "ativo"], "table", out)
+    linhas = out.getvalue().splitlines()
+    assert linhas[0].split() == ["ID", "NOME", "ATIVO"]
+    assert linhas[2].split() == ["22", "Bruno", "Lima", "NÃO"]
+
+    out = io.StringIO()
+    cli._emit(ROWS, ["id"], "ndjson", out)
+    assert [json.loads(l) for l in out.getvalue().splitlines()] == ROWS
+
+    out = io.StringIO()
+    cli._emit(ROWS, ["id"], "json", out)
+    assert json.loads(out.getvalue()) == ROWS
+
+
+def test_subcomandos_e_formato_depois_do_comando():
+    args = cli.build_parser().parse_args(["students", "list", "--name", "ana", "-f", "ndjson"])
+    assert args.func is cli.cmd_students_list
+    assert (args.name, args.format) == ("ana", "ndjson")
+
+    args = cli.build_parser().parse_args(["grades", "set", "a1", "d1", "E2", "7.5"])
+    assert args.func is cli.cmd_grades_set and args.nota == 7.5 and args.format == "table"
+
+
+def test_planilha_de_notas_resolvida_localmente(tmp_path):
+    planilha = tmp_path / "notas.csv"
+    planilha.write_text(
+        "Identificador,Disciplina,E1,E2,E3\n"
+        "2025A1,Redes,7,8,\n"
+        "2025A1,Cálculo,5,,\n"
+        "9999,Redes,1,1,1\n",
+        encoding="utf-8",
+    )
+    alunos = [{
+        "id": "a1", "tipo_id": "MATRICULA", "identificador": "2025A1",
+        "disciplinas": [{"id": "d1", "nome": "Redes"}],
+    }]
+    by_id, by_ident = cli._grade_index(alunos)
+
+    linhas = cli._read_grade_rows(str(planilha))
+    assert [(n, e, v) for n, _, e, v in linhas] == [
+        (2, "E1", "7"), (2, "E2", "8"), (3, "E1", "5"), (4, "E1", "1"), (4, "E2", "1"), (4, "E3", "1"),
+    ]
+
+    assert cli._resolve_grade(linhas[0][1], by_id, by_ident) == ("a1", "d1")
+    for _, row, _, _ in linhas[2:4]:
+        with pytest.raises(ValueError, match="não encontrad"):
+            cli._resolve_grade(row, by_id, by_ident)
+
+
+def test_modo_embutido_sem_api(tmp_path, capsys):
+    import storage
+
+    lote = tmp_path / "lote.txt"
+    lote.write_text('students create --nome "Embutido" --ident EMB0001\n', encoding="utf-8")
+    assert cli.run_command(["--embedded", "-f", "json", "batch", str(lote)]) == 0
+    aluno = json.loads(capsys.readouterr().out)[0]
+    try:
+        assert cli.run_command(["--embedded", "courses", "add", aluno["id"], "Redes", "-f", "json"]) == 0
+        did = json.loads(capsys.readouterr().out)[0]["id"]
+        assert cli.run_command(["--embedded", "grades", "set", aluno["id"], did, "E1", "9"]) == 0
+        assert storage.find_disciplina(aluno["id"], did).notas["E1"] == 9.0
+
+        assert cli.run_command(["--embedded", "students", "get", "nao-existe"]) == 1
+        assert "404" in capsys.readouterr().err
+
+        logs, _ = storage.query_logs(aluno["id"], 10)
+        assert {l["actor"] for l in logs} == {cli._embedded_actor()}
+    finally:
+        storage.delete_aluno(aluno["id"])
+        cli.EMBEDDED = False
+
+
+def test_logs_tail_follow_desce_pelo_cursor_sem_perder_logs(monkeypatch):
+    import uuid
+    import storage
+
+    monkeypatch.setattr(cli, "EMBEDDED", True)
+    actor = f"tail-{uuid.uuid4().hex[:8]}"
+    params = {"actor": actor, "limit": 2}
+    for i in range(3):
+        storage.audit("TESTE_TAIL", actor=actor, n=i)
+
+    primeira = cli._logs_after(params, None)
+    assert [l["details"]["n"] for l in primeira] == [1, 2]
+
+    # mais logs que o limit entre duas consultas: vêm todos, em ordem
+    for i in range(3, 8):
+        storage.audit("TESTE_TAIL", actor=actor, n=i)
+    novos = cli._logs_after(params, primeira[-1])
+    assert [l["details"]["n"] for l in novos] == [3, 4, 5, 6, 7]
+    assert cli._logs_after(params, novos[-1]) == []
@@ -1,12 +1,19 @@
 import os
 import sys
+import json
+import asyncio
+import threading
+import time
 import pytest
 
 ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
 sys.path.insert(0, ROOT_DIR)
 
 from util import caesar_encrypt, caesar_decrypt, encrypt_sensitive, decrypt_sensitive
+import auth
 from auth import ensure_admin, verify_user, change_password
+from users import UserStore
+from interprocess import Generations
 
 
 def test_caesar_encrypt_decrypt_roundtrip():
@@ -42,3 +49,104 @@ def test_change_password_and_revert():
     # volta para 1234 para não quebrar outros testes / uso
     change_password("nova_senha", "1234")
     assert verify_user("admin", "1234")
+
+
+def test_ensure_admin_migra_uma_vez_e_nao_recria_admin_removido(tmp_path, monkeypatch):
+    store = UserStore(str(tmp_path / "users"))
+    legacy = tmp_path / "admin.json"
+    legacy.write_text(json.dumps({"username": "admin", "password": "antiga"}))
+    monkeypatch.setattr(auth, "USERS", store)
+    monkeypatch.setattr(auth, "ADMIN_FILE", str(legacy))
+
+    ensure_admin()
+    assert verify_user("admin", "antiga")
+    assert not legacy.exists() and (tmp_path / "admin.json.migrated").exists()
+
+    store.put({"username": "prof", "role": "admin", "password": "1234"})
+    store.delete("admin")
+    ensure_admin()
+    assert store.get("admin") is None
+
+
+def test_login_nao_regrava_usuario_e_migra_uma_vez(tmp_path, monkeypatch):
+    store = UserStore(str(tmp_path))
+    store.put({"username": "prof", "role": "teacher", "password": "1234"})
+    monkeypatch.setattr(auth, "USERS", store)
+
+    # primeira leitura migra a senha em texto puro para hash
+    assert verify_user("prof", "1234")
+    migrado = json.loads((tmp_path / "prof.json").read_text())
+    assert "password" not in migrado and "password_hash" in migrado
+
+    mtime = os.stat(tmp_path / "prof.json").st_mtime_ns
+    for _ in range(3):
+        assert verify_user("prof", "1234")
+    assert os.stat(tmp_path / "prof.json").st_mtime_ns == mtime
+
+
+def test_usuarios_com_papeis_e_sessao(tmp_path, monkeypatch):
+    monkeypatch.setattr(auth, "USERS", UserStore(str(tmp_path)))
+    auth.create_user("Prof.Ana", "segredo", "teacher")
+    assert auth.get_user("prof.ana") == {"username": "prof.ana", "role": "teacher"}
+    assert verify_user("prof.ana", "segredo")
+    assert not verify_user("admin", "segredo")
+
+    token = auth.issue_token("prof.ana")
+    session = auth.session_for(token)
+    assert (session.username, session.role) == ("prof.ana", "teacher")
+
+    auth.delete_user("prof.ana")
+    assert auth.session_for(token) is None
+    auth.revoke_token(token)
+
+
+def test_login_recusado_com_fila_cheia(monkeypatch):
+    monkeypatch.setattr(auth, "_HASH_SLOTS", threading.BoundedSemaphore(1))
+    auth._HASH_SLOTS.acquire()
+    with pytest.raises(auth.AuthBusyError):
+        asyncio.run(auth.verify_user_async("admin", "1234"))
+
+
+def test_outro_worker_enxerga_troca_de_papel_e_remocao(tmp_path):
+    gens = Generations(str(tmp_path / ".generations"), ("users",))
+    worker1 = UserStore(str(tmp_path), gens)
+    worker2 = UserStore(str(tmp_path), gens)
+    worker1.put({"username": "prof", "role": "teacher"})
+    assert worker2.get("prof", revalidate=False)["role"] == "teacher"
+
+    worker1.put({"username": "prof", "role": "read-only"})
+    assert worker2.get("prof", revalidate=False)["role"] == "read-only"
+    worker1.delete("prof")
+    assert worker2.get("prof", revalidate=False) is None
+
+
+def test_troca_de_senha_e_remocao_derrubam_as_sessoes(tmp_path, monkeypatch):
+    monkeypatch.setattr(auth, "USERS", UserStore(str(tmp_path / "users")))
+    tokens = auth.TokenStore(str(tmp_path / "tokens.json"))
+    monkeypatch.setattr(auth, "TOKENS", tokens)
+    auth.create_user("prof", "segredo", "teacher")
+    expiry = int(time.time()) + 60
+
+    def sessoes():
+        opaco = "opaco-" + str(len(tokens))
+        tokens.issue(opaco, expiry, "prof")
+        assinado = auth.sign_token("prof", expiry, auth._signing_key())
+        assert auth.session_for(opaco) and auth.session_for(assinado)
+        time.sleep(0.005)
+        return opaco, assinado
+
+    for troca in (lambda: auth.update_user("prof", password="outra"),
+                  lambda: change_password("outra", "mais_uma", username="prof")):
+        opaco, assinado = sessoes()
+        troca()
+        assert auth.session_for(opaco) is None
+        assert auth.session_for(assinado) is None
+        assert auth.session_for(auth.sign_token("prof", expiry, auth._signing_key()))
+
+    # conta removida e recriada com o mesmo nome não herda as sessões antigas
+    opaco, assinado = sessoes()
+    auth.delete_user("prof")
+    auth.create_user("prof", "nova", "teacher")
+    assert auth.session_for(opaco) is None
+    assert auth.session_for(assinado) is None
+    tokens.close()
@@ -0,0 +1,22 @@
+import os
+import sys
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT_DIR)
+
+from loadtest import percentile, parse_mix
+
+
+def test_percentis_nearest_rank():
+    values = [i / 1000 for i in range(1, 101)]
+    assert percentile(values, 50) == 0.050
+    assert percentile(values, 95) == 0.095
+    assert percentile(values, 99) == 0.099
+    assert percentile([], 99) == 0.0
+
+
+def test_mix_de_operacoes():
+    assert parse_mix("grade=10,list=2,csv") == [("grade", 10), ("list", 2), ("csv", 1)]
+    with pytest.raises(ValueError):
+        parse_mix("grade=1,apagar=1")
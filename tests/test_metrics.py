@@ -0,0 +1,39 @@
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT_DIR)
+
+from metrics import Counter, Histogram
+import metrics
+
+
+def test_histograma_formato_prometheus():
+    h = Histogram("teste_latencia", "Latência de teste.", ("route",), buckets=(0.1, 1.0))
+    h.observe(0.05, route="/a")
+    h.observe(0.5, route="/a")
+    h.observe(3.0, route="/a")
+
+    texto = "\n".join(h.render())
+    assert '# TYPE teste_latencia histogram' in texto
+    assert 'teste_latencia_bucket{route="/a",le="0.1"} 1' in texto
+    assert 'teste_latencia_bucket{route="/a",le="1"} 2' in texto
+    assert 'teste_latencia_bucket{route="/a",le="+Inf"} 3' in texto
+    assert 'teste_latencia_count{route="/a"} 3' in texto
+
+
+def test_contadores_por_requisicao():
+    stats, ctx = metrics.begin_request()
+    metrics.record_read("alunos.json", 100)
+    metrics.record_crypto("fernet_decrypt")
+    metrics.end_request(stats, ctx, "GET", "/teste", 200, 0.01)
+
+    assert (stats.file_reads, stats.bytes_read, stats.crypto_ops) == (1, 100, 1)
+    assert metrics.REQ_FILE_READS.count(route="/teste") == 1
+    assert metrics.REQUESTS.value(method="GET", route="/teste", status="200") == 1
+
+
+def test_contador_com_rotulos_escapados():
+    c = Counter("teste_total", "Teste.", ("file",))
+    c.inc(2, file='a"b')
+    assert 'teste_total{file="a\\"b"} 2' in c.render()
@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import asyncio
+from fastapi.testclient import TestClient
+
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT_DIR)
+
+from app import app
+import profiling
+
+client = TestClient(app)
+
+
+def _token(username="admin", password="1234"):
+    resp = client.post("/auth/login", json={"username": username, "password": password})
+    assert resp.status_code == 200
+    return resp.json()["token"]
+
+
+def test_x_profile_gera_perfil_para_admin():
+    headers = {"Authorization": f"Bearer {_token()}", "X-Profile": "1"}
+    resp = client.get("/students", headers=headers)
+    assert resp.status_code == 200
+    pid = resp.headers.get("X-Profile-Id")
+    assert pid
+
+    auth_only = {"Authorization": headers["Authorization"]}
+    assert any(p["id"] == pid for p in client.get("/admin/profiles", headers=auth_only).json())
+    txt = client.get(f"/admin/profiles/{pid}", headers=auth_only)
+    assert txt.status_code == 200
+    assert "cumulative" in txt.text and "tracemalloc" in txt.text
+    prof = client.get(f"/admin/profiles/{pid}?format=prof", headers=auth_only)
+    assert prof.status_code == 200 and prof.content
+
+    # sem o cabeçalho nada é perfilado
+    assert "X-Profile-Id" not in client.get("/students", headers=auth_only).headers
+
+
+def test_requisicao_lenta_registra_pilha(monkeypatch):
+    monkeypatch.setattr(profiling, "SLOW_REQUEST_SECONDS", 0.0)
+
+    def lento():
+        with profiling._observed("/teste-lento", lambda v: False, {}):
+            time.sleep(0.01)
+
+    lento()
+    entries = profiling.slow_requests(limit=1)
+    assert entries and entries[0]["route"] == "/teste-lento"
+    assert entries[0]["duration"] >= 0.01
+
+
+def test_log_de_lentas_rotaciona_e_mantem_os_ultimos(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "SLOW_LOG_FILE", str(tmp_path / "slow.jsonl"))
+    monkeypatch.setattr(profiling, "_slow_lock", profiling.FileLock(str(tmp_path / "slow.jsonl.lock")))
+    monkeypatch.setattr(profiling, "SLOW_LOG_MAX_BYTES", 300)
+    monkeypatch.setattr(profiling, "SLOW_LOG_KEEP", 2)
+
+    for i in range(40):
+        profiling._log_slow(profiling._InFlight(f"/rota-{i}", 0), 1.5)
+
+    arquivos = sorted(p.name for p in tmp_path.iterdir() if not p.name.endswith(".lock"))
+    assert arquivos == ["slow.jsonl", "slow.jsonl.1", "slow.jsonl.2"]
+    assert all(p.stat().st_size <= 300 for p in tmp_path.iterdir())
+
+    # a leitura atravessa os arquivos rotacionados, do mais novo para o mais velho
+    entries = profiling.slow_requests(limit=5)
+    assert [e["route"] for e in entries] == [f"/rota-{i}" for i in range(39, 34, -1)]
+
+
+def test_endpoint_async_so_mede_tempo(monkeypatch):
+    monkeypatch.setattr(profiling, "SLOW_REQUEST_SECONDS", 0.0)
+
+    async def endpoint_async():
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    def endpoint_sync():
+        return "ok"
+
+    wrapped_async = profiling._wrap("/teste-async", endpoint_async, lambda v: True)
+    wrapped_sync = profiling._wrap("/teste-sync", endpoint_sync, lambda v: True)
+
+    ctx = profiling.request_profile()
+    try:
+        assert asyncio.run(wrapped_async()) == "ok"
+        assert profiling.requested().profile_id is None
+        assert wrapped_sync() == "ok"
+        assert profiling.requested().profile_id
+    finally:
+        profiling.reset(ctx)
+
+    # a lentidão do async continua registrada
+    assert any(e["route"] == "/teste-async" for e in profiling.slow_requests(limit=5))
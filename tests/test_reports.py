@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT_DIR)
+
+import storage
+import reports
+
+
+def test_relatorio_materializado_so_renderiza_o_que_mudou(tmp_path):
+    report = reports.ClassReport(str(tmp_path))
+    storage.add_listener(report.mark)
+    a = storage.create_aluno("Materializado", "MATRICULA", "MATZ0001")
+    try:
+        d = storage.add_disciplina(a.id, "Redes")
+        primeiro = report.path()
+        total = report.rendered_rows
+        with open(primeiro, encoding="utf-8", newline="") as f:
+            assert f.read() == reports.class_report_csv(storage.list_alunos())
+
+        # sem alterações: o mesmo arquivo, sem renderizar nada
+        assert report.path() == primeiro and report.rendered_rows == total
+
+        storage.set_nota(a.id, d.id, "E1", 9)
+        segundo = report.path()
+        assert segundo != primeiro and report.rendered_rows == total + 1
+        with open(segundo, encoding="utf-8", newline="") as f:
+            assert f.read() == reports.class_report_csv(storage.list_alunos())
+    finally:
+        storage._listeners.remove(report.mark)
+        storage.delete_aluno(a.id)
+
+
+def test_versoes_substituidas_ficam_durante_a_janela(tmp_path, monkeypatch):
+    report = reports.ClassReport(str(tmp_path))
+    versoes = []
+    for _ in range(4):
+        report.mark(None)
+        versoes.append(report.path())
+    # várias versões seguidas: nenhuma some enquanto está na janela
+    assert all(os.path.exists(p) for p in versoes)
+
+    # passada a janela, as substituídas antes dela são apagadas; a que acabou
+    # de ser substituída fica
+    monkeypatch.setattr(reports, "REPORT_GRACE_SECONDS", 0.05)
+    time.sleep(0.1)
+    report.mark(None)
+    atual = report.path()
+    assert os.path.exists(atual) and os.path.exists(versoes[-1])
+    assert not any(os.path.exists(p) for p in versoes[:-1])
+
+
+def test_etag_vem_do_conteudo_e_vale_entre_workers(tmp_path):
+    import hashlib
+
+    # dois "workers" (instâncias e diretórios diferentes) com os mesmos dados
+    worker_a = reports.ClassReport(str(tmp_path / "a"))
+    worker_b = reports.ClassReport(str(tmp_path / "b"))
+    path_a, etag_a = worker_a.current()
+    path_b, etag_b = worker_b.current()
+    assert path_a != path_b and etag_a == etag_b
+    with open(path_a, "rb") as f:
+        assert hashlib.sha256(f.read()).hexdigest()[:32] == etag_a
+
+    a = storage.create_aluno("Etag", "MATRICULA", "ETAG0001")
+    try:
+        worker_a.mark(None)
+        assert worker_a.current()[1] != etag_a
+    finally:
+        storage.delete_aluno(a.id)
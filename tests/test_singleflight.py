@@ -0,0 +1,62 @@
+import os
+import sys
+import threading
+import time
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT_DIR)
+
+from singleflight import SingleFlight
+
+
+def _em_paralelo(n, alvo):
+    resultados, erros = [], []
+
+    def run():
+        try:
+            resultados.append(alvo())
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return resultados, erros
+
+
+def test_chamadas_identicas_simultaneas_computam_uma_vez():
+    flight = SingleFlight("teste")
+    execucoes = []
+
+    def caro():
+        execucoes.append(1)
+        time.sleep(0.2)
+        return b"relatorio"
+
+    resultados, erros = _em_paralelo(8, lambda: flight.do(("class", 1), caro))
+    assert resultados == [b"relatorio"] * 8 and not erros
+    assert len(execucoes) == 1
+    assert flight.in_flight() == 0
+
+    # terminada a computação, nada fica guardado: a próxima chamada recomputa
+    assert flight.do(("class", 1), caro) == b"relatorio"
+    assert len(execucoes) == 2
+
+
+def test_erro_e_compartilhado_e_chave_diferente_roda_separado():
+    flight = SingleFlight("teste")
+
+    def falha():
+        time.sleep(0.2)
+        raise ValueError("sem dados")
+
+    resultados, erros = _em_paralelo(4, lambda: flight.do("k", falha))
+    assert not resultados and len(erros) == 4
+    assert all(isinstance(e, ValueError) for e in erros)
+
+    assert flight.do(("k", 2), lambda: 2) == 2
+    with pytest.raises(ValueError):
+        flight.do("k", falha)
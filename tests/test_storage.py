@@ -0,0 +1,197 @@
+import os
+import sys
+import threading
+
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT_DIR)
+
+import storage
+
+
+def test_notas_concorrentes_nao_se_perdem():
+    alunos = [storage.create_aluno(f"Concorrente {i}", "MATRICULA", f"CONC{i:04d}") for i in range(8)]
+    disciplinas = [storage.add_disciplina(a.id, "Carga") for a in alunos]
+    try:
+        def lancar(a, d):
+            for e, nota in (("E1", 7), ("E2", 8), ("E3", 9)):
+                storage.set_nota(a.id, d.id, e, nota)
+
+        threads = [threading.Thread(target=lancar, args=pair) for pair in zip(alunos, disciplinas)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # relê do disco para conferir o que foi de fato gravado
+        gravados = {a.id: a for a in storage._load_alunos()}
+        for a, d in zip(alunos, disciplinas):
+            notas = gravados[a.id].disciplinas[0].notas
+            assert notas == {"E1": 7.0, "E2": 8.0, "E3": 9.0}
+    finally:
+        for a in alunos:
+            storage.delete_aluno(a.id)
+
+
+def test_indice_acompanha_alteracao_externa_do_arquivo():
+    a = storage.create_aluno("Externo", "MATRICULA", "EXT0001")
+    try:
+        assert storage.find_aluno(a.id).nome == "Externo"
+
+        # outro processo regrava o arquivo: o cache percebe pelo mtime/tamanho
+        items = storage._load_alunos()
+        for x in items:
+            if x.id == a.id:
+                x.nome = "Externo Alterado"
+        storage._save_alunos(items)
+        assert storage.find_aluno(a.id).nome == "Externo Alterado"
+    finally:
+        storage.delete_aluno(a.id)
+
+
+def test_releitura_externa_refaz_so_os_alunos_alterados():
+    a = storage.create_aluno("Intacto", "MATRICULA", "INC0001")
+    b = storage.create_aluno("Mexido", "MATRICULA", "INC0002")
+    avisados = []
+    storage.add_listener(avisados.append)
+    try:
+        storage.sync()
+        antes = storage.find_aluno(a.id)
+
+        items = storage._load_alunos()
+        for x in items:
+            if x.id == b.id:
+                x.nome = "Mexido por fora"
+        storage._save_alunos(items)
+
+        assert storage.find_aluno(b.id).nome == "Mexido por fora"
+        assert storage.find_aluno(a.id) is antes     # reaproveitado, sem decifrar de novo
+        assert avisados == [b.id]
+    finally:
+        storage._listeners.remove(avisados.append)
+        storage.delete_aluno(a.id)
+        storage.delete_aluno(b.id)
+
+
+def test_snapshot_imutavel_compartilha_alunos_e_nao_espera_o_lock():
+    a = storage.create_aluno("Foto A", "MATRICULA", "SNAP0001")
+    b = storage.create_aluno("Foto B", "MATRICULA", "SNAP0002")
+    d = storage.add_disciplina(a.id, "Redes")
+    try:
+        antes = storage.snapshot()
+        storage.set_nota(a.id, d.id, "E1", 9)
+        depois = storage.snapshot()
+
+        assert depois.version > antes.version
+        assert antes.index[a.id].disciplinas[0].notas["E1"] is None
+        assert depois.index[a.id].disciplinas[0].notas["E1"] == 9
+        assert depois.index[b.id] is antes.index[b.id]     # só o aluno alterado foi copiado
+        # e só o balde do índice onde ele está: os outros são os mesmos dicts
+        iguais = sum(x is y for x, y in zip(antes.index._buckets, depois.index._buckets))
+        assert iguais == storage.SNAPSHOT_BUCKETS - 1
+
+        # um escritor segurando o lock não bloqueia a leitura
+        segurando, soltar = threading.Event(), threading.Event()
+
+        def escritor():
+            with storage._LOCK:
+                segurando.set()
+                soltar.wait(5)
+
+        t = threading.Thread(target=escritor)
+        t.start()
+        segurando.wait(5)
+        try:
+            lidos = []
+            leitor = threading.Thread(target=lambda: lidos.append(storage.find_aluno(b.id)))
+            leitor.start()
+            leitor.join(2)
+            assert lidos and lidos[0].nome == "Foto B"
+        finally:
+            soltar.set()
+            t.join()
+    finally:
+        storage.delete_aluno(a.id)
+        storage.delete_aluno(b.id)
+
+
+def test_versoes_derivadas_batem_com_o_cache(monkeypatch):
+    # trechos pequenos para atravessar as bordas com poucos alunos
+    monkeypatch.setattr(storage, "SNAPSHOT_CHUNK", 3)
+    criados = []
+    try:
+        with storage.batch():
+            criados += [storage.create_aluno(f"Versão {i}", "MATRICULA", f"VER{i:04d}") for i in range(5)]
+        for i in range(5, 9):
+            criados.append(storage.create_aluno(f"Versão {i}", "MATRICULA", f"VER{i:04d}"))
+        storage.update_aluno(criados[2].id, nome="Versão 2 renomeada")
+        for a in (criados[0], criados[4], criados[7]):
+            storage.delete_aluno(a.id)
+        with storage.batch():
+            storage.update_aluno(criados[1].id, nome="Versão 1 renomeada")
+            storage.delete_aluno(criados[5].id)
+            criados.append(storage.create_aluno("Versão 9", "MATRICULA", "VER0009"))
+
+        snap = storage.snapshot()
+        assert [a.id for a in snap.alunos] == [a.id for a in storage._cache_items]
+        assert len(snap.index) == len(storage._cache_items)
+        assert sorted(snap.index) == sorted(a.id for a in storage._cache_items)
+        assert snap.index[criados[2].id].nome == "Versão 2 renomeada"
+        assert snap.index.get(criados[0].id) is None and criados[5].id not in snap.index
+    finally:
+        for a in criados:
+            if a.id in storage.snapshot().index:
+                storage.delete_aluno(a.id)
+
+
+def test_batch_grava_uma_vez_so(monkeypatch):
+    gravacoes = []
+    original = storage._save_alunos
+    monkeypatch.setattr(storage, "_save_alunos", lambda items: (gravacoes.append(1), original(items)))
+    # o listener é avisado na saída do batch, uma vez, já com a versão publicada
+    avisos = []
+    monkeypatch.setattr(storage, "_listeners", storage._listeners + [
+        lambda aid: avisos.append((aid, storage._snapshot.index.get(aid)))])
+
+    with storage.batch():
+        a = storage.create_aluno("Lote", "MATRICULA", "LOTE0001")
+        d = storage.add_disciplina(a.id, "Redes")
+        storage.set_nota(a.id, d.id, "E1", 6)
+        assert gravacoes == [] and avisos == []
+    try:
+        assert len(gravacoes) == 1
+        assert [aid for aid, _ in avisos] == [a.id]
+        assert avisos[0][1].disciplinas[0].notas["E1"] == 6.0
+        gravado = {x.id: x for x in storage._load_alunos()}[a.id]
+        assert gravado.disciplinas[0].notas["E1"] == 6.0
+    finally:
+        storage.delete_aluno(a.id)
+
+
+def test_indice_de_matriculas_por_disciplina():
+    a = storage.create_aluno("Matrícula A", "MATRICULA", "MAT0001")
+    b = storage.create_aluno("Matrícula B", "MATRICULA", "MAT0002")
+    try:
+        da = storage.add_disciplina(a.id, "Compiladores")
+        db = storage.add_disciplina(b.id, " compiladores ")
+        assert da.catalogo_id == db.catalogo_id
+        assert [x.id for x, _ in storage.matriculas("COMPILADORES")] == [a.id, b.id]
+        assert storage.count_matriculas("compiladores") == 2
+
+        # renomear a matrícula troca de turma; apagar o aluno sai do índice
+        storage.update_disciplina(b.id, db.id, nome="Compiladores II")
+        assert [x.id for x, _ in storage.matriculas("Compiladores")] == [a.id]
+        assert [x.id for x, _ in storage.matriculas("compiladores ii")] == [b.id]
+        storage.delete_aluno(a.id)
+        assert storage.matriculas(da.catalogo_id) == []
+
+        # alunos.json sem catalogo_id (anterior ao catálogo) é associado pelo nome
+        items = storage._load_alunos()
+        for x in items:
+            for d in x.disciplinas:
+                d.catalogo_id = None
+        storage._save_alunos(items)
+        assert [d.id for _, d in storage.matriculas("Compiladores II")] == [db.id]
+    finally:
+        for x in (a, b):
+            if x.id in storage._alunos_state()[1]:
+                storage.delete_aluno(x.id)
@@ -0,0 +1,134 @@
+import os
+import sys
+import json
+import time
+import secrets
+import threading
+
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT_DIR)
+
+from interprocess import Generations
+import auth
+from auth import TokenStore, RevocationList, BloomFilter, sign_token, decode_signed_token
+
+
+def test_emitir_validar_revogar(tmp_path):
+    store = TokenStore(str(tmp_path / "tokens.json"))
+    store.issue("t1", int(time.time()) + 60)
+    assert store.validate("t1")
+    assert not store.validate("nao_existe")
+
+    store.revoke("t1")
+    assert not store.validate("t1")
+    store.close()
+
+
+def test_varredura_remove_expirados(tmp_path):
+    store = TokenStore(str(tmp_path / "tokens.json"))
+    now = int(time.time())
+    store.issue("velho", now - 10)
+    store.issue("novo", now + 60)
+
+    assert store.sweep(now) == 1
+    assert len(store) == 1
+    assert store.validate("novo")
+    store.close()
+
+
+def test_write_behind_preserva_tokens_de_outro_processo(tmp_path):
+    path = tmp_path / "tokens.json"
+    now = int(time.time())
+    path.write_text(json.dumps({"de_outro_worker": now + 60}))
+
+    store = TokenStore(str(path), flush_interval=60)
+    store.issue("meu", now + 60)
+    store.revoke("de_outro_worker")
+    store.flush()
+    store.close()
+
+    assert json.loads(path.read_text()) == {"meu": {"exp": now + 60, "sub": "admin"}}
+
+    reloaded = TokenStore(str(path))
+    assert reloaded.validate("meu")
+    reloaded.close()
+
+
+def test_logout_em_um_worker_invalida_o_token_nos_outros(tmp_path):
+    path = str(tmp_path / "tokens.json")
+    generations = Generations(str(tmp_path / ".generations"), ("tokens",))
+    worker_a = TokenStore(path, flush_interval=60, generations=generations)
+    worker_b = TokenStore(path, flush_interval=60, generations=generations)
+    now = int(time.time())
+    worker_a.issue("t1", now + 60)
+    worker_a.issue("t2", now + 60)
+    worker_a.flush()
+    assert worker_b.validate("t1") and worker_b.validate("t2")
+
+    worker_a.revoke("t1")
+    assert not worker_b.validate("t1")
+    assert worker_b.validate("t2")
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
+    worker_a.close()
+    worker_b.close()
+
+
+def test_token_assinado_valida_sem_estado():
+    key = secrets.token_bytes(32)
+    token = sign_token("admin", int(time.time()) + 60, key)
+    claims = decode_signed_token(token, key)
+    assert claims["sub"] == "admin"
+
+    adulterado = token[:-2] + ("AA" if token[-2:] != "AA" else "BB")
+    assert decode_signed_token(adulterado, key) is None
+    assert decode_signed_token(token, secrets.token_bytes(32)) is None
+
+
+def test_revogacao_compartilhada_entre_processos(tmp_path):
+    path = str(tmp_path / "revoked.json")
+    worker_a = RevocationList(path, refresh_interval=0)
+    worker_b = RevocationList(path, refresh_interval=0)
+    assert not worker_b.is_revoked("jti-1")
+
+    worker_a.revoke("jti-1", int(time.time()) + 60)
+    assert worker_a.is_revoked("jti-1")
+    assert worker_b.is_revoked("jti-1")
+    assert not worker_b.is_revoked("jti-2")
+
+
+def test_revogacoes_simultaneas_em_workers_diferentes_nao_se_perdem(tmp_path):
+    path = str(tmp_path / "revoked.json")
+    workers = [RevocationList(path, refresh_interval=0) for _ in range(4)]
+    exp = int(time.time()) + 60
+
+    def logout(worker, n):
+        for i in range(25):
+            worker.revoke(f"jti-{n}-{i}", exp)
+
+    threads = [threading.Thread(target=logout, args=(w, n)) for n, w in enumerate(workers)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+
+    assert len(json.loads(open(path).read())) == 100
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
+
+
+def test_chave_do_token_criada_uma_vez_so(tmp_path, monkeypatch):
+    monkeypatch.setattr(auth, "TOKEN_KEY_FILE", str(tmp_path / "token.key"))
+    keys = []
+    threads = [threading.Thread(target=lambda: keys.append(auth._get_token_key())) for _ in range(8)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    assert len(set(keys)) == 1 and len(keys[0]) == 32
+
+
+def test_bloom_sem_falsos_negativos():
+    bloom = BloomFilter(capacity=500)
+    itens = [secrets.token_hex(8) for _ in range(500)]
+    for item in itens:
+        bloom.add(item)
+    assert all(item in bloom for item in itens)
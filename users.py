@@ -0,0 +1,138 @@
+import os
+import re
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from interprocess import Generations
+
+# --------------------------------------------------------------------------------------
+# Papéis
+# --------------------------------------------------------------------------------------
+
+ROLE_ADMIN = "admin"          # tudo, inclusive gerenciar usuários
+ROLE_TEACHER = "teacher"      # consulta e altera alunos, disciplinas e notas
+ROLE_READ_ONLY = "read-only"  # apenas consultas
+
+ROLES = (ROLE_ADMIN, ROLE_TEACHER, ROLE_READ_ONLY)
+
+_USERNAME_RE = re.compile(r"^[a-z0-9_][a-z0-9_.-]{0,63}$")
+
+
+def normalize_username(username: str) -> str:
+    """Usernames são minúsculos e viram nome de arquivo. Lança ValueError se inválido."""
+    name = (username or "").strip().lower()
+    if not _USERNAME_RE.match(name):
+        raise ValueError("Usuário inválido (use letras, números, '.', '_' ou '-').")
+    return name
+
+
+# --------------------------------------------------------------------------------------
+# Armazenamento
+# --------------------------------------------------------------------------------------
+
+class UserStore:
+    """
+    Contas de usuário, um arquivo JSON por usuário (data/users/<username>.json).
+
+    A busca por username é O(1): o registro fica em cache em memória e só é
+    relido se o arquivo mudou (mtime/tamanho), o que também faz outro worker
+    enxergar trocas de senha. Alterar um usuário regrava só o arquivo dele.
+
+    Com `generations`, cada gravação incrementa o contador "users" e o
+    caminho quente (revalidate=False) só confere o arquivo quando o
+    contador mudou desde a última conferência daquele usuário: troca de
+    papel ou remoção feita por outro worker vale na próxima requisição.
+    """
+
+    def __init__(self, directory: str, generations: Optional[Generations] = None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.generations = generations
+        self._lock = threading.Lock()
+        # username -> (assinatura do arquivo, registro, geração em que foi conferido)
+        self._cache: Dict[str, Tuple[Tuple[int, int], dict, int]] = {}
+
+    def path(self, username: str) -> str:
+        return os.path.join(self.directory, f"{username}.json")
+
+    @staticmethod
+    def _sig(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def get(self, username: str, revalidate: bool = True) -> Optional[dict]:
+        """
+        Registro do usuário ou None. Com revalidate=False usa o cache sem
+        nem consultar o arquivo (caminho quente das requisições autenticadas).
+        """
+        try:
+            name = normalize_username(username)
+        except ValueError:
+            return None
+
+        gen = self._generation()
+        cached = self._cache.get(name)
+        if cached and not revalidate and cached[2] == gen:
+            return cached[1]
+
+        path = self.path(name)
+        sig = self._sig(path)
+        if cached and cached[0] == sig:
+            with self._lock:
+                self._cache[name] = (sig, cached[1], gen)
+            return cached[1]
+        if sig is None:
+            self._cache.pop(name, None)
+            return None
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._cache[name] = (sig, data, gen)
+        return data
+
+    def _generation(self) -> int:
+        return self.generations.current("users") if self.generations else 0
+
+    def _bump(self):
+        if self.generations:
+            self.generations.bump("users")
+
+    def put(self, record: dict):
+        name = normalize_username(record["username"])
+        record = dict(record, username=name)
+        path = self.path(name)
+        gen = self._generation()
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+        self._bump()
+        with self._lock:
+            self._cache[name] = (self._sig(path), record, gen)
+
+    def delete(self, username: str) -> bool:
+        name = normalize_username(username)
+        with self._lock:
+            self._cache.pop(name, None)
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            return False
+        self._bump()
+        return True
+
+    def usernames(self) -> List[str]:
+        out = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".json"):
+                    out.append(entry.name[:-5])
+        return sorted(out)
@@ -4,6 +4,8 @@ import os
 
 from cryptography.fernet import Fernet
 
+import metrics
+
 # -----------------------------
 # Datas / strings
 # -----------------------------
@@ -35,6 +37,7 @@ def caesar_encrypt(text: str, shift: int = 3) -> str:
     Cifra clássica de César.
     Classe: técnica clássica de criptografia.
     """
+    metrics.record_crypto("caesar")
     res = []
     for ch in text:
         up = ch.upper()
@@ -55,17 +58,27 @@ def caesar_decrypt(text: str, shift: int = 3) -> str:
 # Cifra simétrica: Fernet (AES)
 # -----------------------------
 BASE_DIR = os.path.dirname(__file__)
-DATA_DIR = os.path.join(BASE_DIR, "data")
+# CONTROLE_DATA_DIR permite apontar para outra pasta (benchmarks, testes de carga)
+DATA_DIR = os.environ.get("CONTROLE_DATA_DIR") or os.path.join(BASE_DIR, "data")
 FERNET_KEY_FILE = os.path.join(DATA_DIR, "fernet.key")
 
 os.makedirs(DATA_DIR, exist_ok=True)
 
 
+_fernet: Optional[Fernet] = None
+
+
 def _get_fernet() -> Fernet:
     """
     Usa Fernet (criptografia simétrica baseada em AES + HMAC).
     Classe: criptografia de chave simétrica.
+
+    A chave é lida do disco uma vez por processo (antes era a cada
+    operação, ou seja, N leituras do arquivo para salvar N alunos).
     """
+    global _fernet
+    if _fernet is not None:
+        return _fernet
     if not os.path.exists(FERNET_KEY_FILE):
         key = Fernet.generate_key()
         with open(FERNET_KEY_FILE, "wb") as f:
@@ -73,18 +86,24 @@ def _get_fernet() -> Fernet:
     else:
         with open(FERNET_KEY_FILE, "rb") as f:
             key = f.read()
-    return Fernet(key)
+        metrics.record_read("fernet.key", len(key))
+    _fernet = Fernet(key)
+    return _fernet
 
 
 def encrypt_sensitive(plain: str) -> str:
     """Cifra um dado sensível (ex: identificador de aluno)."""
-    f = _get_fernet()
-    token = f.encrypt(plain.encode("utf-8"))
+    metrics.record_crypto("fernet_encrypt")
+    with metrics.span("fernet_encrypt"):
+        f = _get_fernet()
+        token = f.encrypt(plain.encode("utf-8"))
     return token.decode("utf-8")
 
 
 def decrypt_sensitive(token: str) -> str:
     """Decifra o dado sensível cifrado com encrypt_sensitive."""
-    f = _get_fernet()
-    value = f.decrypt(token.encode("utf-8"))
+    metrics.record_crypto("fernet_decrypt")
+    with metrics.span("fernet_decrypt"):
+        f = _get_fernet()
+        value = f.decrypt(token.encode("utf-8"))
     return value.decode("utf-8")